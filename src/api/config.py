@@ -105,6 +105,20 @@ class Settings(BaseSettings):
     gemini_max_tokens: int = 2048
     gemini_timeout: int = 30
     gemini_max_retries: int = 3
+    gemini_async_client: bool = True  # Cliente gRPC assíncrono nativo (False = chamadas síncronas em threads)
+    gemini_requests_per_minute: int = 1000  # Quota de requisições/min da API (0 = sem limite)
+    gemini_tokens_per_minute: int = 1000000  # Quota de tokens/min, estimados pelo tamanho do prompt (0 = sem limite)
+    gemini_initial_concurrency: int = 8  # Chamadas simultâneas iniciais; ajustado por AIMD
+    gemini_max_concurrency: int = 32  # Teto do limite adaptativo de concorrência
+    gemini_admission_queue_size: int = 100  # Chamadas aguardando vaga; acima disso vão ao fallback
+    gemini_admission_budget: float = 10.0  # Espera máxima por vaga em segundos antes do fallback
+    gemini_circuit_failure_rate: float = 0.5  # Taxa de falhas na janela que abre o circuit breaker
+    gemini_circuit_slow_call_seconds: float = 15.0  # Latência a partir da qual a chamada conta como lenta
+    gemini_circuit_slow_call_rate: float = 0.8  # Taxa de chamadas lentas na janela que abre o circuito
+    gemini_circuit_window_seconds: float = 60.0  # Janela móvel das taxas de falha e latência
+    gemini_circuit_minimum_calls: int = 10  # Chamadas mínimas na janela antes de avaliar as taxas
+    gemini_circuit_open_seconds: float = 30.0  # Tempo aberto (direto ao fallback) antes das chamadas de teste
+    gemini_circuit_half_open_calls: int = 3  # Chamadas de teste para fechar o circuito
     
     @field_validator("google_api_key")
     @classmethod
@@ -162,6 +176,35 @@ class Settings(BaseSettings):
     cache_enabled: bool = True
     cache_ttl: int = 3600  # 1 hora em segundos
     cache_max_size: int = 1000  # Máximo de itens em cache
+    cache_eviction_policy: str = "lru"  # lru, lfu ou tiny_lfu
+    cache_max_memory_mb: int = 256  # Orçamento de memória das respostas em cache (0 = sem limite)
+    cache_compression_threshold: int = 4096  # Respostas maiores (bytes) são comprimidas com zlib (0 desativa)
+    cache_disk_path: str = "data/cache/responses.db"  # Camada persistente do cache em SQLite ("" desativa)
+    cache_backend: str = "local"  # local (por worker) ou shared (SQLite WAL compartilhado entre workers)
+    cache_shared_sync_interval_ms: int = 50  # Atraso máximo para aplicar invalidações de outros workers (shared)
+    cache_stale_while_revalidate: bool = True  # Servir entradas obsoletas e atualizá-las em segundo plano
+    cache_max_concurrent_revalidations: int = 2  # Atualizações simultâneas em segundo plano
+    
+    # =============================================================================
+    # CONFIGURAÇÕES DO RAG
+    # =============================================================================
+    
+    rag_refresh_interval: int = 300  # Reindexação periódica em segundos (0 desativa)
+    rag_incremental_interval: int = 10  # Feed de alterações (updated_at) em segundos (0 desativa)
+    rag_index_batch_size: int = 1000  # Linhas por lote na indexação completa
+    rag_retrieval_mode: str = "hybrid"  # lexical, dense ou hybrid
+    rag_hybrid_lexical_depth: int = 50  # Candidatos do canal lexical na fusão híbrida
+    rag_hybrid_dense_depth: int = 50  # Candidatos do canal denso na fusão híbrida
+    rag_result_cache_size: int = 256  # Resultados de recuperação em cache LRU (0 desativa)
+    rag_snapshot_dir: str = "data/rag_index"  # Snapshots do índice compartilhados entre workers ("" desativa)
+    
+    # =============================================================================
+    # CONFIGURAÇÕES DO PIPELINE DE CHAT
+    # =============================================================================
+    
+    chat_analysis_timeout: float = 5.0  # Análise da consulta em segundos (0 = sem limite)
+    chat_rag_timeout: float = 5.0  # Recuperação RAG; ao estourar segue sem contexto (0 = sem limite)
+    chat_sql_timeout: float = 10.0  # Consulta SQL gerada; ao estourar segue sem dados (0 = sem limite)
     
     # =============================================================================
     # CONFIGURAÇÕES DE UPLOAD
@@ -257,8 +257,33 @@ def get_llm_service():
     try:
         # Importar a classe LLMService principal
         from .services.llm_service import LLMService
+        from .services.admission_control import LLMAdmissionController
+        from .services.circuit_breaker import CircuitBreaker
         
         service = LLMService()
+        service.stale_while_revalidate = settings.cache_stale_while_revalidate
+        service.max_concurrent_revalidations = settings.cache_max_concurrent_revalidations
+        service.use_async_client = settings.gemini_async_client
+        service.admission = LLMAdmissionController(
+            requests_per_minute=settings.gemini_requests_per_minute,
+            tokens_per_minute=settings.gemini_tokens_per_minute,
+            initial_concurrency=settings.gemini_initial_concurrency,
+            max_concurrency=settings.gemini_max_concurrency,
+            max_queue_size=settings.gemini_admission_queue_size,
+            expected_output_tokens=settings.gemini_max_tokens // 4
+        )
+        service.admission_budget = settings.gemini_admission_budget
+        service.circuit_breaker = CircuitBreaker(
+            failure_rate_threshold=settings.gemini_circuit_failure_rate,
+            slow_call_threshold=settings.gemini_circuit_slow_call_seconds,
+            slow_call_rate_threshold=settings.gemini_circuit_slow_call_rate,
+            window_seconds=settings.gemini_circuit_window_seconds,
+            minimum_calls=settings.gemini_circuit_minimum_calls,
+            open_duration=settings.gemini_circuit_open_seconds,
+            half_open_max_calls=settings.gemini_circuit_half_open_calls
+        )
+        if service.cache_service:
+            _configure_cache_service(service.cache_service, settings)
         logger.info("LLMService created successfully")
         return service
         
@@ -276,22 +301,31 @@ def get_rag_service():
     """
     Dependência para obter serviço de RAG (singleton).
     
-    Será implementado completamente na tarefa 4.0.
+    O índice é compartilhado por todo o processo: é construído no startup
+    da aplicação (lifespan) e atualizado periodicamente em background,
+    evitando reindexar o banco a cada mensagem de chat. Com snapshots
+    habilitados, workers carregam o índice do disco em vez de reindexar.
     
     Returns:
         RAGService: Serviço de Retrieval-Augmented Generation
+        
+    Raises:
+        LLMServiceError: Se não conseguir inicializar o serviço
     """
     try:
-        # Placeholder para quando implementarmos o RAGService
-        class MockRAGService:
-            def __init__(self):
-                self.configured = True
-                
-            async def retrieve_context(self, query: str):
-                return ["Context will be implemented in task 4.0"]
+        from pathlib import Path
+        from .services.rag_service import RAGService, RetrievalMode
         
-        service = MockRAGService()
-        logger.info("RAG service placeholder created")
+        settings = get_settings()
+        service = RAGService()
+        service.index_batch_size = settings.rag_index_batch_size
+        service.default_retrieval_mode = RetrievalMode(settings.rag_retrieval_mode)
+        service.hybrid_lexical_depth = settings.rag_hybrid_lexical_depth
+        service.hybrid_dense_depth = settings.rag_hybrid_dense_depth
+        service.result_cache_size = settings.rag_result_cache_size
+        if settings.rag_snapshot_dir:
+            service.snapshot_dir = Path(settings.rag_snapshot_dir)
+        logger.info("RAG service created successfully")
         return service
         
     except Exception as e:
@@ -539,4 +573,52 @@ async def get_cache_service():
         CacheService: Instância do serviço de cache
     """
     from .services.cache_service import CacheService
-    return CacheService() 
\ No newline at end of file
+    service = CacheService()
+    _configure_cache_service(service, get_settings())
+    return service
+
+
+async def invalidate_persisted_cache(tags: set) -> int:
+    """
+    Invalida por tags as respostas na camada em disco do cache.
+    
+    Usado quando o LLMService (e seu CacheService) ainda não foi criado neste
+    worker: as respostas persistidas seriam promovidas na primeira consulta.
+    No backend compartilhado a remoção fica registrada para os demais workers.
+    
+    Returns:
+        int: Número de entradas invalidadas
+    """
+    from pathlib import Path
+    from .services.cache_service import CacheBackend, DiskCacheTier
+    
+    settings = get_settings()
+    if not settings.cache_disk_path:
+        return 0
+    
+    disk_tier = DiskCacheTier(
+        Path(settings.cache_disk_path),
+        shared=CacheBackend(settings.cache_backend) == CacheBackend.SHARED
+    )
+    try:
+        return len(await asyncio.to_thread(disk_tier.delete_matching, tags))
+    finally:
+        disk_tier.close()
+
+
+def _configure_cache_service(cache_service, settings: Settings) -> None:
+    """Aplica as configurações de cache a uma instância do CacheService."""
+    from pathlib import Path
+    from .services.cache_service import CacheBackend, EvictionPolicy
+    
+    cache_service.max_cache_size = settings.cache_max_size
+    cache_service.default_ttl = settings.cache_ttl
+    cache_service.max_memory_bytes = settings.cache_max_memory_mb * 1024 * 1024
+    cache_service.compression_threshold = settings.cache_compression_threshold
+    cache_service.set_eviction_policy(EvictionPolicy(settings.cache_eviction_policy))
+    cache_service.shared_sync_interval = settings.cache_shared_sync_interval_ms / 1000
+    backend = CacheBackend(settings.cache_backend)
+    if settings.cache_disk_path:
+        cache_service.enable_disk_tier(Path(settings.cache_disk_path), backend)
+    elif backend == CacheBackend.SHARED:
+        logger.warning("cache_backend=shared requer cache_disk_path; usando cache local") 
\ No newline at end of file
@@ -7,12 +7,14 @@ de equipamentos elétricos.
 """
 
 import asyncio
+import json
 import logging
 import time
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from uuid import uuid4
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
@@ -24,11 +26,17 @@ from ..models.chat import (
     ChatContext,
     ChatMessage,
 )
-from ..dependencies import get_database_session, get_current_settings, get_llm_service, get_query_processor
+from ..dependencies import (
+    get_database_session,
+    get_current_settings,
+    get_llm_service,
+    get_query_processor,
+    get_rag_service,
+)
 from ..config import Settings
 from ...utils.error_handlers import LLMServiceError, DataProcessingError
 from ..services.llm_service import LLMService
-from ..services.rag_service import RAGService
+from ..services.rag_service import RAGService, RetrievalFilters
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -144,6 +152,199 @@ async def mock_llm_service(
     }
 
 
+# Mapeamento de QueryIntent (Query Processor) para QueryType (API)
+QUERY_TYPE_MAPPING = {
+    "equipment_search": QueryType.EQUIPMENT_INFO,
+    "maintenance_history": QueryType.MAINTENANCE_HISTORY,
+    "last_maintenance": QueryType.MAINTENANCE_HISTORY,
+    "count_equipment": QueryType.EQUIPMENT_INFO,
+    "count_maintenance": QueryType.MAINTENANCE_HISTORY,
+    "equipment_status": QueryType.EQUIPMENT_INFO,
+    "failure_analysis": QueryType.FAILURE_ANALYSIS,
+    "upcoming_maintenance": QueryType.MAINTENANCE_HISTORY,
+    "overdue_maintenance": QueryType.MAINTENANCE_HISTORY,
+    "general_query": QueryType.GENERAL_QUERY,
+}
+
+
+async def _retrieve_query_data(
+    message: str,
+    db: AsyncSession,
+    query_processor,
+    rag_service: RAGService,
+    settings: Settings
+) -> Tuple[Any, List[Dict[str, Any]], Optional[List[Dict[str, Any]]]]:
+    """
+    Analisa a mensagem e reúne os dados (RAG e SQL) usados pelo LLM.
+    
+    A recuperação RAG e a consulta SQL dependem apenas da análise, então
+    rodam como tasks concorrentes: a latência é a do ramo mais lento, não a
+    soma. Cada etapa tem timeout próprio; um ramo que estoura o tempo ou
+    falha é cancelado e substituído por resultado vazio (no ramo SQL a
+    transação da sessão é desfeita, já que a consulta foi interrompida).
+    
+    Args:
+        message: Mensagem do usuário
+        db: Sessão do banco de dados
+        query_processor: Query Processor
+        rag_service: Serviço RAG
+        settings: Configurações (timeouts das etapas)
+        
+    Returns:
+        Tupla (análise da consulta, chunks do RAG, linhas da consulta SQL)
+        
+    Raises:
+        LLMServiceError: Se a análise da consulta exceder o tempo limite
+    """
+    # 1. ANÁLISE INTELIGENTE DA CONSULTA
+    logger.info("Starting intelligent query analysis")
+    try:
+        query_analysis = await asyncio.wait_for(
+            query_processor.process_query(message),
+            timeout=settings.chat_analysis_timeout or None
+        )
+    except asyncio.TimeoutError:
+        logger.warning(f"Query analysis timed out after {settings.chat_analysis_timeout}s")
+        raise LLMServiceError(
+            f"Análise da consulta excedeu o tempo limite de {settings.chat_analysis_timeout}s"
+        )
+    
+    logger.info(f"Query analysis: intent={query_analysis.intent.value}, "
+               f"entities={len(query_analysis.entities)}, "
+               f"confidence={query_analysis.confidence_score:.2f}")
+    
+    # 2 e 3. RAG E SQL EM PARALELO
+    query_results, structured_data = await asyncio.gather(
+        _run_stage("rag", _retrieve_rag_context(message, query_analysis, rag_service),
+                   settings.chat_rag_timeout, default=[]),
+        _run_stage("sql", _execute_structured_query(query_analysis, db),
+                   settings.chat_sql_timeout, default=None, on_failure=db.rollback)
+    )
+    
+    return query_analysis, query_results, structured_data
+
+
+async def _run_stage(
+    name: str,
+    coro,
+    timeout: float,
+    default: Any,
+    on_failure: Optional[Callable[[], Awaitable[Any]]] = None
+) -> Any:
+    """
+    Executa uma etapa do pipeline com timeout, degradando para `default`.
+    
+    Args:
+        name: Nome da etapa (para logs)
+        coro: Coroutine da etapa
+        timeout: Limite em segundos (0 = sem limite)
+        default: Resultado usado em caso de timeout ou erro
+        on_failure: Limpeza executada após timeout ou erro (ex.: rollback da sessão)
+        
+    Returns:
+        Resultado da etapa ou `default`
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout=timeout or None)
+    except asyncio.TimeoutError:
+        logger.warning(f"Chat stage '{name}' timed out after {timeout}s (using fallback)")
+    except Exception as e:
+        logger.warning(f"Chat stage '{name}' failed (using fallback): {e}")
+    
+    if on_failure is not None:
+        try:
+            await on_failure()
+        except Exception as e:
+            logger.error(f"Chat stage '{name}' cleanup failed: {e}")
+    return default
+
+
+async def _retrieve_rag_context(
+    message: str,
+    query_analysis,
+    rag_service: RAGService
+) -> List[Dict[str, Any]]:
+    """Busca chunks relevantes via RAG, restritos pelas entidades extraídas."""
+    # Índice compartilhado é construído no startup; aqui só
+    # indexamos se a indexação inicial não tiver ocorrido
+    await rag_service.ensure_indexed()
+    
+    # Recuperar contexto relevante, restrito pelas entidades extraídas
+    filters = RetrievalFilters.from_entities(query_analysis.entities)
+    rag_context = await rag_service.retrieve_context(
+        query=message,
+        max_chunks=5,
+        filters=filters
+    )
+    if not rag_context.chunks and not filters.is_empty:
+        # Filtros restritivos demais: repetir sem eles
+        rag_context = await rag_service.retrieve_context(
+            query=message,
+            max_chunks=5
+        )
+    
+    # Preparar dados para o LLM
+    query_results = [
+        {
+            "source": chunk.source,
+            "content": chunk.content,
+            "metadata": chunk.metadata,
+            "relevance_score": chunk.relevance_score
+        }
+        for chunk in rag_context.chunks
+    ]
+    
+    logger.info(f"RAG context retrieved: {len(query_results)} chunks found")
+    return query_results
+
+
+async def _execute_structured_query(
+    query_analysis,
+    db: AsyncSession
+) -> Optional[List[Dict[str, Any]]]:
+    """Executa a consulta SQL gerada pelo Query Processor (se houver)."""
+    if not query_analysis.sql_query:
+        return None
+    
+    # Executar consulta SQL do Query Processor
+    result = await db.execute(
+        text(query_analysis.sql_query),
+        query_analysis.parameters
+    )
+    rows = result.fetchall()
+    
+    # Converter resultado para formato estruturado
+    if not rows:
+        return None
+    
+    columns = result.keys()
+    structured_data = [dict(zip(columns, row)) for row in rows]
+    logger.info(f"SQL query executed: {len(structured_data)} rows returned")
+    return structured_data
+
+
+def _build_llm_context(
+    query_analysis,
+    structured_data: Optional[List[Dict[str, Any]]],
+    context: Optional[ChatContext]
+) -> Dict[str, Any]:
+    """Monta o contexto enriquecido enviado ao LLMService."""
+    return {
+        "query_analysis": {
+            "intent": query_analysis.intent.value,
+            "entities": [{"type": e.type.value, "value": e.value} for e in query_analysis.entities],
+            "confidence": query_analysis.confidence_score
+        },
+        "structured_data": structured_data,
+        "session_context": context.dict() if context else None
+    }
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Formata um evento Server-Sent Events com payload JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
 @router.post("/", response_model=ChatResponse)
 async def chat_endpoint(
     request: ChatRequest,
@@ -152,6 +353,7 @@ async def chat_endpoint(
     settings: Settings = Depends(get_current_settings),
     llm_service: LLMService = Depends(get_llm_service),
     query_processor = Depends(get_query_processor),
+    rag_service: RAGService = Depends(get_rag_service),
 ) -> ChatResponse:
     """
     Endpoint principal para chat com IA sobre manutenção de equipamentos.
@@ -199,80 +401,15 @@ async def chat_endpoint(
         
         # Processar mensagem com Query Processor, RAG e LLM services integrados
         try:
-            # 1. ANÁLISE INTELIGENTE DA CONSULTA
-            logger.info("Starting intelligent query analysis")
-            query_analysis = await query_processor.process_query(request.message)
-            
-            logger.info(f"Query analysis: intent={query_analysis.intent.value}, "
-                       f"entities={len(query_analysis.entities)}, "
-                       f"confidence={query_analysis.confidence_score:.2f}")
-            
-            query_results = []
-            
-            # 2. BUSCAR DADOS RELEVANTES VIA RAG
-            try:
-                # Inicializar RAG service
-                rag_service = RAGService()
-                
-                # Indexar dados (cache interno do RAG service evita reindexação)
-                await rag_service.index_data_sources()
-                logger.info("RAG service initialized successfully")
-                
-                # Recuperar contexto relevante
-                rag_context = await rag_service.retrieve_context(
-                    query=request.message,
-                    max_chunks=5
-                )
-                
-                # Preparar dados para o LLM
-                for chunk in rag_context.chunks:
-                    query_results.append({
-                        "source": chunk.source,
-                        "content": chunk.content,
-                        "metadata": chunk.metadata,
-                        "relevance_score": chunk.relevance_score
-                    })
-                
-                logger.info(f"RAG context retrieved: {len(query_results)} chunks found")
-                
-            except Exception as rag_error:
-                logger.warning(f"RAG service error (using fallback): {rag_error}")
-                query_results = []
-            
-            # 3. EXECUTAR SQL QUERY SE GERADA PELO QUERY PROCESSOR
-            structured_data = None
-            if query_analysis.sql_query:
-                try:
-                    # Executar consulta SQL do Query Processor
-                    result = await db.execute(
-                        text(query_analysis.sql_query),
-                        query_analysis.parameters
-                    )
-                    rows = result.fetchall()
-                    
-                    # Converter resultado para formato estruturado
-                    if rows:
-                        columns = result.keys()
-                        structured_data = [dict(zip(columns, row)) for row in rows]
-                        logger.info(f"SQL query executed: {len(structured_data)} rows returned")
-                    
-                except Exception as sql_error:
-                    logger.warning(f"SQL query execution failed: {sql_error}")
-                    structured_data = None
+            query_analysis, query_results, structured_data = await _retrieve_query_data(
+                request.message, db, query_processor, rag_service, settings
+            )
             
             # 4. USAR LLM COM CONTEXTO ENRIQUECIDO
             llm_result = await llm_service.generate_response(
                 user_query=request.message,
                 query_results=query_results,
-                context={
-                    "query_analysis": {
-                        "intent": query_analysis.intent.value,
-                        "entities": [{"type": e.type.value, "value": e.value} for e in query_analysis.entities],
-                        "confidence": query_analysis.confidence_score
-                    },
-                    "structured_data": structured_data,
-                    "session_context": context.dict() if context else None
-                },
+                context=_build_llm_context(query_analysis, structured_data, context),
                 session_id=str(session_id)
             )
             
@@ -284,20 +421,7 @@ async def chat_endpoint(
         processing_time_ms = llm_result.get("processing_time", int((time.time() - processing_start_time) * 1000))
         
         # Mapear QueryIntent para QueryType
-        query_type_mapping = {
-            "equipment_search": QueryType.EQUIPMENT_INFO,
-            "maintenance_history": QueryType.MAINTENANCE_HISTORY,
-            "last_maintenance": QueryType.MAINTENANCE_HISTORY,
-            "count_equipment": QueryType.EQUIPMENT_INFO,
-            "count_maintenance": QueryType.MAINTENANCE_HISTORY,
-            "equipment_status": QueryType.EQUIPMENT_INFO,
-            "failure_analysis": QueryType.FAILURE_ANALYSIS,
-            "upcoming_maintenance": QueryType.MAINTENANCE_HISTORY,
-            "overdue_maintenance": QueryType.MAINTENANCE_HISTORY,
-            "general_query": QueryType.GENERAL_QUERY,
-        }
-        
-        mapped_query_type = query_type_mapping.get(query_analysis.intent.value, QueryType.GENERAL_QUERY)
+        mapped_query_type = QUERY_TYPE_MAPPING.get(query_analysis.intent.value, QueryType.GENERAL_QUERY)
         
         # Calcular dados encontrados: RAG + SQL results
         total_data_found = len(query_results)
@@ -372,6 +496,112 @@ async def chat_endpoint(
         )
 
 
+@router.post("/stream")
+async def chat_stream_endpoint(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_database_session),
+    settings: Settings = Depends(get_current_settings),
+    llm_service: LLMService = Depends(get_llm_service),
+    query_processor = Depends(get_query_processor),
+    rag_service: RAGService = Depends(get_rag_service),
+) -> StreamingResponse:
+    """
+    Variante em streaming do chat: envia a resposta via Server-Sent Events.
+    
+    Eventos emitidos, nesta ordem:
+    - metadata: tipo da consulta, equipamentos e fontes (RAG/SQL)
+    - token: trechos do texto à medida que o Gemini os gera
+    - done: resposta final validada (substitui os trechos), confiança e sugestões
+    - error: falha inesperada durante o streaming
+    
+    Args:
+        request: Dados da requisição de chat
+        background_tasks: Tarefas em background do FastAPI
+        db: Sessão do banco de dados
+        settings: Configurações da aplicação
+        
+    Returns:
+        StreamingResponse com media type text/event-stream
+        
+    Raises:
+        LLMServiceError: Erro na análise da consulta
+    """
+    processing_start_time = time.time()
+    session_id = request.session_id or uuid4()
+    
+    logger.info(f"Processing streaming chat request - Session: {session_id}, Message: {request.message[:100]}...")
+    
+    context = request.context or ChatContext(session_id=session_id)
+    context.conversation_history.append(ChatMessage(content=request.message, role="user"))
+    
+    # Coleta de dados antes de abrir o stream: erros aqui viram respostas HTTP
+    try:
+        query_analysis, query_results, structured_data = await _retrieve_query_data(
+            request.message, db, query_processor, rag_service, settings
+        )
+    except Exception as e:
+        logger.error(f"Error preparing streaming chat: {str(e)}")
+        raise LLMServiceError(f"Erro no serviço de IA: {str(e)}")
+    
+    mapped_query_type = QUERY_TYPE_MAPPING.get(query_analysis.intent.value, QueryType.GENERAL_QUERY)
+    equipment_ids = [e.normalized_value for e in query_analysis.entities if e.type.value == "equipment_id"]
+    total_data_found = len(query_results) + (len(structured_data) if structured_data else 0)
+    
+    async def event_stream() -> AsyncIterator[str]:
+        yield _sse_event("metadata", {
+            "session_id": str(session_id),
+            "query_type": mapped_query_type.value,
+            "equipment_ids": equipment_ids,
+            "data_found": total_data_found,
+            "rag_chunks": len(query_results),
+            "structured_data_rows": len(structured_data) if structured_data else 0,
+            "intent": query_analysis.intent.value
+        })
+        
+        try:
+            async for event in llm_service.generate_response_stream(
+                user_query=request.message,
+                query_results=query_results,
+                context=_build_llm_context(query_analysis, structured_data, context),
+                session_id=str(session_id)
+            ):
+                if event["type"] == "token":
+                    yield _sse_event("token", {"text": event["text"]})
+                    continue
+                
+                llm_result = event["response"]
+                suggestions = query_analysis.suggestions + llm_result.get("suggestions", [])
+                yield _sse_event("done", {
+                    "session_id": str(session_id),
+                    "response": llm_result["response"],
+                    "response_type": ResponseType.SUCCESS.value,
+                    "confidence_score": max(query_analysis.confidence_score, llm_result.get("confidence_score", 0.8)),
+                    "sources_used": llm_result.get("sources", ["llm"]) + (["database"] if structured_data else []),
+                    "suggested_followup": list(dict.fromkeys(suggestions))[:4],
+                    "processing_time_ms": int((time.time() - processing_start_time) * 1000),
+                    "cache_used": llm_result.get("cache_used", False),
+                    "fallback_used": llm_result.get("fallback_used", False)
+                })
+        except Exception as e:
+            logger.error(f"Error in streaming chat: {str(e)}")
+            yield _sse_event("error", {"message": "Erro interno do servidor ao processar sua mensagem"})
+    
+    # Registrar métricas em background
+    background_tasks.add_task(
+        process_chat_message_background,
+        request.message,
+        str(session_id),
+        processing_start_time
+    )
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/session/{session_id}/history")
 async def get_chat_history(
     session_id: str,
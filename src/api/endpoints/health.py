@@ -6,12 +6,13 @@ suas dependências e métricas básicas de funcionamento.
 """
 
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Tuple
 import psutil
 import os
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel
 
+from ..dependencies import get_llm_service
 from ...utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -38,6 +39,28 @@ class DetailedHealthResponse(HealthResponse):
 # Variável global para armazenar tempo de início
 _start_time = datetime.now()
 
+# Estado do circuit breaker do Gemini -> status da dependência llm_service
+_CIRCUIT_DEPENDENCY_STATUS = {
+    "closed": "healthy",
+    "half_open": "degraded",
+    "open": "unhealthy"
+}
+
+
+def _llm_circuit_status() -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Status do serviço LLM a partir do circuit breaker do Gemini.
+    
+    Returns:
+        Tuple: (status da dependência, estado do circuit breaker ou None)
+    """
+    # Não construir o LLMService (cliente Gemini) só para o health check
+    if not get_llm_service.cache_info().currsize:
+        return "not_initialized", None
+    
+    circuit = get_llm_service().circuit_breaker.get_status()
+    return _CIRCUIT_DEPENDENCY_STATUS[circuit["state"]], circuit
+
 
 @router.get(
     "/",
@@ -101,9 +124,10 @@ async def detailed_health_check() -> DetailedHealthResponse:
         basic_health = await health_check()
         
         # Verificar dependências (simulado por enquanto)
+        llm_status, llm_circuit = _llm_circuit_status()
         dependencies = {
             "database": "unknown",  # Será implementado quando tivermos a conexão
-            "llm_service": "unknown",  # Será implementado quando tivermos o serviço LLM
+            "llm_service": llm_status,
             "file_storage": "healthy" if os.path.exists("/app/data") else "unhealthy"
         }
         
@@ -125,7 +149,8 @@ async def detailed_health_check() -> DetailedHealthResponse:
             "process": {
                 "pid": os.getpid(),
                 "threads": psutil.Process().num_threads()
-            }
+            },
+            "llm_circuit_breaker": llm_circuit
         }
         
         response = DetailedHealthResponse(
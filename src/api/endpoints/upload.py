@@ -485,6 +485,7 @@ async def process_pending_uploads(
         from ...database.repositories import RepositoryManager
         from ...etl.data_processor import DataProcessor
         from ...etl.data_ingestion import DataIngestionOrchestrator
+        from ...etl.ingestion_events import IngestionEvent, ingestion_event_bus
         
         processed_count = 0
         error_count = 0
@@ -570,6 +571,11 @@ async def process_pending_uploads(
                     )
                     await repo_manager.commit()
                     
+                    # Avisa cache e índice RAG sobre os dados gravados
+                    ingestion_event_bus.publish(
+                        IngestionEvent.from_result(process_result, source=f"upload:{upload.upload_id}")
+                    )
+                    
                     processed_count += 1
                     results.append({
                         "upload_id": upload.upload_id,
@@ -9,6 +9,7 @@ Este módulo configura a aplicação FastAPI com:
 - Documentação automática
 """
 
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
@@ -20,6 +21,7 @@ from typing import AsyncGenerator
 
 from ..utils.logger import get_logger, LogContext
 from ..utils.error_handlers import setup_error_handlers
+from ..etl.ingestion_events import IngestionEvent, ingestion_event_bus
 from .config import get_settings
 from .endpoints import health, chat, feedback, fallback_demo, cache_demo, metrics_export, upload
 
@@ -27,6 +29,27 @@ from .endpoints import health, chat, feedback, fallback_demo, cache_demo, metric
 logger = get_logger(__name__)
 
 
+async def _on_ingestion_event(event: IngestionEvent) -> None:
+    """
+    Reage a novos dados do ETL: invalida respostas afetadas e atualiza o índice RAG.
+    
+    Args:
+        event: Evento publicado pelo pipeline de ingestão
+    """
+    from .dependencies import get_llm_service, get_rag_service, invalidate_persisted_cache
+    from .services.llm_service import LLMService
+    
+    if get_llm_service.cache_info().currsize:
+        await get_llm_service().invalidate_for_ingestion(event.data_type, event.equipment_ids)
+    else:
+        # Sem LLMService neste worker ainda: limpar o que está persistido em disco
+        tags = LLMService.ingestion_invalidation_tags(event.data_type, event.equipment_ids)
+        invalidated = await invalidate_persisted_cache(tags)
+        logger.info(f"Ingestão de {event.data_type}: {invalidated} respostas invalidadas no cache em disco")
+    
+    await get_rag_service().refresh_changes()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
@@ -53,8 +76,26 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
         
         logger.info("Conexão com banco de dados inicializada com sucesso")
         
+        # Construir (ou carregar do snapshot em disco) o índice RAG compartilhado
+        from .dependencies import get_rag_service
+        
+        rag_service = get_rag_service()
+        settings = get_settings()
+        try:
+            await rag_service.load_or_build_index(max_age=settings.rag_refresh_interval)
+        except Exception as e:
+            # Não impedir o startup: o índice será construído sob demanda
+            logger.warning(f"Indexação RAG inicial falhou: {str(e)}")
+        rag_service.start_background_refresh(
+            settings.rag_refresh_interval, settings.rag_incremental_interval
+        )
+        
+        # Invalidar cache e atualizar índice RAG a cada ingestão do ETL
+        app.state.unsubscribe_ingestion = ingestion_event_bus.subscribe(
+            _on_ingestion_event, loop=asyncio.get_running_loop()
+        )
+        
         # TODO: Verificar conectividade com serviços externos
-        # TODO: Carregar modelos ou cache inicial
         
         logger.info("PROAtivo application started successfully")
         
@@ -68,6 +109,22 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     logger.info("Shutting down PROAtivo application")
     
     try:
+        # Parar de reagir a eventos de ingestão
+        unsubscribe_ingestion = getattr(app.state, "unsubscribe_ingestion", None)
+        if unsubscribe_ingestion:
+            unsubscribe_ingestion()
+        
+        # Parar atualização do índice RAG antes de fechar o banco
+        from .dependencies import get_rag_service
+        
+        await get_rag_service().stop_background_refresh()
+        
+        # Gravar no disco as respostas em cache pendentes
+        from .dependencies import get_llm_service
+        
+        if get_llm_service.cache_info().currsize:
+            await get_llm_service().close()
+        
         # Fechar conexões com banco de dados
         from ..database.connection import close_database
         
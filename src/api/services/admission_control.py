@@ -0,0 +1,331 @@
+"""
+Controle de admissão das chamadas ao Google Gemini.
+
+Fica na frente de cada chamada ao modelo e combina:
+- Token buckets para as quotas da API (requisições/min e tokens/min)
+- Limite de concorrência adaptativo (AIMD), reduzido em 429/timeouts
+- Fila de espera limitada, com descarte quando a espera estimada
+  ultrapassa o orçamento da requisição
+
+Requisições recusadas levantam AdmissionRejected, um LLMServiceError com
+"quota" na mensagem, que o LLMService encaminha ao FallbackService como
+API_QUOTA_EXCEEDED.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from ...utils.error_handlers import LLMServiceError
+from ...utils.logger import get_logger
+
+# Configurar logger
+logger = get_logger(__name__)
+
+
+class AdmissionRejected(LLMServiceError):
+    """Chamada ao LLM recusada pelo controle de admissão."""
+    
+    def __init__(self, reason: str, expected_wait: float = 0.0):
+        """
+        Args:
+            reason: queue_full ou deadline
+            expected_wait: Espera estimada no momento da recusa (segundos)
+        """
+        self.reason = reason
+        self.expected_wait = expected_wait
+        super().__init__(
+            f"Quota do Gemini: chamada não admitida ({reason}, espera estimada {expected_wait:.1f}s)",
+            service_name="gemini",
+            details={"reason": reason, "expected_wait": round(expected_wait, 3)}
+        )
+
+
+class TokenBucket:
+    """Token bucket com reposição contínua a partir de uma taxa por minuto."""
+    
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        """
+        Inicializa o bucket cheio.
+        
+        Args:
+            rate_per_minute: Tokens repostos por minuto (0 = ilimitado)
+            capacity: Rajada máxima (padrão: a taxa de um minuto)
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else float(rate_per_minute)
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+    
+    @property
+    def unlimited(self) -> bool:
+        """Indica se o bucket não limita (taxa zero)."""
+        return self.rate <= 0
+    
+    def _refill(self) -> None:
+        """Repõe os tokens acumulados desde a última leitura."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+    
+    def time_until_available(self, amount: float) -> float:
+        """Segundos até que `amount` tokens estejam disponíveis (0 = agora)."""
+        if self.unlimited:
+            return 0.0
+        
+        self._refill()
+        # Pedidos maiores que a rajada esperam o bucket encher
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+    
+    def consume(self, amount: float) -> None:
+        """Retira tokens (o saldo pode ficar negativo em pedidos acima da rajada)."""
+        if self.unlimited:
+            return
+        
+        self._refill()
+        self.tokens -= amount
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Limite de chamadas simultâneas com AIMD.
+    
+    Cada sucesso aumenta o limite em 1/limite (cerca de +1 por janela
+    completa); sobrecarga (429 ou timeout) o multiplica por `backoff_ratio`.
+    """
+    
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1,
+                 max_limit: int = 64, backoff_ratio: float = 0.5):
+        """
+        Inicializa o limite.
+        
+        Args:
+            initial_limit: Limite inicial
+            min_limit: Limite mínimo após reduções
+            max_limit: Limite máximo após aumentos
+            backoff_ratio: Fator aplicado em sobrecarga
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+        self.in_flight = 0
+    
+    @property
+    def available(self) -> bool:
+        """Indica se há vaga para mais uma chamada."""
+        return self.in_flight < int(self.limit)
+    
+    def on_success(self) -> None:
+        """Aumento aditivo após chamada bem-sucedida."""
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+    
+    def on_overload(self) -> None:
+        """Redução multiplicativa após 429 ou timeout."""
+        self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+
+
+class AdmissionPermit:
+    """Vaga concedida pelo controlador; deve ser liberada com o resultado da chamada."""
+    
+    SUCCESS = "success"
+    OVERLOAD = "overload"
+    ERROR = "error"
+    
+    def __init__(self, controller: "LLMAdmissionController", tokens: int):
+        """Cria a vaga para uma chamada com `tokens` estimados."""
+        self._controller = controller
+        self.tokens = tokens
+        self.started_at = time.monotonic()
+        self.released = False
+    
+    def release(self, outcome: str = ERROR) -> None:
+        """
+        Libera a vaga.
+        
+        Args:
+            outcome: SUCCESS, OVERLOAD (429/timeout) ou ERROR (sem efeito no limite)
+        """
+        if not self.released:
+            self.released = True
+            self._controller._release(self, outcome)
+
+
+class LLMAdmissionController:
+    """Controle de admissão (quotas, concorrência adaptativa e fila) das chamadas ao LLM."""
+    
+    # Aproximação usada para estimar tokens de entrada a partir do prompt
+    CHARS_PER_TOKEN = 4
+    
+    def __init__(
+        self,
+        requests_per_minute: int = 0,
+        tokens_per_minute: int = 0,
+        initial_concurrency: int = 8,
+        max_concurrency: int = 64,
+        max_queue_size: int = 100,
+        expected_output_tokens: int = 512
+    ):
+        """
+        Inicializa o controlador.
+        
+        Args:
+            requests_per_minute: Quota de requisições por minuto (0 = sem limite)
+            tokens_per_minute: Quota de tokens por minuto (0 = sem limite)
+            initial_concurrency: Limite inicial de chamadas simultâneas
+            max_concurrency: Teto do limite adaptativo
+            max_queue_size: Máximo de chamadas aguardando admissão
+            expected_output_tokens: Tokens de saída somados à estimativa do prompt
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.concurrency = AdaptiveConcurrencyLimit(initial_concurrency, max_limit=max_concurrency)
+        self.max_queue_size = max_queue_size
+        self.expected_output_tokens = expected_output_tokens
+        
+        # Fila FIFO de (future, tokens) aguardando admissão
+        self._queue: Deque = deque()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        
+        # Latência média das chamadas (EWMA), usada na estimativa de espera
+        self._average_latency = 1.0
+        
+        # Métricas
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "deadline": 0}
+        self.overloads = 0
+    
+    def estimate_tokens(self, prompt: str) -> int:
+        """Estima tokens (entrada + saída) consumidos por uma chamada."""
+        return math.ceil(len(prompt) / self.CHARS_PER_TOKEN) + self.expected_output_tokens
+    
+    def estimated_wait(self, tokens: int) -> float:
+        """
+        Estima a espera até a admissão de uma nova chamada.
+        
+        Considera as quotas necessárias para toda a fila à frente e, quando a
+        concorrência está esgotada, quantas "rodadas" de chamadas precisam
+        terminar antes.
+        """
+        queued_tokens = sum(queued for _, queued in self._queue) + tokens
+        quota_wait = max(
+            self.requests.time_until_available(len(self._queue) + 1),
+            self.tokens.time_until_available(queued_tokens)
+        )
+        
+        busy = self.concurrency.in_flight + len(self._queue) - int(self.concurrency.limit) + 1
+        concurrency_wait = 0.0
+        if busy > 0:
+            concurrency_wait = math.ceil(busy / max(1, int(self.concurrency.limit))) * self._average_latency
+        
+        return max(quota_wait, concurrency_wait)
+    
+    async def acquire(self, tokens: int, deadline: Optional[float] = None) -> AdmissionPermit:
+        """
+        Aguarda vaga para uma chamada.
+        
+        Args:
+            tokens: Tokens estimados da chamada
+            deadline: Instante (time.monotonic) limite para ser admitida
+        
+        Returns:
+            AdmissionPermit a ser liberado ao fim da chamada
+        
+        Raises:
+            AdmissionRejected: Fila cheia ou espera além do deadline
+        """
+        if len(self._queue) >= self.max_queue_size:
+            self._reject("queue_full", 0.0)
+        
+        expected_wait = self.estimated_wait(tokens)
+        if deadline is not None and time.monotonic() + expected_wait > deadline:
+            self._reject("deadline", expected_wait)
+        
+        future = asyncio.get_running_loop().create_future()
+        item = (future, tokens)
+        self._queue.append(item)
+        self._dispatch()
+        
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._abandon(item)
+            self._reject("deadline", expected_wait)
+        except BaseException:
+            self._abandon(item)
+            raise
+        
+        return future.result()
+    
+    def _abandon(self, item) -> None:
+        """Retira da fila uma espera cancelada, devolvendo a vaga se já tinha sido concedida."""
+        future, _ = item
+        if item in self._queue:
+            self._queue.remove(item)
+        elif future.done() and not future.cancelled():
+            future.result().release(AdmissionPermit.ERROR)
+        future.cancel()
+        self._dispatch()
+    
+    def _dispatch(self) -> None:
+        """Admite chamadas do início da fila enquanto houver vaga e quota."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        while self._queue and self.concurrency.available:
+            future, tokens = self._queue[0]
+            delay = max(self.requests.time_until_available(1), self.tokens.time_until_available(tokens))
+            if delay > 0:
+                # Tentar novamente quando a quota for reposta
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            
+            self._queue.popleft()
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self.concurrency.in_flight += 1
+            self.admitted += 1
+            future.set_result(AdmissionPermit(self, tokens))
+    
+    def _release(self, permit: AdmissionPermit, outcome: str) -> None:
+        """Devolve a vaga e ajusta o limite adaptativo."""
+        self.concurrency.in_flight -= 1
+        
+        if outcome == AdmissionPermit.SUCCESS:
+            self.concurrency.on_success()
+            latency = time.monotonic() - permit.started_at
+            self._average_latency = 0.8 * self._average_latency + 0.2 * latency
+        elif outcome == AdmissionPermit.OVERLOAD:
+            self.overloads += 1
+            self.concurrency.on_overload()
+            logger.warning(f"Gemini sobrecarregado: limite de concorrência reduzido para "
+                           f"{int(self.concurrency.limit)}")
+        
+        try:
+            self._dispatch()
+        except RuntimeError:
+            # Sem event loop (liberação fora do loop): próxima aquisição despacha
+            pass
+    
+    def _reject(self, reason: str, expected_wait: float) -> None:
+        """Registra e levanta a recusa."""
+        self.rejected[reason] += 1
+        logger.warning(f"Chamada ao Gemini não admitida: {reason} (espera estimada {expected_wait:.1f}s)")
+        raise AdmissionRejected(reason, expected_wait)
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """Retorna métricas do controle de admissão."""
+        return {
+            "concurrency_limit": int(self.concurrency.limit),
+            "in_flight": self.concurrency.in_flight,
+            "queued": len(self._queue),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "overloads": self.overloads,
+            "average_latency_seconds": round(self._average_latency, 3)
+        }
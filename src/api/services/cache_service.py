@@ -12,13 +12,18 @@ Este módulo implementa um sistema avançado de cache que:
 import hashlib
 import json
 import re
+import sqlite3
+import threading
 import time
+import uuid
+import zlib
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Tuple, Set
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Set
 from enum import Enum
 from dataclasses import dataclass, asdict
 import asyncio
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import logging
 
 from ..config import get_settings
@@ -56,6 +61,8 @@ class CacheEntry:
     ttl_seconds: int
     tags: Set[str]
     confidence_score: float
+    size_bytes: int = 0
+    compressed_response: Optional[bytes] = None
     
     @property
     def expires_at(self) -> datetime:
@@ -87,6 +94,34 @@ class CacheEntry:
         """Atualiza metadados de acesso."""
         self.last_accessed = datetime.now()
         self.access_count += 1
+    
+    @property
+    def is_compressed(self) -> bool:
+        """Verifica se a resposta está armazenada comprimida."""
+        return self.compressed_response is not None
+    
+    def get_response(self) -> Dict[str, Any]:
+        """Retorna cópia da resposta, descomprimindo se necessário."""
+        if self.compressed_response is not None:
+            return json.loads(zlib.decompress(self.compressed_response))
+        return self.response.copy()
+
+
+def _serialize_response(response: Dict[str, Any]) -> bytes:
+    """
+    Serializa a resposta em JSON.
+    
+    JSON (e não pickle) porque o arquivo em disco pode ser compartilhado por
+    vários processos: desserializar não pode executar código. Valores não
+    suportados (datetime, por exemplo) são gravados como texto.
+    """
+    return json.dumps(response, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Trigramas do texto em minúsculas (índices de invalidação por padrão)."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
 
 
 @dataclass
@@ -103,13 +138,28 @@ class CacheMetrics:
     hit_rate: float
     miss_rate: float
     memory_usage_mb: float
+    memory_usage_bytes: int = 0
+    max_memory_mb: float = 0.0
+    compressed_entries: int = 0
+    eviction_policy: str = "lru"
+    evictions: int = 0
+    rejected_admissions: int = 0
+    disk_hits: int = 0
+    pending_disk_writes: int = 0
+    backend: str = "local"
+    shared_invalidations: int = 0
 
 
 class QueryNormalizer:
     """Normalizador de consultas para melhor correspondência de cache."""
     
-    def __init__(self):
-        """Inicializa o normalizador."""
+    def __init__(self, memo_size: int = 4096):
+        """
+        Inicializa o normalizador.
+        
+        Args:
+            memo_size: Máximo de consultas normalizadas memorizadas
+        """
         # Palavras irrelevantes que podem ser removidas
         self.stop_words = {
             "o", "a", "os", "as", "um", "uma", "uns", "umas",
@@ -142,6 +192,33 @@ class QueryNormalizer:
             (r'\b[A-Z]+\d+\b', 'ID_EQUIPAMENTO'),  # Normalizar IDs de equipamento
             (r'\b\d+\b', 'NUMERO'),  # Normalizar números
         ]
+        
+        # Memo LRU de consultas normalizadas e de conjuntos de palavras
+        self.memo_size = memo_size
+        self._normalized_memo: "OrderedDict[str, str]" = OrderedDict()
+        self._tokens_memo: "OrderedDict[str, frozenset]" = OrderedDict()
+        self.compile()
+    
+    def compile(self) -> None:
+        """
+        Pré-compila padrões e o mapa palavra -> forma canônica.
+        
+        Deve ser chamado novamente se stop_words, synonyms ou
+        normalization_patterns forem alterados após a criação.
+        """
+        self._compiled_patterns = [
+            (re.compile(pattern), replacement)
+            for pattern, replacement in self.normalization_patterns
+        ]
+        
+        # Primeira lista que contém o sinônimo vence, como na busca sequencial
+        self._canonical_words: Dict[str, str] = {}
+        for canonical, synonyms in self.synonyms.items():
+            for synonym in synonyms:
+                self._canonical_words.setdefault(synonym, canonical)
+        
+        self._normalized_memo.clear()
+        self._tokens_memo.clear()
     
     def normalize(self, query: str) -> str:
         """
@@ -156,26 +233,30 @@ class QueryNormalizer:
         if not query:
             return ""
         
+        normalized = self._normalized_memo.get(query)
+        if normalized is not None:
+            self._normalized_memo.move_to_end(query)
+            return normalized
+        
+        normalized = self._normalize(query)
+        self._remember(self._normalized_memo, query, normalized)
+        return normalized
+    
+    def _normalize(self, query: str) -> str:
+        """Normaliza a consulta sem consultar o memo."""
         # Converter para lowercase
         normalized = query.lower().strip()
         
         # Aplicar padrões de normalização
-        for pattern, replacement in self.normalization_patterns:
-            normalized = re.sub(pattern, replacement, normalized)
+        for pattern, replacement in self._compiled_patterns:
+            normalized = pattern.sub(replacement, normalized)
         
-        # Expandir sinônimos
-        words = normalized.split()
+        # Expandir sinônimos e remover stop words
+        canonical_words = self._canonical_words
         normalized_words = []
         
-        for word in words:
-            # Verificar se é sinônimo
-            canonical_word = word
-            for canonical, synonyms in self.synonyms.items():
-                if word in synonyms:
-                    canonical_word = canonical
-                    break
-            
-            # Adicionar se não for stop word
+        for word in normalized.split():
+            canonical_word = canonical_words.get(word, word)
             if canonical_word not in self.stop_words:
                 normalized_words.append(canonical_word)
         
@@ -184,6 +265,33 @@ class QueryNormalizer:
         
         return " ".join(normalized_words)
     
+    def tokens(self, normalized_query: str) -> frozenset:
+        """
+        Conjunto de palavras distintas de uma consulta já normalizada.
+        
+        Args:
+            normalized_query: Consulta normalizada
+            
+        Returns:
+            frozenset: Palavras da consulta
+        """
+        words = self._tokens_memo.get(normalized_query)
+        if words is not None:
+            self._tokens_memo.move_to_end(normalized_query)
+            return words
+        
+        words = frozenset(normalized_query.split())
+        self._remember(self._tokens_memo, normalized_query, words)
+        return words
+    
+    def _remember(self, memo: OrderedDict, key: str, value: Any) -> None:
+        """Guarda valor no memo, descartando o menos usado acima do limite."""
+        if self.memo_size <= 0:
+            return
+        memo[key] = value
+        if len(memo) > self.memo_size:
+            memo.popitem(last=False)
+    
     def calculate_similarity(self, query1: str, query2: str) -> float:
         """
         Calcula similaridade entre duas consultas normalizadas.
@@ -195,9 +303,20 @@ class QueryNormalizer:
         Returns:
             float: Score de similaridade (0.0 - 1.0)
         """
-        norm1 = self.normalize(query1)
-        norm2 = self.normalize(query2)
+        return self.normalized_similarity(self.normalize(query1), self.normalize(query2))
+    
+    def normalized_similarity(self, norm1: str, norm2: str, common_words: Optional[int] = None) -> float:
+        """
+        Calcula similaridade entre consultas já normalizadas.
         
+        Args:
+            norm1: Primeira consulta normalizada
+            norm2: Segunda consulta normalizada
+            common_words: Palavras distintas em comum, se já conhecidas
+            
+        Returns:
+            float: Score de similaridade (0.0 - 1.0)
+        """
         if not norm1 or not norm2:
             return 0.0
         
@@ -205,16 +324,16 @@ class QueryNormalizer:
             return 1.0
         
         # Similaridade baseada em palavras comuns
-        words1 = set(norm1.split())
-        words2 = set(norm2.split())
+        words1 = self.tokens(norm1)
+        words2 = self.tokens(norm2)
         
         if not words1 or not words2:
             return 0.0
         
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
+        if common_words is None:
+            common_words = len(words1.intersection(words2))
         
-        jaccard_similarity = len(intersection) / len(union)
+        jaccard_similarity = common_words / (len(words1) + len(words2) - common_words)
         
         # Bonus por ordem similar das palavras
         if len(words1) == len(words2):
@@ -225,6 +344,526 @@ class QueryNormalizer:
         return min(1.0, jaccard_similarity + word_order_bonus)
 
 
+class EvictionPolicy(Enum):
+    """Políticas de remoção quando o cache atinge o tamanho máximo."""
+    LRU = "lru"
+    LFU = "lfu"
+    TINY_LFU = "tiny_lfu"
+
+
+class LRUEviction:
+    """Remove a entrada usada há mais tempo (O(1) via OrderedDict)."""
+    
+    def __init__(self):
+        """Inicializa a ordem de uso."""
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._order)
+    
+    def record_insert(self, key: str, frequency: int = 1) -> None:
+        """Registra inserção (ou sobrescrita) de uma chave."""
+        self._order[key] = None
+        self._order.move_to_end(key)
+    
+    def record_access(self, key: str) -> None:
+        """Registra acesso à chave; chaves ausentes são ignoradas."""
+        if key in self._order:
+            self._order.move_to_end(key)
+    
+    def remove(self, key: str) -> None:
+        """Esquece a chave."""
+        self._order.pop(key, None)
+    
+    def victim(self) -> Optional[str]:
+        """Retorna a próxima chave a ser removida."""
+        return next(iter(self._order), None)
+    
+    def admit(self, key: str) -> bool:
+        """Decide se uma nova chave pode substituir a vítima."""
+        return True
+    
+    def clear(self) -> None:
+        """Esquece todas as chaves."""
+        self._order.clear()
+
+
+class LFUEviction:
+    """
+    Remove a entrada menos acessada, desempatando pela mais antiga.
+    
+    Chaves ficam em buckets por frequência (OrderedDict), de modo que
+    inserção, acesso e escolha da vítima custam O(1).
+    """
+    
+    def __init__(self):
+        """Inicializa os buckets de frequência."""
+        self._frequencies: Dict[str, int] = {}
+        self._buckets: Dict[int, "OrderedDict[str, None]"] = {}
+        self._min_frequency = 0
+    
+    def __len__(self) -> int:
+        return len(self._frequencies)
+    
+    def record_insert(self, key: str, frequency: int = 1) -> None:
+        """Registra inserção com a frequência inicial; sobrescrita conta como acesso."""
+        if key in self._frequencies:
+            self.record_access(key)
+            return
+        
+        frequency = max(1, frequency)
+        self._frequencies[key] = frequency
+        self._buckets.setdefault(frequency, OrderedDict())[key] = None
+        self._min_frequency = min(self._min_frequency or frequency, frequency)
+    
+    def record_access(self, key: str) -> None:
+        """Promove a chave para o bucket seguinte."""
+        frequency = self._frequencies.get(key)
+        if frequency is None:
+            return
+        
+        self._unlink(key, frequency)
+        self._frequencies[key] = frequency + 1
+        self._buckets.setdefault(frequency + 1, OrderedDict())[key] = None
+        
+        if self._min_frequency == frequency and frequency not in self._buckets:
+            self._min_frequency = frequency + 1
+    
+    def remove(self, key: str) -> None:
+        """Esquece a chave."""
+        frequency = self._frequencies.pop(key, None)
+        if frequency is not None:
+            self._unlink(key, frequency)
+    
+    def victim(self) -> Optional[str]:
+        """Retorna a chave mais antiga do bucket de menor frequência."""
+        if not self._buckets:
+            return None
+        
+        if self._min_frequency not in self._buckets:
+            # Expiração/invalidação pode esvaziar o bucket mínimo fora de ordem
+            self._min_frequency = min(self._buckets)
+        
+        return next(iter(self._buckets[self._min_frequency]))
+    
+    def admit(self, key: str) -> bool:
+        """Decide se uma nova chave pode substituir a vítima."""
+        return True
+    
+    def clear(self) -> None:
+        """Esquece todas as chaves."""
+        self._frequencies.clear()
+        self._buckets.clear()
+        self._min_frequency = 0
+    
+    def _unlink(self, key: str, frequency: int) -> None:
+        """Remove a chave do seu bucket, descartando buckets vazios."""
+        bucket = self._buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[frequency]
+
+
+class FrequencySketch:
+    """
+    Count-Min Sketch com contadores de 4 bits e envelhecimento periódico.
+    
+    Estima a frequência recente de chaves (inclusive as que não estão no
+    cache) com memória fixa; a cada `sample_size` incrementos todos os
+    contadores são divididos por dois.
+    """
+    
+    MAX_COUNT = 15
+    
+    def __init__(self, capacity: int, depth: int = 4):
+        """
+        Inicializa o sketch.
+        
+        Args:
+            capacity: Número esperado de entradas no cache
+            depth: Número de linhas (funções de hash)
+        """
+        width = 16
+        while width < capacity:
+            width <<= 1
+        
+        self._mask = width - 1
+        self._tables = [bytearray(width) for _ in range(depth)]
+        self._sample_size = 10 * width
+        self._additions = 0
+    
+    def increment(self, key: str) -> None:
+        """Incrementa a frequência estimada da chave."""
+        for seed, table in enumerate(self._tables):
+            index = hash((seed, key)) & self._mask
+            if table[index] < self.MAX_COUNT:
+                table[index] += 1
+        
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._age()
+    
+    def estimate(self, key: str) -> int:
+        """Retorna a frequência estimada da chave."""
+        return min(
+            table[hash((seed, key)) & self._mask]
+            for seed, table in enumerate(self._tables)
+        )
+    
+    def clear(self) -> None:
+        """Zera todos os contadores."""
+        for table in self._tables:
+            table[:] = bytes(len(table))
+        self._additions = 0
+    
+    def _age(self) -> None:
+        """Divide todos os contadores por dois."""
+        for table in self._tables:
+            table[:] = bytes(count >> 1 for count in table)
+        self._additions //= 2
+
+
+class TinyLFUEviction(LRUEviction):
+    """
+    LRU com admissão TinyLFU.
+    
+    Com o cache cheio, uma nova chave só entra se sua frequência recente
+    (incluindo misses) for pelo menos a da vítima LRU, o que impede que
+    varreduras de consultas únicas expulsem entradas populares.
+    """
+    
+    def __init__(self, capacity: int):
+        """Inicializa a ordem de uso e o sketch de frequência."""
+        super().__init__()
+        self._sketch = FrequencySketch(capacity)
+    
+    def record_access(self, key: str) -> None:
+        """Registra acesso à chave, presente no cache ou não."""
+        self._sketch.increment(key)
+        super().record_access(key)
+    
+    def admit(self, key: str) -> bool:
+        """Admite a chave se ela for ao menos tão frequente quanto a vítima."""
+        victim = self.victim()
+        if victim is None:
+            return True
+        return self._sketch.estimate(key) >= self._sketch.estimate(victim)
+    
+    def clear(self) -> None:
+        """Esquece todas as chaves e frequências."""
+        super().clear()
+        self._sketch.clear()
+
+
+class CacheBackend(Enum):
+    """Onde as respostas em cache são compartilhadas."""
+    LOCAL = "local"  # Memória do processo (+ camada em disco privada)
+    SHARED = "shared"  # Arquivo SQLite WAL compartilhado entre workers do mesmo host
+
+
+class DiskCacheTier:
+    """
+    Camada persistente do cache em SQLite.
+    
+    Guarda as respostas em JSON comprimido com zlib junto com o instante de
+    expiração, de modo que o TTL continua valendo após reinícios. Os métodos são
+    síncronos e devem ser chamados fora do event loop (asyncio.to_thread).
+    
+    No modo compartilhado vários processos usam o mesmo arquivo: o WAL
+    permite leituras concorrentes e o busy_timeout serializa as escritas.
+    Cada sobrescrita ou remoção é registrada em `cache_invalidations`, para
+    que os demais processos descartem suas cópias em memória.
+    
+    Tags e trigramas da query original ficam em tabelas indexadas
+    (`cache_entry_tags`, `cache_entry_trigrams`), de modo que invalidar por
+    tag ou padrão custa proporcionalmente às entradas afetadas e não ao
+    tamanho do arquivo.
+    """
+    
+    COLUMNS = (
+        "key", "original_query", "normalized_query", "payload", "compressed",
+        "created_at", "expires_at", "ttl_seconds", "tags", "confidence_score"
+    )
+    
+    # Versão do formato do arquivo (PRAGMA user_version); versões anteriores
+    # são descartadas na abertura (a versão 1 guardava respostas em pickle e
+    # a 2 não tinha os índices de tags e trigramas)
+    SCHEMA_VERSION = 3
+    
+    # Tempo de espera pelo lock de escrita de outro processo (segundos)
+    BUSY_TIMEOUT = 5.0
+    
+    # Registros de invalidação mais antigos que isso são descartados (segundos)
+    INVALIDATION_RETENTION = 3600
+    
+    def __init__(self, path: Path, shared: bool = False):
+        """
+        Inicializa a camada em disco (a conexão é aberta no primeiro uso).
+        
+        Args:
+            path: Arquivo SQLite
+            shared: Registrar invalidações para outros processos
+        """
+        self.path = Path(path)
+        self.shared = shared
+        self.origin = uuid.uuid4().hex  # Identifica as escritas deste processo
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None  # PRAGMA data_version da última leitura do log
+        self._lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Abre a conexão e cria o schema se necessário."""
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(
+                str(self.path), timeout=self.BUSY_TIMEOUT, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            if connection.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+                # Formato antigo: é só cache, então descartar em vez de migrar
+                connection.execute("DROP TABLE IF EXISTS cache_entries")
+                connection.execute("DROP TABLE IF EXISTS cache_entry_tags")
+                connection.execute("DROP TABLE IF EXISTS cache_entry_trigrams")
+                connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    original_query TEXT NOT NULL,
+                    normalized_query TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    compressed INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    ttl_seconds INTEGER NOT NULL,
+                    tags TEXT NOT NULL,
+                    confidence_score REAL NOT NULL
+                )
+            """)
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS idx_cache_entries_expires_at ON cache_entries (expires_at)"
+            )
+            for table, column in (("cache_entry_tags", "tag"), ("cache_entry_trigrams", "trigram")):
+                connection.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        {column} TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        PRIMARY KEY ({column}, key)
+                    ) WITHOUT ROWID
+                """)
+                connection.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_key ON {table} (key)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cache_invalidations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    key TEXT,
+                    origin TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            connection.commit()
+            self._connection = connection
+        return self._connection
+    
+    def get(self, key: str) -> Optional[Tuple]:
+        """Retorna a linha da chave se ela ainda não expirou."""
+        with self._lock:
+            return self._connect().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM cache_entries WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+    
+    def write_batch(self, rows: List[Tuple], deleted_keys: List[str]) -> None:
+        """Grava (upsert) e remove entradas em uma única transação."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                # Sobrescritas também removem as tags e trigramas anteriores
+                self._delete_keys(connection, [row[0] for row in rows] + list(deleted_keys))
+                if rows:
+                    placeholders = ", ".join("?" for _ in self.COLUMNS)
+                    connection.executemany(
+                        f"INSERT OR REPLACE INTO cache_entries ({', '.join(self.COLUMNS)}) "
+                        f"VALUES ({placeholders})",
+                        rows
+                    )
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO cache_entry_tags (tag, key) VALUES (?, ?)",
+                        [(tag, row[0]) for row in rows for tag in json.loads(row[8])]
+                    )
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO cache_entry_trigrams (trigram, key) VALUES (?, ?)",
+                        [(trigram, row[0]) for row in rows for trigram in _trigrams(row[1])]
+                    )
+                self._log_invalidations(connection, [row[0] for row in rows] + list(deleted_keys))
+    
+    @staticmethod
+    def _delete_keys(connection: sqlite3.Connection, keys: List[str]) -> None:
+        """Remove as entradas e suas linhas nos índices de tags e trigramas."""
+        if not keys:
+            return
+        params = [(key,) for key in keys]
+        for table in ("cache_entries", "cache_entry_tags", "cache_entry_trigrams"):
+            connection.executemany(f"DELETE FROM {table} WHERE key = ?", params)
+    
+    def _log_invalidations(self, connection: sqlite3.Connection, keys: Iterable[Optional[str]]) -> None:
+        """Registra chaves alteradas (None = cache limpo) para os outros processos."""
+        if not self.shared:
+            return
+        now = time.time()
+        connection.executemany(
+            "INSERT INTO cache_invalidations (key, origin, created_at) VALUES (?, ?, ?)",
+            [(key, self.origin, now) for key in keys]
+        )
+    
+    def last_invalidation_id(self) -> int:
+        """Retorna o id do registro de invalidação mais recente."""
+        with self._lock:
+            row = self._connect().execute("SELECT MAX(id) FROM cache_invalidations").fetchone()
+            return row[0] or 0
+    
+    def invalidations_since(self, last_id: int) -> Tuple[int, Set[str], bool]:
+        """
+        Lê invalidações feitas por outros processos após `last_id`.
+        
+        Args:
+            last_id: Último registro já aplicado por este processo
+            
+        Returns:
+            (novo último id, chaves invalidadas, se o cache foi limpo)
+        """
+        with self._lock:
+            connection = self._connect()
+            # data_version só muda quando outra conexão grava no arquivo
+            data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return last_id, set(), False
+            self._data_version = data_version
+            rows = connection.execute(
+                "SELECT id, key, origin FROM cache_invalidations WHERE id > ? ORDER BY id",
+                (last_id,)
+            ).fetchall()
+            oldest_id = connection.execute("SELECT MIN(id) FROM cache_invalidations").fetchone()[0]
+            if oldest_id is None:
+                # Log vazio: o próximo id é o seguinte ao último já usado
+                sequence = connection.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = 'cache_invalidations'"
+                ).fetchone()
+                oldest_id = (sequence[0] if sequence else 0) + 1
+        
+        keys: Set[str] = set()
+        # Registros após last_id já descartados pela retenção: nada é confiável.
+        # Lacunas entre ids não bastam (transações desfeitas também consomem ids
+        # do AUTOINCREMENT); o log só foi truncado se o mais antigo ainda
+        # retido vem depois do próximo que este processo esperava.
+        cleared = last_id > 0 and oldest_id > last_id + 1
+        for row_id, key, origin in rows:
+            last_id = row_id
+            if origin == self.origin:
+                continue
+            if key is None:
+                cleared = True
+            else:
+                keys.add(key)
+        return last_id, keys, cleared
+    
+    def delete_matching(
+        self,
+        tags: Optional[Set[str]] = None,
+        pattern: Optional[str] = None,
+        pattern_trigrams: Optional[Set[str]] = None,
+        older_than: Optional[datetime] = None
+    ) -> List[str]:
+        """
+        Remove entradas com alguma das tags, cuja query casa com o padrão ou
+        criadas antes de `older_than`.
+        
+        Args:
+            tags: Tags a invalidar (consulta ao índice de tags)
+            pattern: Regex aplicada à query original (sem diferenciar maiúsculas)
+            pattern_trigrams: Trigramas obrigatórios do padrão; só as entradas
+                que contêm todos são verificadas com a regex (vazio = todas)
+            older_than: Invalidar entradas mais antigas que esta data
+            
+        Returns:
+            Lista de chaves removidas
+        """
+        with self._lock:
+            connection = self._connect()
+            keys: Set[str] = set()
+            
+            if tags:
+                tags = list(tags)
+                keys.update(key for key, in connection.execute(
+                    f"SELECT DISTINCT key FROM cache_entry_tags WHERE tag IN ({', '.join('?' for _ in tags)})",
+                    tags
+                ))
+            
+            if pattern:
+                if pattern_trigrams:
+                    trigrams = list(pattern_trigrams)
+                    rows = connection.execute(
+                        "SELECT key, original_query FROM cache_entries WHERE key IN ("
+                        "SELECT key FROM cache_entry_trigrams "
+                        f"WHERE trigram IN ({', '.join('?' for _ in trigrams)}) "
+                        "GROUP BY key HAVING COUNT(*) = ?)",
+                        trigrams + [len(trigrams)]
+                    )
+                else:
+                    rows = connection.execute("SELECT key, original_query FROM cache_entries")
+                keys.update(
+                    key for key, original_query in rows
+                    if re.search(pattern, original_query, re.IGNORECASE)
+                )
+            
+            if older_than:
+                keys.update(key for key, in connection.execute(
+                    "SELECT key FROM cache_entries WHERE created_at < ?", (older_than.timestamp(),)
+                ))
+            
+            keys = list(keys)
+            with connection:
+                self._delete_keys(connection, keys)
+                self._log_invalidations(connection, keys)
+            return keys
+    
+    def purge_expired(self) -> int:
+        """Remove entradas expiradas e retorna quantas foram removidas."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                now = time.time()
+                for table in ("cache_entry_tags", "cache_entry_trigrams"):
+                    connection.execute(
+                        f"DELETE FROM {table} WHERE key IN "
+                        "(SELECT key FROM cache_entries WHERE expires_at <= ?)",
+                        (now,)
+                    )
+                cursor = connection.execute(
+                    "DELETE FROM cache_entries WHERE expires_at <= ?", (now,)
+                )
+                connection.execute(
+                    "DELETE FROM cache_invalidations WHERE created_at <= ?",
+                    (time.time() - self.INVALIDATION_RETENTION,)
+                )
+            return cursor.rowcount
+    
+    def clear(self) -> None:
+        """Remove todas as entradas."""
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                for table in ("cache_entries", "cache_entry_tags", "cache_entry_trigrams"):
+                    connection.execute(f"DELETE FROM {table}")
+                self._log_invalidations(connection, [None])
+    
+    def close(self) -> None:
+        """Fecha a conexão."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
 class CacheService:
     """
     Serviço principal de cache para respostas do LLM.
@@ -237,14 +876,22 @@ class CacheService:
     - Limpeza automática de entradas expiradas
     """
     
-    def __init__(self):
-        """Inicializa o serviço de cache."""
+    def __init__(self, eviction_policy: EvictionPolicy = EvictionPolicy.LRU):
+        """
+        Inicializa o serviço de cache.
+        
+        Args:
+            eviction_policy: Política de remoção quando o cache enche
+        """
         self.settings = get_settings()
         self.normalizer = QueryNormalizer()
         
         # Armazenamento do cache
         self.cache: Dict[str, CacheEntry] = {}
         self.query_index: Dict[str, Set[str]] = defaultdict(set)  # normalized_query -> cache_keys
+        self.token_index: Dict[str, Set[str]] = defaultdict(set)  # palavra -> normalized_queries
+        self.tag_index: Dict[str, Set[str]] = defaultdict(set)  # tag -> cache_keys
+        self.trigram_index: Dict[str, Set[str]] = defaultdict(set)  # trigrama da query original -> cache_keys
         
         # Configurações
         self.max_cache_size = 1000
@@ -252,10 +899,37 @@ class CacheService:
         self.similarity_threshold = 0.8
         self.cleanup_interval = 300  # 5 minutos
         
+        # Orçamento de memória (bytes serializados das entradas) e compressão
+        self.max_memory_bytes = 256 * 1024 * 1024  # 0 = sem limite
+        self.compression_threshold = 4096  # Respostas maiores são comprimidas (0 desativa)
+        self.compression_level = 6
+        self.memory_usage_bytes = 0
+        
+        # Camada persistente opcional, gravada de forma assíncrona (write-behind)
+        self.disk_tier: Optional[DiskCacheTier] = None
+        self.disk_flush_delay = 0.5  # Segundos para agrupar gravações
+        self._pending_writes: Dict[str, Optional[Tuple]] = {}  # chave -> linha (None = remover)
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        
+        # Backend compartilhado: invalidações de outros workers ainda não aplicadas
+        self.backend = CacheBackend.LOCAL
+        self._invalidation_cursor: Optional[int] = None
+        self.shared_sync_interval = 0.05  # Intervalo mínimo entre leituras do log (segundos)
+        self._last_shared_sync = 0.0
+        
+        # Política de remoção (estrutura O(1) mantida a cada get/set)
+        self.eviction_policy = eviction_policy
+        self._eviction = self._create_eviction(eviction_policy)
+        
         # Métricas
         self.total_requests = 0
         self.cache_hits = 0
         self.cache_misses = 0
+        self.evictions = 0
+        self.rejected_admissions = 0
+        self.disk_hits = 0
+        self.shared_invalidations = 0
         
         # Controle da task de limpeza
         self._cleanup_task = None
@@ -263,9 +937,35 @@ class CacheService:
         logger.info("CacheService inicializado", extra={
             "max_size": self.max_cache_size,
             "default_ttl": self.default_ttl,
-            "similarity_threshold": self.similarity_threshold
+            "similarity_threshold": self.similarity_threshold,
+            "eviction_policy": eviction_policy.value
         })
     
+    def _create_eviction(self, policy: EvictionPolicy):
+        """Cria a estrutura de remoção para a política escolhida."""
+        if policy == EvictionPolicy.LFU:
+            return LFUEviction()
+        if policy == EvictionPolicy.TINY_LFU:
+            return TinyLFUEviction(self.max_cache_size)
+        return LRUEviction()
+    
+    def set_eviction_policy(self, policy: EvictionPolicy) -> None:
+        """
+        Troca a política de remoção mantendo as entradas atuais.
+        
+        Args:
+            policy: Nova política de remoção
+        """
+        eviction = self._create_eviction(policy)
+        
+        # Reconstruir a estrutura na ordem de uso (mais antigas primeiro)
+        for entry in sorted(self.cache.values(), key=lambda e: e.last_accessed):
+            eviction.record_insert(entry.key, entry.access_count)
+        
+        self.eviction_policy = policy
+        self._eviction = eviction
+        logger.info(f"Política de remoção do cache: {policy.value}")
+    
     def _start_cleanup_task(self) -> None:
         """Inicia task de limpeza automática."""
         try:
@@ -299,16 +999,198 @@ class CacheService:
         
         if expired_keys:
             logger.info(f"Limpeza do cache: {len(expired_keys)} entradas removidas")
+        
+        if self.disk_tier is not None:
+            purged = await asyncio.to_thread(self.disk_tier.purge_expired)
+            if purged:
+                logger.info(f"Limpeza do cache em disco: {purged} entradas removidas")
+    
+    def enable_disk_tier(self, path: Path, backend: CacheBackend = CacheBackend.LOCAL) -> None:
+        """
+        Ativa a camada persistente em SQLite abaixo do cache em memória.
+        
+        Com CacheBackend.SHARED o arquivo é compartilhado pelos workers do
+        host: as gravações vão ao disco imediatamente e cada worker aplica as
+        invalidações dos demais antes de consultar a memória.
+        
+        Args:
+            path: Arquivo SQLite da camada em disco
+            backend: LOCAL (arquivo privado) ou SHARED (entre processos)
+        """
+        shared = backend == CacheBackend.SHARED
+        self.disk_tier = DiskCacheTier(path, shared=shared)
+        self.backend = backend
+        self._invalidation_cursor = None
+        if shared:
+            # Outros workers só enxergam o que já está no disco
+            self.disk_flush_delay = 0.0
+        logger.info(f"Camada de cache em disco ativada: {path} (backend {backend.value})")
+    
+    async def _sync_shared_invalidations(self) -> None:
+        """
+        Descarta da memória entradas alteradas ou removidas por outros workers.
+        
+        Roda no caminho de toda consulta, então o log é lido no máximo uma vez
+        a cada `shared_sync_interval`: uma invalidação feita em outro worker
+        pode levar até esse intervalo para valer aqui.
+        """
+        if self.disk_tier is None or not self.disk_tier.shared:
+            return
+        
+        now = time.monotonic()
+        if now - self._last_shared_sync < self.shared_sync_interval:
+            return
+        self._last_shared_sync = now
+        
+        try:
+            if self._invalidation_cursor is None:
+                # Memória começa vazia: só interessa o que vier depois
+                self._invalidation_cursor = await asyncio.to_thread(self.disk_tier.last_invalidation_id)
+                return
+            
+            self._invalidation_cursor, keys, cleared = await asyncio.to_thread(
+                self.disk_tier.invalidations_since, self._invalidation_cursor
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao sincronizar invalidações do cache compartilhado: {str(e)}")
+            return
+        
+        if cleared:
+            self.shared_invalidations += len(self.cache)
+            self._clear_memory()
+            return
+        
+        for key in keys:
+            if key in self.cache:
+                await self._remove_entry(key)
+                self.shared_invalidations += 1
+    
+    async def flush(self) -> None:
+        """Grava no disco as entradas pendentes (write-behind)."""
+        if self.disk_tier is None:
+            return
+        
+        async with self._flush_lock:
+            while self._pending_writes:
+                pending, self._pending_writes = self._pending_writes, {}
+                rows = [row for row in pending.values() if row is not None]
+                deleted_keys = [key for key, row in pending.items() if row is None]
+                
+                try:
+                    await asyncio.to_thread(self.disk_tier.write_batch, rows, deleted_keys)
+                except Exception as e:
+                    logger.error(f"Erro ao gravar cache em disco: {str(e)}")
+                    break
+    
+    async def close(self) -> None:
+        """Grava pendências e fecha a camada em disco."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        
+        if self.disk_tier is not None:
+            await self.flush()
+            await asyncio.to_thread(self.disk_tier.close)
+    
+    def _schedule_disk_write(self, key: str, row: Optional[Tuple]) -> None:
+        """Enfileira gravação (ou remoção, se `row` for None) na camada em disco."""
+        if self.disk_tier is None:
+            return
+        
+        self._pending_writes[key] = row
+        
+        if self._flush_task is None or self._flush_task.done():
+            try:
+                self._flush_task = asyncio.create_task(self._delayed_flush())
+            except RuntimeError:
+                # Sem event loop - pendências serão gravadas no próximo flush
+                pass
+    
+    async def _delayed_flush(self) -> None:
+        """Agrupa gravações próximas antes de ir ao disco."""
+        try:
+            await asyncio.sleep(self.disk_flush_delay)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+    
+    async def _load_from_disk(self, key: str) -> Optional[CacheEntry]:
+        """Busca entrada válida na camada em disco (ou nas gravações pendentes)."""
+        if key in self._pending_writes:
+            row = self._pending_writes[key]
+        else:
+            try:
+                row = await asyncio.to_thread(self.disk_tier.get, key)
+            except Exception as e:
+                logger.warning(f"Erro ao ler cache em disco: {str(e)}")
+                return None
+        
+        if row is None:
+            return None
+        
+        entry = self._row_to_entry(row)
+        return None if entry.is_expired else entry
+    
+    def _entry_to_row(self, entry: CacheEntry) -> Tuple:
+        """Serializa entrada para a camada em disco (payload sempre em JSON + zlib)."""
+        if entry.is_compressed:
+            payload = entry.compressed_response
+        else:
+            payload = zlib.compress(_serialize_response(entry.response), self.compression_level)
+        
+        created_at = entry.created_at.timestamp()
+        return (
+            entry.key,
+            entry.original_query,
+            entry.normalized_query,
+            payload,
+            int(entry.is_compressed),
+            created_at,
+            created_at + entry.ttl_seconds,
+            entry.ttl_seconds,
+            json.dumps(sorted(entry.tags)),
+            entry.confidence_score
+        )
+    
+    def _row_to_entry(self, row: Tuple) -> CacheEntry:
+        """Reconstrói entrada a partir da camada em disco."""
+        (key, original_query, normalized_query, payload, compressed,
+         created_at, _expires_at, ttl_seconds, tags, confidence_score) = row
+        
+        # `compressed` indica se a entrada fica comprimida também em memória
+        serialized = None if compressed else zlib.decompress(payload)
+        entry = CacheEntry(
+            key=key,
+            original_query=original_query,
+            normalized_query=normalized_query,
+            response={} if compressed else json.loads(serialized),
+            created_at=datetime.fromtimestamp(created_at),
+            last_accessed=datetime.now(),
+            access_count=1,
+            ttl_seconds=ttl_seconds,
+            tags=set(json.loads(tags)),
+            confidence_score=confidence_score,
+            compressed_response=bytes(payload) if compressed else None
+        )
+        entry.size_bytes = self._entry_size(entry, len(payload) if compressed else len(serialized))
+        return entry
     
     async def _remove_entry(self, key: str) -> None:
         """Remove uma entrada do cache e índices."""
+        self._eviction.remove(key)
+        
         if key in self.cache:
             entry = self.cache[key]
+            self.memory_usage_bytes -= entry.size_bytes
             
             # Remover do índice de consultas
             self.query_index[entry.normalized_query].discard(key)
             if not self.query_index[entry.normalized_query]:
                 del self.query_index[entry.normalized_query]
+                self._unindex_tokens(entry.normalized_query)
+            
+            # Remover dos índices de invalidação
+            self._discard_from_index(self.tag_index, entry.tags, key)
+            self._discard_from_index(self.trigram_index, _trigrams(entry.original_query), key)
             
             # Remover do cache principal
             del self.cache[key]
@@ -368,6 +1250,8 @@ class CacheService:
         
         self.total_requests += 1
         
+        await self._sync_shared_invalidations()
+        
         # Tentar busca exata primeiro
         cache_key = self._generate_cache_key(query, context)
         
@@ -376,6 +1260,7 @@ class CacheService:
             
             if not entry.is_expired:
                 entry.update_access()
+                self._eviction.record_access(cache_key)
                 self.cache_hits += 1
                 
                 logger.debug("Cache hit exato", extra={
@@ -384,7 +1269,29 @@ class CacheService:
                     "status": entry.status.value
                 })
                 
-                response = entry.response.copy()
+                response = entry.get_response()
+                response["cache_used"] = True
+                response["cache_status"] = entry.status.value
+                response["cache_age_seconds"] = int((datetime.now() - entry.created_at).total_seconds())
+                
+                return response
+        
+        # Tentar camada em disco (promovendo a entrada para a memória)
+        if self.disk_tier is not None:
+            entry = await self._load_from_disk(cache_key)
+            
+            if entry is not None:
+                await self._store_entry(entry)
+                self._eviction.record_access(cache_key)
+                self.cache_hits += 1
+                self.disk_hits += 1
+                
+                logger.debug("Cache hit em disco", extra={
+                    "cache_key": cache_key[:8],
+                    "query": query[:50]
+                })
+                
+                response = entry.get_response()
                 response["cache_used"] = True
                 response["cache_status"] = entry.status.value
                 response["cache_age_seconds"] = int((datetime.now() - entry.created_at).total_seconds())
@@ -397,6 +1304,7 @@ class CacheService:
             
             if similar_entry:
                 similar_entry.update_access()
+                self._eviction.record_access(similar_entry.key)
                 self.cache_hits += 1
                 
                 logger.debug("Cache hit por similaridade", extra={
@@ -405,14 +1313,15 @@ class CacheService:
                     "similarity_strategy": strategy.value
                 })
                 
-                response = similar_entry.response.copy()
+                response = similar_entry.get_response()
                 response["cache_used"] = True
                 response["cache_status"] = "similar_match"
                 response["cache_similarity"] = True
                 
                 return response
         
-        # Cache miss
+        # Cache miss (conta para a frequência da chave na admissão TinyLFU)
+        self._eviction.record_access(cache_key)
         self.cache_misses += 1
         logger.debug("Cache miss", extra={
             "query": query[:50],
@@ -442,10 +1351,13 @@ class CacheService:
         best_entry = None
         best_similarity = 0.0
         
-        for norm_query, cache_keys in self.query_index.items():
-            similarity = self.normalizer.calculate_similarity(normalized_query, norm_query)
+        for norm_query, common_words in self._similar_candidates(normalized_query):
+            similarity = self.normalizer.normalized_similarity(
+                normalized_query, norm_query, common_words
+            )
             
             if similarity >= self.similarity_threshold and similarity > best_similarity:
+                cache_keys = self.query_index.get(norm_query, ())
                 # Encontrar a entrada mais recente e não expirada
                 for key in cache_keys:
                     if key in self.cache:
@@ -457,6 +1369,42 @@ class CacheService:
         
         return best_entry
     
+    def _similar_candidates(self, normalized_query: str) -> List[Tuple[str, int]]:
+        """
+        Retorna consultas indexadas que compartilham palavras com a consulta.
+        
+        Usa o índice invertido palavra -> consultas normalizadas, de modo que
+        apenas consultas com interseção não vazia são comparadas.
+        
+        Args:
+            normalized_query: Consulta já normalizada
+            
+        Returns:
+            Lista de (consulta normalizada, palavras distintas em comum)
+        """
+        common_words: Dict[str, int] = defaultdict(int)
+        
+        for word in self.normalizer.tokens(normalized_query):
+            for norm_query in self.token_index.get(word, ()):
+                common_words[norm_query] += 1
+        
+        return list(common_words.items())
+    
+    def _index_tokens(self, normalized_query: str) -> None:
+        """Adiciona as palavras da consulta ao índice invertido."""
+        for word in self.normalizer.tokens(normalized_query):
+            self.token_index[word].add(normalized_query)
+    
+    def _unindex_tokens(self, normalized_query: str) -> None:
+        """Remove as palavras da consulta do índice invertido."""
+        for word in self.normalizer.tokens(normalized_query):
+            queries = self.token_index.get(word)
+            if queries is None:
+                continue
+            queries.discard(normalized_query)
+            if not queries:
+                del self.token_index[word]
+    
     async def set(
         self, 
         query: str, 
@@ -481,10 +1429,6 @@ class CacheService:
         cache_key = self._generate_cache_key(query, context)
         normalized_query = self.normalizer.normalize(query)
         
-        # Verificar se precisa fazer limpeza por tamanho
-        if len(self.cache) >= self.max_cache_size:
-            await self._evict_entries()
-        
         # Criar entrada do cache
         entry = CacheEntry(
             key=cache_key,
@@ -498,36 +1442,124 @@ class CacheService:
             tags=tags or set(),
             confidence_score=response.get("confidence_score", 0.0)
         )
+        self._pack_response(entry)
         
-        # Armazenar no cache
-        self.cache[cache_key] = entry
-        self.query_index[normalized_query].add(cache_key)
+        # Persistir independentemente da admissão na memória
+        self._schedule_disk_write(cache_key, self._entry_to_row(entry))
+        
+        if not await self._store_entry(entry):
+            return cache_key
         
         logger.debug("Entrada adicionada ao cache", extra={
             "cache_key": cache_key[:8],
             "query": query[:50],
             "ttl": entry.ttl_seconds,
-            "cache_size": len(self.cache)
+            "cache_size": len(self.cache),
+            "size_bytes": entry.size_bytes,
+            "compressed": entry.is_compressed
         })
         
         return cache_key
     
-    async def _evict_entries(self) -> None:
-        """Remove entradas do cache para liberar espaço."""
-        # Estratégia: remover 20% das entradas menos acessadas ou mais antigas
-        entries_to_remove = int(self.max_cache_size * 0.2)
+    async def _store_entry(self, entry: CacheEntry) -> bool:
+        """
+        Insere entrada na camada em memória, removendo outras se necessário.
+        
+        Args:
+            entry: Entrada já medida por _pack_response
+            
+        Returns:
+            bool: False se a entrada não foi admitida
+        """
+        cache_key = entry.key
+        
+        if self.max_memory_bytes and entry.size_bytes > self.max_memory_bytes:
+            logger.warning("Resposta maior que o orçamento de memória do cache", extra={
+                "cache_key": cache_key[:8],
+                "size_bytes": entry.size_bytes
+            })
+            return False
+        
+        if cache_key in self.cache:
+            # Sobrescrita: liberar a entrada anterior antes de medir o espaço
+            await self._remove_entry(cache_key)
+        elif self._needs_eviction(entry.size_bytes) and not self._eviction.admit(cache_key):
+            self.rejected_admissions += 1
+            logger.debug("Entrada não admitida no cache", extra={
+                "cache_key": cache_key[:8],
+                "query": entry.original_query[:50]
+            })
+            return False
+        
+        # Verificar se precisa fazer limpeza por tamanho ou memória
+        if self._needs_eviction(entry.size_bytes):
+            await self._evict_entries(entry.size_bytes)
+        
+        # Armazenar no cache
+        self.cache[cache_key] = entry
+        self.memory_usage_bytes += entry.size_bytes
+        if entry.normalized_query not in self.query_index:
+            self._index_tokens(entry.normalized_query)
+        self.query_index[entry.normalized_query].add(cache_key)
+        for tag in entry.tags:
+            self.tag_index[tag].add(cache_key)
+        for trigram in _trigrams(entry.original_query):
+            self.trigram_index[trigram].add(cache_key)
+        self._eviction.record_insert(cache_key)
+        return True
+    
+    def _pack_response(self, entry: CacheEntry) -> None:
+        """
+        Mede a entrada em bytes e comprime respostas grandes.
         
-        # Ordenar por critério de remoção (menos acessadas, mais antigas)
-        sorted_entries = sorted(
-            self.cache.items(),
-            key=lambda x: (x[1].access_count, x[1].last_accessed)
+        O tamanho contabilizado é o da resposta serializada (comprimida,
+        quando for o caso) mais as strings de chave e consultas.
+        
+        Args:
+            entry: Entrada recém-criada, com `response` ainda em memória
+        """
+        payload = _serialize_response(entry.response)
+        
+        if self.compression_threshold and len(payload) >= self.compression_threshold:
+            compressed = zlib.compress(payload, self.compression_level)
+            if len(compressed) < len(payload):
+                entry.compressed_response = compressed
+                entry.response = {}
+                payload = compressed
+        
+        entry.size_bytes = self._entry_size(entry, len(payload))
+    
+    @staticmethod
+    def _entry_size(entry: CacheEntry, payload_bytes: int) -> int:
+        """Bytes contabilizados para a entrada (payload + chave e consultas)."""
+        return (
+            payload_bytes
+            + len(entry.key)
+            + len(entry.original_query.encode("utf-8"))
+            + len(entry.normalized_query.encode("utf-8"))
+        )
+    
+    def _needs_eviction(self, incoming_bytes: int = 0) -> bool:
+        """Verifica se inserir uma nova entrada estoura tamanho ou memória."""
+        if len(self.cache) >= self.max_cache_size:
+            return True
+        return bool(self.max_memory_bytes) and (
+            self.memory_usage_bytes + incoming_bytes > self.max_memory_bytes
         )
+    
+    async def _evict_entries(self, incoming_bytes: int = 0) -> None:
+        """Remove entradas escolhidas pela política até liberar espaço para uma nova."""
+        removed = 0
         
-        for i in range(min(entries_to_remove, len(sorted_entries))):
-            key = sorted_entries[i][0]
+        while self.cache and self._needs_eviction(incoming_bytes):
+            key = self._eviction.victim()
+            if key is None:
+                break
             await self._remove_entry(key)
+            removed += 1
         
-        logger.info(f"Cache eviction: {entries_to_remove} entradas removidas")
+        self.evictions += removed
+        logger.debug(f"Cache eviction: {removed} entradas removidas")
     
     async def invalidate(
         self, 
@@ -546,41 +1578,197 @@ class CacheService:
         Returns:
             int: Número de entradas invalidadas
         """
-        keys_to_remove = []
-        
-        for key, entry in self.cache.items():
-            should_remove = False
-            
+        def should_remove(original_query: str, entry_tags: Set[str], created_at: datetime) -> bool:
             # Verificar padrão
-            if pattern and re.search(pattern, entry.original_query, re.IGNORECASE):
-                should_remove = True
+            if pattern and re.search(pattern, original_query, re.IGNORECASE):
+                return True
             
             # Verificar tags
-            if tags and entry.tags.intersection(tags):
-                should_remove = True
+            if tags and entry_tags.intersection(tags):
+                return True
             
             # Verificar idade
-            if older_than and entry.created_at < older_than:
-                should_remove = True
-            
-            if should_remove:
-                keys_to_remove.append(key)
+            return bool(older_than and created_at < older_than)
+        
+        keys_to_remove = self._invalidation_candidates(pattern, tags, older_than)
         
         # Remover entradas
         for key in keys_to_remove:
             await self._remove_entry(key)
         
-        logger.info(f"Cache invalidation: {len(keys_to_remove)} entradas removidas")
-        return len(keys_to_remove)
+        removed = set(keys_to_remove)
+        
+        if self.disk_tier is not None:
+            # Descartar gravações pendentes e linhas já persistidas
+            for key, row in list(self._pending_writes.items()):
+                if row is not None and should_remove(
+                    row[1], set(json.loads(row[8])), datetime.fromtimestamp(row[5])
+                ):
+                    self._pending_writes[key] = None
+                    removed.add(key)
+            
+            async with self._flush_lock:
+                removed.update(await asyncio.to_thread(
+                    self.disk_tier.delete_matching,
+                    tags, pattern, self._pattern_trigrams(pattern) if pattern else None, older_than
+                ))
+        
+        logger.info(f"Cache invalidation: {len(removed)} entradas removidas")
+        return len(removed)
+    
+    def _invalidation_candidates(
+        self,
+        pattern: Optional[str],
+        tags: Optional[Set[str]],
+        older_than: Optional[datetime]
+    ) -> Set[str]:
+        """
+        Seleciona as chaves a invalidar usando os índices de tags e trigramas.
+        
+        Tags vêm direto do índice reverso; para o padrão, apenas entradas que
+        contêm todos os trigramas dos trechos literais obrigatórios são
+        verificadas com a regex. Só `older_than` (ou um padrão sem trechos
+        literais) exige percorrer o cache.
+        """
+        keys: Set[str] = set()
+        
+        if tags:
+            for tag in tags:
+                keys.update(self.tag_index.get(tag, ()))
+        
+        if pattern:
+            candidates = self._pattern_candidates(pattern)
+            if candidates is None:
+                candidates = self.cache.keys()
+            keys.update(
+                key for key in candidates
+                if key in self.cache
+                and re.search(pattern, self.cache[key].original_query, re.IGNORECASE)
+            )
+        
+        if older_than:
+            keys.update(key for key, entry in self.cache.items() if entry.created_at < older_than)
+        
+        return keys
+    
+    def _pattern_trigrams(self, pattern: str) -> Set[str]:
+        """Trigramas que toda query que casa com o padrão precisa conter."""
+        trigrams = set()
+        for literal in self._required_literals(pattern):
+            trigrams.update(_trigrams(literal))
+        return trigrams
+    
+    def _pattern_candidates(self, pattern: str) -> Optional[Set[str]]:
+        """Chaves que contêm os trigramas obrigatórios do padrão (None = sem filtro)."""
+        trigrams = self._pattern_trigrams(pattern)
+        if not trigrams:
+            return None
+        
+        # Interseção começando pelo trigrama mais raro
+        postings = sorted((self.trigram_index.get(trigram, set()) for trigram in trigrams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return candidates
+    
+    @staticmethod
+    def _required_literals(pattern: str) -> List[str]:
+        """
+        Extrai trechos literais que toda correspondência do padrão precisa conter.
+        
+        A análise é conservadora: alternâncias descartam tudo, conteúdo de
+        grupos e classes é ignorado e caracteres seguidos de quantificador
+        opcional (`*`, `?`, `{`) são removidos do trecho.
+        """
+        if "|" in pattern:
+            return []
+        
+        literals: List[str] = []
+        current: List[str] = []
+        depth = 0
+        i = 0
+        
+        def flush():
+            if current:
+                literals.append("".join(current))
+                current.clear()
+        
+        while i < len(pattern):
+            char = pattern[i]
+            
+            if char == "\\":
+                escaped = pattern[i + 1] if i + 1 < len(pattern) else ""
+                if escaped.isalnum() or not escaped:
+                    flush()
+                elif depth == 0:
+                    current.append(escaped)
+                i += 2
+                continue
+            
+            if char == "[":
+                flush()
+                # Pular a classe de caracteres inteira
+                i += 2 if pattern[i + 1:i + 2] == "]" else 1
+                while i < len(pattern) and pattern[i] != "]":
+                    i += 2 if pattern[i] == "\\" else 1
+            elif char == "(":
+                flush()
+                depth += 1
+            elif char == ")":
+                flush()
+                depth = max(0, depth - 1)
+            elif char in "*?{":
+                if current:
+                    current.pop()
+                flush()
+                if char == "{":
+                    while i < len(pattern) and pattern[i] != "}":
+                        i += 1
+            elif char in ".^$+":
+                flush()
+            elif depth == 0:
+                current.append(char)
+            
+            i += 1
+        
+        flush()
+        return literals
+    
+    @staticmethod
+    def _discard_from_index(index: Dict[str, Set[str]], values: Iterable[str], key: str) -> None:
+        """Remove a chave das listas do índice, descartando listas vazias."""
+        for value in values:
+            keys = index.get(value)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del index[value]
     
     async def clear(self) -> None:
         """Limpa todo o cache."""
         cache_size = len(self.cache)
-        self.cache.clear()
-        self.query_index.clear()
+        self._clear_memory()
+        
+        if self.disk_tier is not None:
+            async with self._flush_lock:
+                self._pending_writes.clear()
+                await asyncio.to_thread(self.disk_tier.clear)
         
         logger.info(f"Cache completamente limpo: {cache_size} entradas removidas")
     
+    def _clear_memory(self) -> None:
+        """Esvazia a camada em memória e seus índices."""
+        self.cache.clear()
+        self.query_index.clear()
+        self.token_index.clear()
+        self.tag_index.clear()
+        self.trigram_index.clear()
+        self.memory_usage_bytes = 0
+        self._eviction.clear()
+    
     async def get_metrics(self) -> CacheMetrics:
         """
         Retorna métricas detalhadas do cache.
@@ -596,12 +1784,11 @@ class CacheService:
         expired_count = sum(1 for entry in self.cache.values() if entry.is_expired)
         stale_count = sum(1 for entry in self.cache.values() if entry.is_stale and not entry.is_expired)
         
-        # Calcular tamanho médio das respostas
-        total_size = sum(len(str(entry.response)) for entry in self.cache.values())
-        avg_response_size = total_size / len(self.cache) if self.cache else 0.0
+        # Tamanho médio das entradas (bytes contabilizados na inserção)
+        avg_response_size = self.memory_usage_bytes / len(self.cache) if self.cache else 0.0
+        compressed_count = sum(1 for entry in self.cache.values() if entry.is_compressed)
         
-        # Estimativa de uso de memória (simplificada)
-        memory_usage = total_size / (1024 * 1024)  # MB
+        memory_usage = self.memory_usage_bytes / (1024 * 1024)  # MB
         
         return CacheMetrics(
             total_requests=self.total_requests,
@@ -614,7 +1801,17 @@ class CacheService:
             average_response_size=avg_response_size,
             hit_rate=round(hit_rate, 3),
             miss_rate=round(miss_rate, 3),
-            memory_usage_mb=round(memory_usage, 2)
+            memory_usage_mb=round(memory_usage, 3),
+            memory_usage_bytes=self.memory_usage_bytes,
+            max_memory_mb=round(self.max_memory_bytes / (1024 * 1024), 2),
+            compressed_entries=compressed_count,
+            eviction_policy=self.eviction_policy.value,
+            evictions=self.evictions,
+            rejected_admissions=self.rejected_admissions,
+            disk_hits=self.disk_hits,
+            pending_disk_writes=len(self._pending_writes),
+            backend=self.backend.value,
+            shared_invalidations=self.shared_invalidations
         )
     
     async def get_cache_info(self, query: str) -> Dict[str, Any]:
@@ -650,7 +1847,7 @@ class CacheService:
         # Buscar entradas similares
         similar_entry = await self._find_similar_entry(query)
         if similar_entry:
-            similarity = self.normalizer.calculate_similarity(
+            similarity = self.normalizer.normalized_similarity(
                 normalized_query, 
                 similar_entry.normalized_query
             )
@@ -702,7 +1899,9 @@ class CacheService:
         if metrics.expired_entries > metrics.cache_size * 0.2:
             recommendations.append("Muitas entradas expiradas - considere reduzir TTL")
         
-        if metrics.memory_usage_mb > 100:
+        if metrics.max_memory_mb and metrics.memory_usage_mb > metrics.max_memory_mb * 0.9:
+            recommendations.append("Orçamento de memória quase esgotado - considere aumentar o limite ou reduzir o threshold de compressão")
+        elif metrics.memory_usage_mb > 100:
             recommendations.append("Alto uso de memória - considere limpeza mais frequente")
         
         return recommendations 
\ No newline at end of file
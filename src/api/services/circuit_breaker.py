@@ -0,0 +1,229 @@
+"""
+Circuit breaker da integração com o Google Gemini.
+
+Acompanha, em uma janela móvel de tempo, a taxa de erro e a taxa de chamadas
+lentas. Quando alguma ultrapassa o limite, o circuito abre e as chamadas são
+recusadas na hora (CircuitBreakerOpen), indo direto ao FallbackService sem
+tentativas nem backoff. Após o tempo de abertura, o circuito fica meio-aberto
+e deixa passar poucas chamadas de teste: se todas tiverem sucesso ele fecha,
+se alguma falhar ele volta a abrir.
+"""
+
+import time
+from collections import deque
+from datetime import datetime
+from enum import Enum
+from typing import Any, Deque, Dict, Tuple
+
+from ...utils.error_handlers import LLMServiceError
+from ...utils.logger import get_logger
+
+# Configurar logger
+logger = get_logger(__name__)
+
+
+class CircuitState(Enum):
+    """Estados do circuit breaker."""
+    CLOSED = "closed"  # Chamadas normais
+    OPEN = "open"  # Chamadas recusadas até o fim do tempo de abertura
+    HALF_OPEN = "half_open"  # Poucas chamadas de teste decidem se o circuito fecha
+
+
+class CircuitBreakerOpen(LLMServiceError):
+    """Chamada ao LLM recusada porque o circuito está aberto."""
+    
+    def __init__(self, retry_after: float):
+        """
+        Args:
+            retry_after: Segundos até o circuito aceitar chamadas de teste
+        """
+        self.retry_after = retry_after
+        super().__init__(
+            f"Circuit breaker do Gemini aberto: chamada não realizada (nova tentativa em {retry_after:.0f}s)",
+            service_name="gemini",
+            details={"retry_after": round(retry_after, 1)}
+        )
+
+
+class CircuitBreaker:
+    """Circuit breaker com janelas móveis de taxa de erro e de latência."""
+    
+    def __init__(
+        self,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: float = 15.0,
+        slow_call_rate_threshold: float = 0.8,
+        window_seconds: float = 60.0,
+        minimum_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 3,
+        name: str = "gemini"
+    ):
+        """
+        Inicializa o circuito fechado.
+        
+        Args:
+            failure_rate_threshold: Fração de falhas na janela que abre o circuito
+            slow_call_threshold: Latência (segundos) a partir da qual a chamada é lenta
+            slow_call_rate_threshold: Fração de chamadas lentas que abre o circuito
+            window_seconds: Duração da janela móvel
+            minimum_calls: Chamadas mínimas na janela antes de avaliar as taxas
+            open_duration: Tempo (segundos) aberto antes das chamadas de teste
+            half_open_max_calls: Chamadas de teste no estado meio-aberto
+            name: Nome usado nos logs
+        """
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_duration = open_duration
+        self.half_open_max_calls = half_open_max_calls
+        self.name = name
+        
+        self.state = CircuitState.CLOSED
+        self.last_state_change = datetime.now()
+        self._opened_at = 0.0
+        
+        # Janela móvel de (instante, falhou, lenta) e contadores mantidos junto
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._failures = 0
+        self._slow_calls = 0
+        
+        # Chamadas de teste no estado meio-aberto
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        
+        # Métricas
+        self.times_opened = 0
+        self.short_circuited = 0
+    
+    @property
+    def retry_after(self) -> float:
+        """Segundos até o circuito aberto aceitar chamadas de teste (0 se não aberto)."""
+        if self.state is not CircuitState.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.open_duration - time.monotonic())
+    
+    @property
+    def is_open(self) -> bool:
+        """Indica se chamadas seriam recusadas agora."""
+        return self.state is CircuitState.OPEN and self.retry_after > 0
+    
+    def allow_request(self) -> bool:
+        """
+        Decide se uma chamada pode ser feita.
+        
+        Toda chamada permitida deve ser concluída com record_success,
+        record_failure ou record_ignored.
+        """
+        self._refresh_state()
+        if self.state is CircuitState.OPEN:
+            self.short_circuited += 1
+            return False
+        
+        if self.state is CircuitState.HALF_OPEN:
+            if self._half_open_in_flight >= self.half_open_max_calls:
+                self.short_circuited += 1
+                return False
+            self._half_open_in_flight += 1
+        
+        return True
+    
+    def _refresh_state(self) -> None:
+        """Passa de aberto para meio-aberto quando o tempo de abertura termina."""
+        if self.state is CircuitState.OPEN and self.retry_after <= 0:
+            self._transition(CircuitState.HALF_OPEN)
+    
+    def record_success(self, latency: float) -> None:
+        """Registra chamada concluída com sucesso (lenta conta contra o circuito)."""
+        self._record(False, latency)
+    
+    def record_failure(self, latency: float) -> None:
+        """Registra chamada com falha do serviço (erro, timeout, 429)."""
+        self._record(True, latency)
+    
+    def record_ignored(self) -> None:
+        """Libera uma chamada permitida que não chegou a avaliar o serviço."""
+        if self.state is CircuitState.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+    
+    def _record(self, failed: bool, latency: float) -> None:
+        """Registra o resultado e aplica as transições de estado."""
+        slow = latency >= self.slow_call_threshold
+        
+        if self.state is CircuitState.HALF_OPEN:
+            self._half_open_in_flight = max(0, self._half_open_in_flight - 1)
+            if failed or slow:
+                self._transition(CircuitState.OPEN)
+                return
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.half_open_max_calls:
+                self._transition(CircuitState.CLOSED)
+            return
+        
+        if self.state is CircuitState.OPEN:
+            # Chamada iniciada antes da abertura: não altera a decisão
+            return
+        
+        now = time.monotonic()
+        self._calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow_calls += slow
+        self._trim(now)
+        
+        if len(self._calls) >= self.minimum_calls:
+            failure_rate, slow_call_rate = self._rates()
+            if failure_rate >= self.failure_rate_threshold or slow_call_rate >= self.slow_call_rate_threshold:
+                self._transition(CircuitState.OPEN)
+    
+    def _trim(self, now: float) -> None:
+        """Descarta chamadas fora da janela móvel."""
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            _, failed, slow = self._calls.popleft()
+            self._failures -= failed
+            self._slow_calls -= slow
+    
+    def _rates(self) -> Tuple[float, float]:
+        """Taxas de falha e de chamadas lentas na janela (contadores, sem percorrê-la)."""
+        if not self._calls:
+            return 0.0, 0.0
+        total = len(self._calls)
+        return self._failures / total, self._slow_calls / total
+    
+    def _transition(self, state: CircuitState) -> None:
+        """Muda de estado, reiniciando a janela e as chamadas de teste."""
+        previous = self.state
+        self.state = state
+        self.last_state_change = datetime.now()
+        self._calls.clear()
+        self._failures = 0
+        self._slow_calls = 0
+        self._half_open_in_flight = 0
+        self._half_open_successes = 0
+        
+        if state is CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+            self.times_opened += 1
+            logger.warning(f"Circuit breaker {self.name} aberto por {self.open_duration:.0f}s "
+                           f"(estado anterior: {previous.value})")
+        else:
+            logger.info(f"Circuit breaker {self.name}: {previous.value} -> {state.value}")
+    
+    def get_status(self) -> Dict[str, Any]:
+        """Retorna estado e taxas da janela atual."""
+        # Sem tráfego, o fim do tempo de abertura também deve aparecer no status
+        self._refresh_state()
+        self._trim(time.monotonic())
+        failure_rate, slow_call_rate = self._rates()
+        
+        return {
+            "state": self.state.value,
+            "failure_rate": round(failure_rate, 3),
+            "slow_call_rate": round(slow_call_rate, 3),
+            "calls_in_window": len(self._calls),
+            "retry_after_seconds": round(self.retry_after, 1),
+            "last_state_change": self.last_state_change.isoformat(),
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited
+        }
@@ -10,7 +10,7 @@ import json
 import hashlib
 import time
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, AsyncIterator, List, Optional, Union
 import logging
 
 import google.generativeai as genai
@@ -18,6 +18,8 @@ from google.generativeai.types import HarmCategory, HarmBlockThreshold
 from google.api_core import exceptions as google_exceptions
 
 from ..config import get_settings
+from .admission_control import AdmissionPermit, AdmissionRejected, LLMAdmissionController
+from .circuit_breaker import CircuitBreaker, CircuitBreakerOpen
 from src.utils.error_handlers import LLMServiceError as LLMError, ValidationError
 from src.utils.logger import get_logger
 # Fallback e cache services serão importados dinamicamente quando disponíveis
@@ -39,6 +41,23 @@ class LLMService:
     - Monitoramento de custos e performance
     """
     
+    # Tags de assunto -> tipo de dado do ETL do qual a resposta depende
+    TAG_DATA_TYPES = {
+        "transformador": "equipment",
+        "gerador": "equipment",
+        "status": "equipment",
+        "manutencao": "maintenance",
+        "falha": "failure",
+    }
+    
+    # Intenções que consultam um único equipamento: respostas dependem só dele
+    SINGLE_EQUIPMENT_INTENTS = {
+        "equipment_search",
+        "equipment_status",
+        "last_maintenance",
+        "maintenance_history",
+    }
+    
     def __init__(self):
         """Inicializa o serviço LLM."""
         self.settings = get_settings()
@@ -46,6 +65,16 @@ class LLMService:
         self._model = None
         self._initialize_gemini()
         
+        # Chamadas pelo cliente gRPC assíncrono do SDK (generate_content_async)
+        self.use_async_client = True
+        
+        # Controle de admissão (quotas, concorrência AIMD e fila) antes de cada chamada
+        self.admission: Optional[LLMAdmissionController] = None
+        self.admission_budget = 10.0  # Espera máxima por vaga antes do fallback (segundos)
+        
+        # Circuit breaker: com o Gemini degradado, vai direto ao fallback sem tentativas
+        self.circuit_breaker = CircuitBreaker()
+        
         # Inicializar sistemas opcionais
         self.fallback_service = None
         self.cache_service = None
@@ -58,6 +87,17 @@ class LLMService:
         self.cache_hits = 0
         self.error_count = 0
         self.fallback_used_count = 0
+        self.coalesced_requests = 0
+        
+        # Gerações em andamento por chave de cache (single-flight)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        
+        # Stale-while-revalidate: atualizações de entradas obsoletas em segundo plano
+        self.stale_while_revalidate = True
+        self.max_concurrent_revalidations = 2
+        self._revalidations: Dict[str, asyncio.Future] = {}
+        self.revalidation_count = 0
+        self.revalidations_skipped = 0
         
         # Métricas de queries "não sei"
         self.unknown_query_count = 0
@@ -264,43 +304,73 @@ Responda diretamente baseado nas informações disponíveis."""
             
         Raises:
             LLMError: Se todas as tentativas falharem
+            AdmissionRejected: Se não houver vaga dentro do orçamento de espera
         """
         last_error = None
+        deadline = self._admission_deadline()
         
         for attempt in range(max_retries):
+            self._enter_circuit()
+            permit = None
+            outcome = AdmissionPermit.ERROR
+            failed = None  # None: a chamada não chegou a avaliar o Gemini
+            started = time.monotonic()
             try:
+                permit = await self._admit(prompt, deadline)
+                started = time.monotonic()
                 logger.debug(f"Tentativa {attempt + 1} de chamada ao Gemini")
                 
-                # Usar timeout
+                # Usar timeout (no cliente nativo, o estouro cancela a chamada gRPC)
                 response = await asyncio.wait_for(
-                    asyncio.to_thread(self._model.generate_content, prompt),
+                    self._generate_content(prompt),
                     timeout=self.settings.gemini_timeout
                 )
                 
                 if response.text:
                     logger.debug("Resposta recebida do Gemini com sucesso")
+                    outcome = AdmissionPermit.SUCCESS
+                    failed = False
                     return response.text.strip()
                 else:
                     raise LLMError("Resposta vazia do Gemini")
                     
+            except AdmissionRejected:
+                raise
+                
             except asyncio.TimeoutError:
+                outcome = AdmissionPermit.OVERLOAD
+                failed = True
                 last_error = LLMError(f"Timeout na tentativa {attempt + 1}")
                 logger.warning(f"Timeout no Gemini - tentativa {attempt + 1}")
                 
             except google_exceptions.ResourceExhausted:
+                outcome = AdmissionPermit.OVERLOAD
+                failed = True
                 last_error = LLMError("Quota de API do Gemini excedida")
                 logger.error("Quota de API excedida")
-                break  # Não adianta tentar novamente
+                if self.admission is None:
+                    break  # Sem controle de admissão, nova tentativa só agravaria
                 
             except google_exceptions.InvalidArgument as e:
+                # Erro da requisição, não do serviço: não conta no circuit breaker
                 last_error = LLMError(f"Argumento inválido para Gemini: {str(e)}")
                 logger.error(f"Argumento inválido: {str(e)}")
                 break  # Não adianta tentar novamente
                 
             except Exception as e:
+                failed = True
                 last_error = LLMError(f"Erro no Gemini: {str(e)}")
                 logger.warning(f"Erro na tentativa {attempt + 1}: {str(e)}")
             
+            finally:
+                if permit is not None:
+                    permit.release(outcome)
+                self._exit_circuit(failed, time.monotonic() - started)
+            
+            # Circuito aberto por esta falha: não adianta esperar pelo backoff
+            if self.circuit_breaker.is_open:
+                break
+            
             # Aguardar antes da próxima tentativa
             if attempt < max_retries - 1:
                 await asyncio.sleep(2 ** attempt)  # Backoff exponencial
@@ -457,6 +527,9 @@ Responda diretamente baseado nas informações disponíveis."""
         """
         Gera resposta usando Google Gemini com cache inteligente e fallback automático.
         
+        Requisições simultâneas com a mesma chave de cache aguardam uma única
+        geração e recebem o mesmo resultado (single-flight).
+        
         Args:
             user_query: Pergunta do usuário em linguagem natural
             sql_query: Query SQL gerada (opcional)
@@ -476,15 +549,129 @@ Responda diretamente baseado nas informações disponíveis."""
             - cache_status: Status do cache se usado
             - fallback_used: Se foi usado sistema de fallback
             - fallback_reason: Motivo do fallback (se aplicável)
+            - request_coalesced: Presente se a resposta veio de geração compartilhada
             
         Raises:
             LLMError: Se falhar na geração da resposta e fallback
             ValidationError: Se dados de entrada inválidos
         """
+        if context is None:
+            context = {}
+        
+        # Perguntas idênticas em andamento compartilham uma única geração
+        key = self._coalescing_key(user_query, context)
+        task = self._inflight.get(key)
+        
+        if task is None:
+            self.request_count += 1
+            task = asyncio.ensure_future(self._generate_response(
+                user_query, sql_query, query_results, context, session_id, cache_strategy
+            ))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(key, done))
+            return dict(await asyncio.shield(task))
+        
+        self.coalesced_requests += 1
+        start_time = time.time()
+        logger.info("Requisição agrupada com geração em andamento", extra={
+            "session_id": session_id,
+            "coalescing_key": key[:8]
+        })
+        
+        # shield: o cancelamento de um chamador não interrompe os demais
+        response = dict(await asyncio.shield(task))
+        response["processing_time"] = int((time.time() - start_time) * 1000)
+        response["request_coalesced"] = True
+        return response
+    
+    def _coalescing_key(self, user_query: str, context: Dict[str, Any]) -> str:
+        """Chave de agrupamento: a mesma chave usada pelo cache de respostas."""
+        if self.cache_service:
+            try:
+                return self.cache_service._generate_cache_key(user_query, context)
+            except Exception as e:
+                logger.warning(f"Erro ao gerar chave de cache: {e}")
+        
+        key_data = json.dumps({"query": user_query, "context": context}, sort_keys=True, default=str)
+        return hashlib.sha256(key_data.encode()).hexdigest()[:16]
+    
+    def _schedule_revalidation(
+        self,
+        user_query: str,
+        sql_query: Optional[str],
+        query_results: Optional[List[Dict[str, Any]]],
+        context: Dict[str, Any],
+        cache_strategy: str
+    ) -> bool:
+        """
+        Agenda a regeneração em segundo plano de uma resposta obsoleta do cache.
+        
+        No máximo `max_concurrent_revalidations` atualizações rodam ao mesmo
+        tempo; acima disso a entrada continua obsoleta até o próximo acesso.
+        
+        Returns:
+            bool: True se a atualização foi agendada ou já está em andamento
+        """
+        if not self.stale_while_revalidate:
+            return False
+        
+        key = self._coalescing_key(user_query, context)
+        if key in self._revalidations:
+            return True
+        
+        if len(self._revalidations) >= self.max_concurrent_revalidations:
+            self.revalidations_skipped += 1
+            return False
+        
+        task = asyncio.ensure_future(self._revalidate(
+            user_query, sql_query, query_results, context, cache_strategy
+        ))
+        self._revalidations[key] = task
+        task.add_done_callback(lambda done: self._revalidations.pop(key, None))
+        return True
+    
+    async def _revalidate(
+        self,
+        user_query: str,
+        sql_query: Optional[str],
+        query_results: Optional[List[Dict[str, Any]]],
+        context: Dict[str, Any],
+        cache_strategy: str
+    ) -> None:
+        """Regenera a resposta ignorando o cache; o resultado substitui a entrada obsoleta."""
+        try:
+            await self._generate_response(
+                user_query, sql_query, query_results, context, None, cache_strategy,
+                skip_cache_lookup=True
+            )
+            self.revalidation_count += 1
+            logger.info("Entrada obsoleta do cache atualizada em segundo plano", extra={
+                "query": user_query[:50]
+            })
+        except Exception as e:
+            logger.warning(f"Erro ao atualizar entrada obsoleta do cache: {str(e)}")
+    
+    def _finish_inflight(self, key: str, task: asyncio.Future) -> None:
+        """Remove a geração concluída do registro de requisições em andamento."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        
+        # Marcar exceção como observada caso todos os chamadores tenham cancelado
+        if not task.cancelled():
+            task.exception()
+    
+    async def _generate_response(
+        self,
+        user_query: str,
+        sql_query: Optional[str],
+        query_results: Optional[List[Dict[str, Any]]],
+        context: Dict[str, Any],
+        session_id: Optional[str],
+        cache_strategy: str,
+        skip_cache_lookup: bool = False
+    ) -> Dict[str, Any]:
+        """Gera a resposta (cache, Gemini e fallback) para generate_response."""
         start_time = time.time()
-        self.request_count += 1
-        llm_response = None
-        llm_error = None
         
         try:
             # Validar entrada
@@ -499,31 +686,12 @@ Responda diretamente baseado nas informações disponíveis."""
                 query_results = []
             
             # Tentar buscar no cache primeiro (se disponível)
-            cached_response = None
-            if self.cache_service:
-                try:
-                    cached_response = await self.cache_service.get(
-                        query=user_query,
-                        context=context,
-                        strategy=cache_strategy
-                    )
-                except Exception as e:
-                    logger.warning(f"Erro no cache: {e}")
-            
-            if cached_response:
-                self.cache_hits += 1
-                processing_time = int((time.time() - start_time) * 1000)
-                
-                logger.info("Resposta servida do cache inteligente", extra={
-                    "session_id": session_id,
-                    "cache_strategy": cache_strategy,
-                    "cache_status": cached_response.get("cache_status"),
-                    "processing_time": processing_time
-                })
-                
-                # Atualizar tempo de processamento no cache hit
-                cached_response["processing_time"] = processing_time
-                return cached_response
+            if not skip_cache_lookup:
+                cached_response = await self._lookup_cache(
+                    user_query, sql_query, query_results, context, session_id, cache_strategy, start_time
+                )
+                if cached_response:
+                    return cached_response
             
             logger.info("Gerando resposta com Gemini", extra={
                 "session_id": session_id,
@@ -533,156 +701,510 @@ Responda diretamente baseado nas informações disponíveis."""
             })
             
             try:
-                # Tentar gerar resposta com Gemini
-                system_prompt = self._create_system_prompt()
-                user_prompt = self._create_user_prompt(user_query, query_results, context)
-                full_prompt = f"{system_prompt}\n\n{user_prompt}"
-                
                 # Chamar Gemini
                 response_text = await self._call_gemini_with_retry(
-                    full_prompt, 
+                    self._create_full_prompt(user_query, query_results, context),
                     max_retries=self.settings.gemini_max_retries
                 )
                 
-                # Validar e limpar resposta
-                llm_response = self._validate_and_clean_response(response_text)
-                
-                # Calcular confiança da resposta do LLM
-                confidence_score = self._calculate_confidence_score(
-                    user_query, query_results, llm_response
+                return await self._complete_response(
+                    user_query, sql_query, query_results, context, session_id, response_text, start_time
                 )
                 
-                # Verificar se deve usar fallback (se disponível)
-                should_fallback = False
-                if self.fallback_service:
-                    try:
-                        should_fallback, fallback_trigger = self.fallback_service.should_use_fallback(
-                            llm_response=llm_response,
-                            original_query=user_query,
-                            llm_confidence=confidence_score,
-                            error=None
-                        )
-                        
-                        if should_fallback:
-                            logger.info("Fallback ativado por resposta inadequada do LLM", extra={
-                                "trigger": fallback_trigger.value,
-                                "confidence": confidence_score,
-                                "session_id": session_id
-                            })
-                            return await self._generate_fallback_response(
-                                user_query, fallback_trigger, start_time, session_id, context
-                            )
-                    except Exception as e:
-                        logger.warning(f"Erro no fallback service: {e}")
-                
-                # Resposta do LLM é adequada, processar e cachear
-                processing_time = int((time.time() - start_time) * 1000)
-                suggestions = self._generate_suggestions(user_query, query_results)
-                
-                sources = ["gemini_llm"]
-                if query_results:
-                    sources.extend(["equipment_data", "maintenance_data"])
-                if sql_query:
-                    sources.append("sql_database")
-                
-                final_response = {
-                    "response": llm_response,
-                    "confidence_score": confidence_score,
-                    "sources": list(set(sources)),
-                    "suggestions": suggestions,
-                    "processing_time": processing_time,
-                    "data_records_used": len(query_results),
-                    "cache_used": False,
-                    "fallback_used": False,
-                    "timestamp": datetime.now().isoformat()
-                }
-                
-                # Armazenar no cache inteligente (se disponível)
-                if self.cache_service:
-                    try:
-                        cache_tags = self._generate_cache_tags(user_query, context, query_results)
-                        await self.cache_service.set(
-                            query=user_query,
-                            response=final_response,
-                            context=context,
-                            ttl=self._calculate_cache_ttl(confidence_score, len(query_results)),
-                            tags=cache_tags
-                        )
-                    except Exception as e:
-                        logger.warning(f"Erro ao armazenar no cache: {e}")
-                
-                logger.info("Resposta gerada e cacheada com sucesso", extra={
-                    "session_id": session_id,
-                    "confidence": confidence_score,
-                    "processing_time": processing_time,
-                    "data_records": len(query_results),
-                    "cache_ttl": self._calculate_cache_ttl(confidence_score, len(query_results))
-                })
-                
-                return final_response
-                
             except Exception as e:
                 # Erro na geração com LLM - ativar fallback
-                llm_error = e
-                logger.warning(f"Erro no LLM, ativando fallback: {str(e)}", extra={
+                return await self._recover_from_llm_error(user_query, e, start_time, session_id, context)
+        
+        except ValidationError:
+            # Erros de validação não devem usar fallback
+            raise
+        except Exception as e:
+            return self._emergency_response(e, start_time, session_id)
+    
+    async def generate_response_stream(
+        self,
+        user_query: str,
+        sql_query: Optional[str] = None,
+        query_results: Optional[List[Dict[str, Any]]] = None,
+        context: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        cache_strategy: str = "normalized_match"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Gera resposta em streaming, repassando os trechos à medida que o Gemini os produz.
+        
+        Emite eventos {"type": "token", "text": ...} e, ao final, um único
+        {"type": "done", "response": {...}} com a resposta completa no mesmo
+        formato de generate_response (já validada e armazenada no cache). Se a
+        validação ou o fallback alterarem o texto, o evento final prevalece
+        sobre os trechos enviados. Respostas do cache são enviadas em um único
+        trecho. Não participa do agrupamento de requisições idênticas, pois
+        cada cliente precisa receber os próprios trechos.
+        
+        Args:
+            user_query: Pergunta do usuário em linguagem natural
+            sql_query: Query SQL gerada (opcional)
+            query_results: Resultados da query SQL
+            context: Contexto adicional da conversa
+            session_id: ID da sessão para tracking
+            cache_strategy: Estratégia de cache a usar
+            
+        Yields:
+            Dict com o evento de streaming
+            
+        Raises:
+            ValidationError: Se dados de entrada inválidos
+        """
+        if not user_query or not user_query.strip():
+            raise ValidationError("Query do usuário não pode estar vazia")
+        
+        start_time = time.time()
+        context = context or {}
+        query_results = query_results or []
+        self.request_count += 1
+        
+        try:
+            final_response = await self._lookup_cache(
+                user_query, sql_query, query_results, context, session_id, cache_strategy, start_time
+            )
+            
+            if final_response is None:
+                logger.info("Gerando resposta com Gemini (streaming)", extra={
                     "session_id": session_id,
-                    "error_type": type(e).__name__
+                    "query_length": len(user_query),
+                    "data_records": len(query_results)
                 })
                 
-                # Usar fallback se disponível, senão retornar erro simples
-                if self.fallback_service:
-                    try:
-                        # Determinar trigger de fallback baseado no erro
-                        should_fallback, fallback_trigger = self.fallback_service.should_use_fallback(
-                            llm_response=None,
-                            original_query=user_query,
-                            llm_confidence=None,
-                            error=e
-                        )
-                        
-                        if should_fallback:
-                            return await self._generate_fallback_response(
-                                user_query, fallback_trigger, start_time, session_id, context, str(e)
-                            )
-                    except Exception as fb_error:
-                        logger.error(f"Erro no fallback service: {fb_error}")
+                chunks = []
+                try:
+                    async for text in self._stream_gemini(self._create_full_prompt(user_query, query_results, context)):
+                        chunks.append(text)
+                        yield {"type": "token", "text": text}
+                    
+                    final_response = await self._complete_response(
+                        user_query, sql_query, query_results, context, session_id, "".join(chunks), start_time
+                    )
+                except Exception as e:
+                    final_response = await self._recover_from_llm_error(
+                        user_query, e, start_time, session_id, context
+                    )
                 
-                # Se fallback não disponível ou falhou, retornar resposta de erro simples
-                processing_time = int((time.time() - start_time) * 1000)
-                return {
-                    "response": "Desculpe, não consegui processar sua solicitação no momento. Tente novamente mais tarde.",
-                    "confidence_score": 0.1,
-                    "sources": ["error_fallback"],
-                    "suggestions": ["Tente uma pergunta mais simples", "Verifique sua conexão"],
-                    "processing_time": processing_time,
-                    "cache_used": False,
-                    "fallback_used": True,
-                    "error": str(e),
-                    "timestamp": datetime.now().isoformat()
-                }
+                if not chunks:
+                    yield {"type": "token", "text": final_response["response"]}
+            else:
+                yield {"type": "token", "text": final_response["response"]}
         
-        except ValidationError:
-            # Erros de validação não devem usar fallback
-            raise
         except Exception as e:
-            # Último recurso - erro geral
-            logger.error(f"Erro geral no LLMService: {str(e)}", extra={
-                "session_id": session_id
-            })
+            final_response = self._emergency_response(e, start_time, session_id)
+            yield {"type": "token", "text": final_response["response"]}
+        
+        yield {"type": "done", "response": final_response}
+    
+    async def _stream_gemini(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Chama Gemini em modo streaming.
+        
+        Cada trecho é aguardado com o timeout configurado. Só há nova
+        tentativa se a falha ocorrer antes do primeiro trecho, pois trechos já
+        entregues não podem ser desfeitos.
+        
+        Args:
+            prompt: Prompt completo para enviar
             
-            # Fallback de emergência
-            processing_time = int((time.time() - start_time) * 1000)
-            return {
-                "response": "Desculpe, estou com dificuldades técnicas no momento. Tente novamente mais tarde.",
-                "confidence_score": 0.1,
-                "sources": ["emergency_fallback"],
-                "suggestions": ["Tente uma pergunta mais simples", "Recarregue a página"],
-                "processing_time": processing_time,
-                "cache_used": False,
-                "fallback_used": True,
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+        Yields:
+            str: Trechos de texto na ordem recebida
+            
+        Raises:
+            LLMError: Se o streaming falhar
+        """
+        max_retries = self.settings.gemini_max_retries
+        deadline = self._admission_deadline()
+        
+        for attempt in range(max_retries):
+            emitted = False
+            self._enter_circuit()
+            permit = None
+            outcome = AdmissionPermit.ERROR
+            failed = None
+            started = time.monotonic()
+            first_chunk_latency = None  # Latência do stream para o circuit breaker
+            try:
+                permit = await self._admit(prompt, deadline)
+                started = time.monotonic()
+                stream = await asyncio.wait_for(
+                    self._generate_content(prompt, stream=True),
+                    timeout=self.settings.gemini_timeout
+                )
+                chunks = stream.__aiter__() if hasattr(stream, "__aiter__") else iter(stream)
+                
+                while True:
+                    chunk = await asyncio.wait_for(
+                        self._next_chunk(chunks),
+                        timeout=self.settings.gemini_timeout
+                    )
+                    if chunk is None:
+                        break
+                    if chunk.text:
+                        if not emitted:
+                            first_chunk_latency = time.monotonic() - started
+                        emitted = True
+                        yield chunk.text
+                
+                if not emitted:
+                    raise LLMError("Resposta vazia do Gemini")
+                outcome = AdmissionPermit.SUCCESS
+                failed = False
+                return
+                
+            except AdmissionRejected:
+                raise
+            except asyncio.TimeoutError:
+                outcome = AdmissionPermit.OVERLOAD
+                failed = True
+                error = LLMError(f"Timeout no streaming do Gemini (tentativa {attempt + 1})")
+            except google_exceptions.ResourceExhausted:
+                outcome = AdmissionPermit.OVERLOAD
+                failed = True
+                self.error_count += 1
+                raise LLMError("Quota de API do Gemini excedida")
+            except google_exceptions.InvalidArgument as e:
+                self.error_count += 1
+                raise LLMError(f"Erro no Gemini: {str(e)}")
+            except LLMError as e:
+                failed = True
+                error = e
+            except Exception as e:
+                failed = True
+                error = LLMError(f"Erro no Gemini: {str(e)}")
+            finally:
+                if permit is not None:
+                    permit.release(outcome)
+                self._exit_circuit(failed, first_chunk_latency or time.monotonic() - started)
+            
+            logger.warning(f"Erro no streaming do Gemini - tentativa {attempt + 1}: {error}")
+            if emitted or attempt == max_retries - 1 or self.circuit_breaker.is_open:
+                self.error_count += 1
+                raise error
+            await asyncio.sleep(2 ** attempt)  # Backoff exponencial
+    
+    def _enter_circuit(self) -> None:
+        """
+        Verifica o circuit breaker antes de uma tentativa.
+        
+        Raises:
+            CircuitBreakerOpen: Circuito aberto; o fluxo normal de erro aciona o
+                FallbackService sem novas tentativas
+        """
+        if not self.circuit_breaker.allow_request():
+            raise CircuitBreakerOpen(self.circuit_breaker.retry_after)
+    
+    def _exit_circuit(self, failed: Optional[bool], latency: float) -> None:
+        """Registra o resultado da tentativa no circuit breaker."""
+        if failed is None:
+            self.circuit_breaker.record_ignored()
+        elif failed:
+            self.circuit_breaker.record_failure(latency)
+        else:
+            self.circuit_breaker.record_success(latency)
+    
+    def _admission_deadline(self) -> Optional[float]:
+        """Instante (time.monotonic) até o qual a chamada pode esperar por vaga."""
+        if self.admission is None:
+            return None
+        return time.monotonic() + self.admission_budget
+    
+    async def _admit(self, prompt: str, deadline: Optional[float]) -> Optional[AdmissionPermit]:
+        """
+        Aguarda vaga no controle de admissão (se configurado).
+        
+        Raises:
+            AdmissionRejected: Fila cheia ou espera além do deadline; como é
+                um LLMError de quota, o fluxo normal aciona o FallbackService
+        """
+        if self.admission is None:
+            return None
+        return await self.admission.acquire(self.admission.estimate_tokens(prompt), deadline)
+    
+    @property
+    def native_async_enabled(self) -> bool:
+        """Indica se as chamadas usam o cliente assíncrono nativo do SDK."""
+        return self.use_async_client and asyncio.iscoroutinefunction(
+            getattr(self._model, "generate_content_async", None)
+        )
+    
+    async def _generate_content(self, prompt: str, stream: bool = False):
+        """
+        Chama o Gemini pelo cliente gRPC assíncrono nativo.
+        
+        Sem ocupar threads do executor, o número de chamadas simultâneas não
+        é limitado pelo pool padrão, e cancelar a coroutine (ex.: timeout do
+        wait_for) cancela a chamada em andamento. O prazo também é enviado ao
+        servidor. Se o cliente nativo estiver desativado ou indisponível, usa
+        a chamada síncrona em thread.
+        
+        Args:
+            prompt: Prompt completo para enviar
+            stream: Se deve retornar a resposta em trechos
+            
+        Returns:
+            Resposta do SDK (iterável de trechos quando `stream` é True)
+        """
+        if not self.native_async_enabled:
+            if stream:
+                return await asyncio.to_thread(self._model.generate_content, prompt, stream=True)
+            return await asyncio.to_thread(self._model.generate_content, prompt)
+        
+        # O SDK cria o cliente assíncrono sob demanda na primeira chamada
+        return await self._model.generate_content_async(
+            prompt,
+            stream=stream,
+            request_options={"timeout": self.settings.gemini_timeout}
+        )
+    
+    @staticmethod
+    async def _next_chunk(chunks):
+        """Próximo trecho de um iterador síncrono (em thread) ou assíncrono; None ao final."""
+        if hasattr(chunks, "__anext__"):
+            try:
+                return await chunks.__anext__()
+            except StopAsyncIteration:
+                return None
+        return await asyncio.to_thread(next, chunks, None)
+    
+    async def close(self) -> None:
+        """Fecha a camada em disco do cache."""
+        if self.cache_service:
+            await self.cache_service.close()
+    
+    def _create_full_prompt(
+        self,
+        user_query: str,
+        query_results: List[Dict[str, Any]],
+        context: Dict[str, Any]
+    ) -> str:
+        """Monta o prompt completo (sistema + usuário) enviado ao Gemini."""
+        system_prompt = self._create_system_prompt()
+        user_prompt = self._create_user_prompt(user_query, query_results, context)
+        return f"{system_prompt}\n\n{user_prompt}"
+    
+    async def _lookup_cache(
+        self,
+        user_query: str,
+        sql_query: Optional[str],
+        query_results: List[Dict[str, Any]],
+        context: Dict[str, Any],
+        session_id: Optional[str],
+        cache_strategy: str,
+        start_time: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Busca resposta no cache inteligente (se disponível).
+        
+        Entradas obsoletas são servidas e agendadas para atualização em
+        segundo plano.
+        
+        Returns:
+            Resposta do cache ou None
+        """
+        if not self.cache_service:
+            return None
+        
+        try:
+            cached_response = await self.cache_service.get(
+                query=user_query,
+                context=context,
+                strategy=cache_strategy
+            )
+        except Exception as e:
+            logger.warning(f"Erro no cache: {e}")
+            return None
+        
+        if not cached_response:
+            return None
+        
+        self.cache_hits += 1
+        processing_time = int((time.time() - start_time) * 1000)
+        
+        logger.info("Resposta servida do cache inteligente", extra={
+            "session_id": session_id,
+            "cache_strategy": cache_strategy,
+            "cache_status": cached_response.get("cache_status"),
+            "processing_time": processing_time
+        })
+        
+        # Atualizar tempo de processamento no cache hit
+        cached_response["processing_time"] = processing_time
+        
+        # Entrada obsoleta: servir agora e atualizar em segundo plano
+        if cached_response.get("cache_status") == "stale":
+            cached_response["cache_revalidating"] = self._schedule_revalidation(
+                user_query, sql_query, query_results, context, cache_strategy
+            )
+        
+        return cached_response
+    
+    async def _complete_response(
+        self,
+        user_query: str,
+        sql_query: Optional[str],
+        query_results: List[Dict[str, Any]],
+        context: Dict[str, Any],
+        session_id: Optional[str],
+        response_text: str,
+        start_time: float
+    ) -> Dict[str, Any]:
+        """
+        Valida o texto do Gemini, aplica fallback se necessário e armazena no cache.
+        
+        Returns:
+            Dict com a resposta estruturada
+        """
+        # Validar e limpar resposta
+        llm_response = self._validate_and_clean_response(response_text)
+        
+        # Calcular confiança da resposta do LLM
+        confidence_score = self._calculate_confidence_score(
+            user_query, query_results, llm_response
+        )
+        
+        # Verificar se deve usar fallback (se disponível)
+        should_fallback = False
+        if self.fallback_service:
+            try:
+                should_fallback, fallback_trigger = self.fallback_service.should_use_fallback(
+                    llm_response=llm_response,
+                    original_query=user_query,
+                    llm_confidence=confidence_score,
+                    error=None
+                )
+                
+                if should_fallback:
+                    logger.info("Fallback ativado por resposta inadequada do LLM", extra={
+                        "trigger": fallback_trigger.value,
+                        "confidence": confidence_score,
+                        "session_id": session_id
+                    })
+                    return await self._generate_fallback_response(
+                        user_query, fallback_trigger, start_time, session_id, context
+                    )
+            except Exception as e:
+                logger.warning(f"Erro no fallback service: {e}")
+        
+        # Resposta do LLM é adequada, processar e cachear
+        processing_time = int((time.time() - start_time) * 1000)
+        suggestions = self._generate_suggestions(user_query, query_results)
+        
+        sources = ["gemini_llm"]
+        if query_results:
+            sources.extend(["equipment_data", "maintenance_data"])
+        if sql_query:
+            sources.append("sql_database")
+        
+        final_response = {
+            "response": llm_response,
+            "confidence_score": confidence_score,
+            "sources": list(set(sources)),
+            "suggestions": suggestions,
+            "processing_time": processing_time,
+            "data_records_used": len(query_results),
+            "cache_used": False,
+            "fallback_used": False,
+            "timestamp": datetime.now().isoformat()
+        }
+        
+        # Armazenar no cache inteligente (se disponível)
+        if self.cache_service:
+            try:
+                cache_tags = self._generate_cache_tags(user_query, context, query_results)
+                await self.cache_service.set(
+                    query=user_query,
+                    response=final_response,
+                    context=context,
+                    ttl=self._calculate_cache_ttl(confidence_score, len(query_results)),
+                    tags=cache_tags
+                )
+            except Exception as e:
+                logger.warning(f"Erro ao armazenar no cache: {e}")
+        
+        logger.info("Resposta gerada e cacheada com sucesso", extra={
+            "session_id": session_id,
+            "confidence": confidence_score,
+            "processing_time": processing_time,
+            "data_records": len(query_results),
+            "cache_ttl": self._calculate_cache_ttl(confidence_score, len(query_results))
+        })
+        
+        return final_response
+    
+    async def _recover_from_llm_error(
+        self,
+        user_query: str,
+        error: Exception,
+        start_time: float,
+        session_id: Optional[str],
+        context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Responde com o sistema de fallback após erro na geração com o LLM.
+        
+        Returns:
+            Dict com resposta de fallback ou resposta de erro simples
+        """
+        logger.warning(f"Erro no LLM, ativando fallback: {str(error)}", extra={
+            "session_id": session_id,
+            "error_type": type(error).__name__
+        })
+        
+        # Usar fallback se disponível, senão retornar erro simples
+        if self.fallback_service:
+            try:
+                # Determinar trigger de fallback baseado no erro
+                should_fallback, fallback_trigger = self.fallback_service.should_use_fallback(
+                    llm_response=None,
+                    original_query=user_query,
+                    llm_confidence=None,
+                    error=error
+                )
+                
+                if should_fallback:
+                    return await self._generate_fallback_response(
+                        user_query, fallback_trigger, start_time, session_id, context, str(error)
+                    )
+            except Exception as fb_error:
+                logger.error(f"Erro no fallback service: {fb_error}")
+        
+        # Se fallback não disponível ou falhou, retornar resposta de erro simples
+        processing_time = int((time.time() - start_time) * 1000)
+        return {
+            "response": "Desculpe, não consegui processar sua solicitação no momento. Tente novamente mais tarde.",
+            "confidence_score": 0.1,
+            "sources": ["error_fallback"],
+            "suggestions": ["Tente uma pergunta mais simples", "Verifique sua conexão"],
+            "processing_time": processing_time,
+            "cache_used": False,
+            "fallback_used": True,
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _emergency_response(self, error: Exception, start_time: float, session_id: Optional[str]) -> Dict[str, Any]:
+        """Resposta de último recurso para erros inesperados."""
+        logger.error(f"Erro geral no LLMService: {str(error)}", extra={
+            "session_id": session_id
+        })
+        
+        processing_time = int((time.time() - start_time) * 1000)
+        return {
+            "response": "Desculpe, estou com dificuldades técnicas no momento. Tente novamente mais tarde.",
+            "confidence_score": 0.1,
+            "sources": ["emergency_fallback"],
+            "suggestions": ["Tente uma pergunta mais simples", "Recarregue a página"],
+            "processing_time": processing_time,
+            "cache_used": False,
+            "fallback_used": True,
+            "error": str(error),
+            "timestamp": datetime.now().isoformat()
+        }
     
     def _generate_cache_tags(
         self, 
@@ -731,8 +1253,90 @@ Responda diretamente baseado nas informações disponíveis."""
         else:
             tags.add("no_data")
         
+        # Tags de dependência de dados (invalidação por eventos de ingestão)
+        data_types = {
+            data_type for tag, data_type in self.TAG_DATA_TYPES.items() if tag in tags
+        } or set(self.TAG_DATA_TYPES.values())
+        equipment_ids = self._referenced_equipment_ids(context)
+        query_analysis = context.get("query_analysis") or {}
+        single_equipment = (
+            len(equipment_ids) == 1
+            and query_analysis.get("intent") in self.SINGLE_EQUIPMENT_INTENTS
+        )
+        
+        for data_type in data_types:
+            tags.add(f"data:{data_type}")
+            if not single_equipment:
+                # Resposta agregada (mesmo citando equipamentos): depende de todos os registros do tipo
+                tags.add(f"data:{data_type}:all")
+        for equipment_id in equipment_ids:
+            tags.add(f"equipment:{equipment_id}")
+        
+        return tags
+    
+    @staticmethod
+    def _referenced_equipment_ids(context: Dict[str, Any]) -> set:
+        """
+        Extrai códigos de equipamento citados na consulta (entidades da análise).
+        
+        Args:
+            context: Contexto da consulta (com query_analysis.entities)
+            
+        Returns:
+            set: Códigos de equipamento em maiúsculas
+        """
+        equipment_ids = set()
+        
+        query_analysis = context.get("query_analysis") or {}
+        for entity in query_analysis.get("entities") or []:
+            if isinstance(entity, dict) and entity.get("type") == "equipment_id" and entity.get("value"):
+                equipment_ids.add(str(entity["value"]).strip().upper())
+        
+        return equipment_ids
+    
+    @staticmethod
+    def ingestion_invalidation_tags(data_type: str, equipment_ids=()) -> set:
+        """
+        Tags das respostas afetadas por novos dados de `data_type`.
+        
+        Args:
+            data_type: Tipo de dado gravado (equipment, maintenance, failure)
+            equipment_ids: Códigos de equipamento afetados
+            
+        Returns:
+            set: Tags a invalidar no cache
+        """
+        if equipment_ids:
+            tags = {f"data:{data_type}:all", "no_data"}
+            tags.update(f"equipment:{str(equipment_id).strip().upper()}" for equipment_id in equipment_ids)
+        else:
+            tags = {f"data:{data_type}", "no_data"}
         return tags
     
+    async def invalidate_for_ingestion(self, data_type: str, equipment_ids=()) -> int:
+        """
+        Invalida respostas em cache afetadas por novos dados ingeridos.
+        
+        Com códigos de equipamento, invalida respostas que citam esses
+        equipamentos, respostas agregadas do tipo (inclusive as que também citam
+        outros equipamentos) e respostas sem dados; sem códigos, invalida todas
+        as respostas que dependem do tipo de dado.
+        
+        Args:
+            data_type: Tipo de dado gravado (equipment, maintenance, failure)
+            equipment_ids: Códigos de equipamento afetados
+            
+        Returns:
+            int: Número de entradas invalidadas
+        """
+        if not self.cache_service:
+            return 0
+        
+        tags = self.ingestion_invalidation_tags(data_type, equipment_ids)
+        invalidated = await self.cache_service.invalidate(tags=tags)
+        logger.info(f"Ingestão de {data_type}: {invalidated} respostas invalidadas no cache")
+        return invalidated
+    
     def _calculate_cache_ttl(self, confidence_score: float, data_records: int) -> int:
         """
         Calcula TTL do cache baseado na confiança e quantidade de dados.
@@ -948,6 +1552,16 @@ Responda diretamente baseado nas informações disponíveis."""
             "error_rate": round(error_rate, 3),
             "fallback_used_count": self.fallback_used_count,
             "fallback_rate": round(fallback_rate, 3),
+            "coalesced_requests": self.coalesced_requests,
+            "inflight_generations": len(self._inflight),
+            "admission_control": self.admission.get_metrics() if self.admission else None,
+            "circuit_breaker": self.circuit_breaker.get_status(),
+            "stale_revalidations": {
+                "enabled": self.stale_while_revalidate,
+                "completed": self.revalidation_count,
+                "in_progress": len(self._revalidations),
+                "skipped": self.revalidations_skipped
+            },
             "unknown_queries": {
                 "total_unknown_queries": self.unknown_query_count,
                 "unknown_query_rate": round(unknown_query_rate, 3),
@@ -959,7 +1573,8 @@ Responda diretamente baseado nas informações disponíveis."""
                 "model": self.settings.gemini_model,
                 "temperature": self.settings.gemini_temperature,
                 "max_tokens": self.settings.gemini_max_tokens,
-                "timeout": self.settings.gemini_timeout
+                "timeout": self.settings.gemini_timeout,
+                "client": "async_native" if self.native_async_enabled else "thread"
             },
             "intelligent_cache": {
                 "cache_size": cache_metrics.cache_size if cache_metrics else 0,
@@ -1015,12 +1630,17 @@ Responda diretamente baseado nas informações disponíveis."""
             start_time = time.time()
             
             try:
-                response = await asyncio.wait_for(
-                    asyncio.to_thread(self._model.generate_content, test_prompt),
+                # Passa pelo circuit breaker e pelo controle de admissão: com o
+                # circuito aberto não sonda o Gemini
+                await asyncio.wait_for(
+                    self._call_gemini_with_retry(test_prompt, max_retries=1),
                     timeout=5.0  # Timeout mais baixo para health check
                 )
                 gemini_status = "healthy"
                 response_time = int((time.time() - start_time) * 1000)
+            except CircuitBreakerOpen:
+                gemini_status = "circuit_open"
+                response_time = 0
             except asyncio.TimeoutError:
                 gemini_status = "timeout"
                 response_time = 5000
@@ -1071,7 +1691,8 @@ Responda diretamente baseado nas informações disponíveis."""
                     "response_time_ms": response_time,
                     "error_rate": error_rate,
                     "total_requests": metrics.get("total_requests", 0),
-                    "cache_hit_rate": metrics.get("cache_hit_rate", 0)
+                    "cache_hit_rate": metrics.get("cache_hit_rate", 0),
+                    "circuit_breaker": self.circuit_breaker.get_status()
                 },
                 "fallback_system": fallback_health,
                 "cache": {
@@ -5,12 +5,21 @@ Este módulo implementa a recuperação de contexto relevante baseado em
 embeddings e similaridade semântica para enriquecer consultas ao LLM.
 """
 
+import os
 import json
+import bisect
+import shutil
 import hashlib
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple, Union
-from dataclasses import dataclass
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Any, AsyncIterator, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass, replace
 from datetime import datetime, timedelta
+from enum import Enum
 import logging
 
 import numpy as np
@@ -18,13 +27,67 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from ..config import get_settings
+from .query_processor import ExtractedEntity, QueryEntity
 from ...database.repositories import EquipmentRepository, MaintenanceRepository
 from ...utils.error_handlers import DataProcessingError, ValidationError
 from ...utils.logger import get_logger
 
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
 # Configurar logger
 logger = get_logger(__name__)
 
+# Versão do formato dos snapshots em disco (incrementar ao mudar o layout)
+SNAPSHOT_FORMAT_VERSION = 1
+
+# Tipos de equipamento nos valores normalizados pelo QueryProcessor
+EQUIPMENT_TYPE_ALIASES = {
+    "transformador": "transformer",
+    "transformadores": "transformer",
+    "disjuntor": "circuit_breaker",
+    "disjuntores": "circuit_breaker",
+    "seccionadora": "switch",
+    "seccionadoras": "switch",
+    "motores": "motor",
+    "gerador": "generator",
+    "geradores": "generator",
+    # Valores gravados no banco (DataValidator.equipment_types)
+    "circuit breaker": "circuit_breaker",
+    "disconnect switch": "switch",
+}
+
+# Status de equipamento do banco (DataValidator.equipment_status) nos valores do QueryProcessor
+EQUIPMENT_STATUS_ALIASES = {
+    "active": "operational",
+    "maintenance": "under_maintenance",
+    "retired": "out_of_service",
+}
+
+
+def normalize_attribute(attribute: str, value: Any) -> Optional[str]:
+    """Normaliza valor de metadado para comparação nos filtros."""
+    if value is None:
+        return None
+    
+    normalized = str(value).strip().lower()
+    if not normalized or normalized == "none":
+        return None
+    if attribute == "equipment_type":
+        return EQUIPMENT_TYPE_ALIASES.get(normalized, normalized)
+    if attribute == "status":
+        return EQUIPMENT_STATUS_ALIASES.get(normalized, normalized)
+    return normalized
+
+
+class RetrievalMode(Enum):
+    """Modos de recuperação de chunks."""
+    LEXICAL = "lexical"  # BM25 sobre o índice invertido
+    DENSE = "dense"  # Similaridade de cosseno sobre a matriz de embeddings
+    HYBRID = "hybrid"  # Lexical + denso combinados por reciprocal rank fusion
+
 
 @dataclass
 class DocumentChunk:
@@ -37,6 +100,138 @@ class DocumentChunk:
     relevance_score: float = 0.0
 
 
+class TermIndexView(Mapping):
+    """
+    Visão somente leitura termo -> ids dos chunks sobre as postings CSR.
+    
+    Evita manter um dicionário de listas duplicando as postings, o que
+    também permite usar o índice carregado por mmap sem reconstruí-lo.
+    Reflete o segmento base (alterações incrementais entram na compactação).
+    """
+    
+    def __init__(self, vocabulary: List[str], offsets: np.ndarray, rows: np.ndarray, chunk_ids: List[str]):
+        self._vocabulary = vocabulary
+        self._offsets = offsets
+        self._rows = rows
+        self._chunk_ids = chunk_ids
+    
+    def __getitem__(self, term: str) -> List[str]:
+        term_id = bisect.bisect_left(self._vocabulary, term)
+        if term_id == len(self._vocabulary) or self._vocabulary[term_id] != term:
+            raise KeyError(term)
+        lo, hi = self._offsets[term_id], self._offsets[term_id + 1]
+        return [self._chunk_ids[row] for row in self._rows[lo:hi]]
+    
+    def __iter__(self):
+        return iter(self._vocabulary)
+    
+    def __len__(self) -> int:
+        return len(self._vocabulary)
+
+
+@dataclass(frozen=True)
+class RetrievalFilters:
+    """
+    Filtros de metadados aplicados antes da pontuação dos chunks.
+    
+    Valores são normalizados na criação (minúsculas; tipos e status de
+    equipamento nos valores canônicos do QueryProcessor, ex.: "transformer",
+    "under_maintenance"). O filtro de status vale apenas para chunks de
+    equipamentos: chunks de outras fontes não são restringidos por ele.
+    """
+    sources: Optional[FrozenSet[str]] = None
+    equipment_types: Optional[FrozenSet[str]] = None
+    statuses: Optional[FrozenSet[str]] = None
+    severities: Optional[FrozenSet[str]] = None
+    date_from: Optional[datetime] = None
+    date_to: Optional[datetime] = None
+    
+    # Campo do filtro -> atributo indexado
+    ATTRIBUTE_FIELDS = (
+        ("sources", "source"),
+        ("equipment_types", "equipment_type"),
+        ("statuses", "status"),
+        ("severities", "severity"),
+    )
+    
+    # Atributo -> única fonte em que o filtro se aplica
+    SOURCE_SCOPED_ATTRIBUTES = {"status": "equipment"}
+    
+    def __post_init__(self):
+        for field_name, attribute in self.ATTRIBUTE_FIELDS:
+            values = getattr(self, field_name)
+            if values is not None:
+                normalized = frozenset(
+                    value for value in (normalize_attribute(attribute, v) for v in values) if value
+                )
+                object.__setattr__(self, field_name, normalized or None)
+    
+    @property
+    def is_empty(self) -> bool:
+        """Indica se nenhum filtro está ativo."""
+        return not self.attribute_filters() and self.date_from is None and self.date_to is None
+    
+    def attribute_filters(self) -> Dict[str, FrozenSet[str]]:
+        """Retorna filtros ativos por atributo indexado."""
+        return {
+            attribute: getattr(self, field_name)
+            for field_name, attribute in self.ATTRIBUTE_FIELDS
+            if getattr(self, field_name)
+        }
+    
+    def matches(self, attributes: Dict[str, Optional[str]], timestamp: Optional[float]) -> bool:
+        """Verifica se os atributos de um chunk satisfazem os filtros."""
+        for attribute, values in self.attribute_filters().items():
+            scope = self.SOURCE_SCOPED_ATTRIBUTES.get(attribute)
+            if scope is not None and attributes.get("source") != scope:
+                continue
+            if attributes.get(attribute) not in values:
+                return False
+        
+        if self.date_from is not None or self.date_to is not None:
+            if timestamp is None:
+                return False
+            if self.date_from is not None and timestamp < self.date_from.timestamp():
+                return False
+            if self.date_to is not None and timestamp > self.date_to.timestamp():
+                return False
+        return True
+    
+    @classmethod
+    def from_entities(cls, entities: List[ExtractedEntity]) -> "RetrievalFilters":
+        """
+        Cria filtros a partir das entidades extraídas pelo QueryProcessor.
+        
+        Usa tipos de equipamento, status e o primeiro período/data citado.
+        """
+        equipment_types = {
+            e.normalized_value for e in entities
+            if e.type == QueryEntity.EQUIPMENT_TYPE and isinstance(e.normalized_value, str)
+        }
+        statuses = {
+            e.normalized_value for e in entities
+            if e.type == QueryEntity.STATUS and isinstance(e.normalized_value, str)
+        }
+        
+        date_from = date_to = None
+        for entity in entities:
+            if entity.type == QueryEntity.TIME_PERIOD and isinstance(entity.normalized_value, dict):
+                date_from = entity.normalized_value.get("start")
+                date_to = entity.normalized_value.get("end")
+                break
+            if entity.type == QueryEntity.DATE_RANGE and isinstance(entity.normalized_value, datetime):
+                date_from = entity.normalized_value.replace(hour=0, minute=0, second=0, microsecond=0)
+                date_to = date_from + timedelta(days=1) - timedelta(microseconds=1)
+                break
+        
+        return cls(
+            equipment_types=frozenset(equipment_types) or None,
+            statuses=frozenset(statuses) or None,
+            date_from=date_from,
+            date_to=date_to
+        )
+
+
 @dataclass
 class RAGContext:
     """Contexto recuperado pelo sistema RAG."""
@@ -60,6 +255,17 @@ class RAGService:
     - Contextualização para LLM
     """
     
+    # Vocabulário do domínio usado nos embeddings simples
+    EMBEDDING_VOCABULARY = (
+        "transformador", "gerador", "disjuntor", "cabo", "subestacao", "linha",
+        "manutenção", "preventiva", "corretiva", "falha", "defeito", "problema",
+        "operacional", "ativo", "inativo", "parado", "funcionando",
+        "custo", "valor", "preço", "gasto", "orçamento",
+        "hoje", "ontem", "semana", "mes", "ano", "ultimo",
+        "urgente", "critico", "normal", "baixo", "alto",
+        "instalação", "reparar", "trocar", "verificar", "inspecionar"
+    )
+    
     def __init__(self):
         """Inicializa o serviço RAG."""
         self.settings = get_settings()
@@ -73,13 +279,83 @@ class RAGService:
         self.relevance_threshold = 0.1  # Mais permissivo para encontrar mais resultados
         self.cache_ttl = 3600  # 1 hora
         
+        # Cache LRU de resultados de recuperação, válido para uma geração do índice
+        self.result_cache_size = 256  # 0 desativa
+        self._result_cache: "OrderedDict[Tuple, Tuple[List[DocumentChunk], str]]" = OrderedDict()
+        self._result_cache_generation = 0
+        
         # Métricas
         self.queries_processed = 0
         self.cache_hits = 0
         self.total_retrieval_time = 0.0
         
-        # Índice de termos para busca
-        self.term_index: Dict[str, List[str]] = {}
+        # Índice invertido de termos (termo -> ids dos chunks)
+        self.term_index: Mapping[str, List[str]] = {}
+        self._sorted_terms: List[str] = []  # Vocabulário ordenado para expansão por prefixo
+        self._indexed_chunk_count = 0
+        self.max_prefix_expansions = 50
+        
+        # Estatísticas BM25 pré-computadas na indexação (postings em formato CSR,
+        # alinhadas à ordem de self._sorted_terms)
+        self.bm25_k1 = 1.2
+        self.bm25_b = 0.75
+        self.prefix_match_weight = 0.5  # Peso de termos casados apenas por prefixo
+        
+        # Recuperação híbrida (RRF): candidatos por canal e constante k da fusão
+        self.default_retrieval_mode = RetrievalMode.LEXICAL
+        self.hybrid_lexical_depth = 50
+        self.hybrid_dense_depth = 50
+        self.rrf_k = 60
+        self._chunk_ids: List[str] = []  # linha -> id do chunk
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._posting_offsets = np.zeros(1, dtype=np.int64)
+        self._posting_rows = np.zeros(0, dtype=np.int32)
+        self._posting_weights = np.zeros(0, dtype=np.float32)
+        
+        # Embeddings de todos os chunks em uma matriz contígua (linhas
+        # normalizadas, na mesma ordem de self._chunk_ids)
+        self._chunk_rows: Dict[str, int] = {}  # id do chunk -> linha
+        self._embedding_matrix = np.zeros((0, len(self.EMBEDDING_VOCABULARY)), dtype=np.float32)
+        
+        # Sub-índices de metadados do segmento base: valor -> linhas ordenadas,
+        # e linhas com data ordenadas por data (para filtros por intervalo)
+        self._attribute_rows: Dict[str, Dict[str, np.ndarray]] = {}
+        self._sorted_dates = np.zeros(0, dtype=np.float64)
+        self._date_rows = np.zeros(0, dtype=np.int64)
+        
+        # Atualização incremental: chunks novos/alterados vão para um segmento
+        # delta (linhas após as do segmento base) e linhas substituídas ou
+        # removidas são marcadas em _live_rows até a próxima compactação.
+        # O delta só recebe acréscimos, então cada mutação custa proporcional
+        # às linhas alteradas; os pesos BM25 do delta são calculados na consulta
+        self.delta_compaction_ratio = 0.1  # Fração do segmento base
+        self.min_delta_compaction = 1000
+        self._delta_term_counts: Dict[int, Counter] = {}  # linha viva -> tf dos termos
+        self._delta_postings: Dict[str, Tuple[array, array]] = {}  # termo -> (linhas, tfs)
+        self._delta_document_frequency: Counter = Counter()  # termo -> linhas vivas do delta
+        self._reset_delta_segment()
+        self._watermarks: Dict[str, datetime] = {}  # tabela -> maior updated_at indexado
+        self.index_generation = 0  # Incrementado a cada mutação do índice
+        
+        # Indexação completa em lotes (paginação por chave)
+        self.index_batch_size = 1000
+        self.indexing_progress: Dict[str, Any] = {
+            "status": "idle", "tables": {}, "batches": 0, "rows_indexed": 0,
+            "started_at": None, "finished_at": None
+        }
+        
+        # Ciclo de vida do índice compartilhado (um por processo)
+        self.refresh_interval = 300  # 5 minutos
+        self.incremental_interval = 10  # Intervalo do feed de alterações
+        self.last_indexed_at: Optional[datetime] = None
+        self._index_lock = asyncio.Lock()
+        self._refresh_task = None
+        
+        # Snapshots em disco compartilhados entre workers (None desativa)
+        self.snapshot_dir: Optional[Path] = None
+        self.snapshot_id: Optional[str] = None
+        self.snapshots_to_keep = 2
         
         logger.info("RAGService inicializado com sucesso")
     
@@ -87,7 +363,9 @@ class RAGService:
         self, 
         query: str, 
         query_type: Optional[str] = None,
-        max_chunks: Optional[int] = None
+        max_chunks: Optional[int] = None,
+        mode: Optional[RetrievalMode] = None,
+        filters: Optional[RetrievalFilters] = None
     ) -> RAGContext:
         """
         Recupera contexto relevante para uma query.
@@ -96,6 +374,8 @@ class RAGService:
             query: Consulta do usuário
             query_type: Tipo da consulta (equipment, maintenance, etc.)
             max_chunks: Máximo de chunks a retornar
+            mode: Modo de recuperação (lexical, denso ou híbrido; padrão: default_retrieval_mode)
+            filters: Filtros de metadados (tipo de equipamento, status, datas...)
             
         Returns:
             RAGContext: Contexto recuperado com chunks relevantes
@@ -105,28 +385,39 @@ class RAGService:
         try:
             self.queries_processed += 1
             max_chunks = max_chunks or self.max_chunks_per_query
+            mode = mode or self.default_retrieval_mode
             
             # 1. Pré-processar query
             processed_query = self._preprocess_query(query)
             
-            # 2. Buscar documentos relevantes
-            relevant_chunks = await self._search_relevant_chunks(
-                processed_query, query_type, max_chunks
-            )
-            
-            # 3. Calcular scores de relevância
-            scored_chunks = self._calculate_relevance_scores(
-                processed_query, relevant_chunks
-            )
-            
-            # 4. Filtrar por threshold
-            filtered_chunks = [
-                chunk for chunk in scored_chunks 
-                if chunk.relevance_score >= self.relevance_threshold
-            ]
+            # Queries idênticas sobre a mesma versão do índice reutilizam o resultado
+            self._ensure_search_index()
+            cache_key = (processed_query, query_type, max_chunks, mode, filters, self.relevance_threshold)
+            cached = self._get_cached_result(cache_key)
             
-            # 5. Gerar resumo do contexto
-            context_summary = self._generate_context_summary(filtered_chunks)
+            if cached is not None:
+                self.cache_hits += 1
+                filtered_chunks, context_summary = cached
+            else:
+                # 2. Buscar documentos relevantes
+                relevant_chunks = await self._search_relevant_chunks(
+                    processed_query, query_type, max_chunks, mode, filters
+                )
+                
+                # 3. Calcular scores de relevância
+                scored_chunks = self._calculate_relevance_scores(
+                    processed_query, relevant_chunks
+                )
+                
+                # 4. Filtrar por threshold
+                filtered_chunks = [
+                    chunk for chunk in scored_chunks 
+                    if chunk.relevance_score >= self.relevance_threshold
+                ]
+                
+                # 5. Gerar resumo do contexto
+                context_summary = self._generate_context_summary(filtered_chunks)
+                self._store_cached_result(cache_key, filtered_chunks, context_summary)
             
             retrieval_time = (datetime.now() - start_time).total_seconds()
             self.total_retrieval_time += retrieval_time
@@ -152,51 +443,723 @@ class RAGService:
             })
             raise DataProcessingError(f"Falha na recuperação de contexto: {str(e)}")
     
+    def _get_cached_result(self, key: Tuple) -> Optional[Tuple[List[DocumentChunk], str]]:
+        """Busca resultado no cache LRU (cópias dos chunks)."""
+        if self._result_cache_generation != self.index_generation:
+            # Índice mudou: nenhum resultado anterior é válido
+            self._result_cache.clear()
+            self._result_cache_generation = self.index_generation
+            return None
+        
+        cached = self._result_cache.get(key)
+        if cached is None:
+            return None
+        
+        self._result_cache.move_to_end(key)
+        chunks, summary = cached
+        return [replace(chunk) for chunk in chunks], summary
+    
+    def _store_cached_result(self, key: Tuple, chunks: List[DocumentChunk], summary: str) -> None:
+        """Armazena resultado no cache LRU, descartando o menos usado."""
+        if self.result_cache_size <= 0:
+            return
+        
+        if self._result_cache_generation != self.index_generation:
+            self._result_cache.clear()
+            self._result_cache_generation = self.index_generation
+        
+        self._result_cache[key] = ([replace(chunk) for chunk in chunks], summary)
+        self._result_cache.move_to_end(key)
+        while len(self._result_cache) > self.result_cache_size:
+            self._result_cache.popitem(last=False)
+    
+    @property
+    def is_indexed(self) -> bool:
+        """Indica se o índice já foi construído ao menos uma vez."""
+        return self.last_indexed_at is not None
+    
+    async def ensure_indexed(self) -> None:
+        """
+        Garante que o índice esteja construído.
+        
+        Usado pelos endpoints quando a indexação de startup falhou: apenas
+        a primeira requisição paga o custo, as concorrentes aguardam o lock.
+        """
+        if self.is_indexed:
+            return
+        
+        async with self._index_lock:
+            if not self.is_indexed:
+                await self._index_all_sources()
+    
     async def index_data_sources(self) -> None:
-        """Indexa fontes de dados para busca RAG."""
+        """Indexa (ou reindexa) fontes de dados para busca RAG."""
+        async with self._index_lock:
+            await self._index_all_sources()
+    
+    def _open_session(self):
+        """Abre uma sessão própria do banco para indexação."""
+        # Import lazy para evitar circular import
+        from ..dependencies import get_database_engine
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        
+        engine = get_database_engine()
+        async_session = async_sessionmaker(engine, expire_on_commit=False)
+        return async_session()
+    
+    async def _index_all_sources(self) -> None:
+        """
+        Executa a indexação completa. Deve ser chamado com o lock adquirido.
+        
+        As tabelas são lidas em lotes para um corpus novo, que substitui o
+        atual apenas no final: buscas concorrentes continuam usando o índice
+        anterior e registros removidos da origem desaparecem na troca.
+        """
+        started_at = datetime.now()
+        self.indexing_progress = {
+            "status": "running", "tables": {}, "batches": 0, "rows_indexed": 0,
+            "started_at": started_at.isoformat(), "finished_at": None
+        }
+        
         try:
             logger.info("Iniciando indexação de fontes de dados...")
             
-            # Import lazy para evitar circular import
-            from ..dependencies import get_database_engine
-            from sqlalchemy.ext.asyncio import async_sessionmaker
-            
-            # Obter sessão do banco
-            engine = get_database_engine()
-            async_session = async_sessionmaker(engine, expire_on_commit=False)
-            
-            async with async_session() as session:
+            corpus: Dict[str, DocumentChunk] = {}
+            async with self._open_session() as session:
                 # Indexar equipamentos
-                await self._index_equipment_data(session)
+                await self._index_equipment_data(session, corpus)
                 
                 # Indexar manutenções
-                await self._index_maintenance_data(session)
+                await self._index_maintenance_data(session, corpus)
                 
                 # Indexar dados históricos
-                await self._index_historical_data(session)
+                await self._index_historical_data(session, corpus)
+            
+            removed_chunks = sum(1 for chunk_id in self.document_cache if chunk_id not in corpus)
+            self.document_cache = corpus
             
             # Construir índice de termos
-            self._build_term_index()
+            self._build_search_index()
+            self.last_indexed_at = datetime.now()
+            
+            elapsed = (self.last_indexed_at - started_at).total_seconds()
+            self.indexing_progress.update({
+                "status": "completed",
+                "finished_at": self.last_indexed_at.isoformat(),
+                "rows_per_second": round(self.indexing_progress["rows_indexed"] / max(elapsed, 1e-6), 1)
+            })
             
-            logger.info(f"Indexação concluída. {len(self.document_cache)} documentos indexados")
+            logger.info(f"Indexação concluída. {len(self.document_cache)} documentos indexados", extra={
+                "removed_chunks": removed_chunks,
+                "batches": self.indexing_progress["batches"],
+                "elapsed_seconds": round(elapsed, 3)
+            })
             
         except Exception as e:
+            self.indexing_progress.update({"status": "failed", "finished_at": datetime.now().isoformat()})
             logger.error(f"Erro na indexação: {str(e)}")
             raise DataProcessingError(f"Falha na indexação de dados: {str(e)}")
     
-    async def _index_equipment_data(self, session: AsyncSession) -> None:
+    def start_background_refresh(
+        self, 
+        interval: Optional[int] = None, 
+        incremental_interval: Optional[int] = None
+    ) -> None:
+        """
+        Inicia a atualização periódica do índice em background.
+        
+        Args:
+            interval: Intervalo em segundos da reindexação completa (0 desativa a atualização)
+            incremental_interval: Intervalo em segundos do feed de alterações (0 desativa)
+        """
+        if interval is not None:
+            self.refresh_interval = interval
+        if incremental_interval is not None:
+            self.incremental_interval = incremental_interval
+        
+        if self.refresh_interval <= 0:
+            return
+        
+        try:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self._refresh_loop())
+        except RuntimeError:
+            # Sem event loop disponível
+            pass
+    
+    async def stop_background_refresh(self) -> None:
+        """Interrompe a reindexação periódica."""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+        self._refresh_task = None
+    
+    async def _refresh_loop(self) -> None:
+        """
+        Loop de atualização periódica do índice.
+        
+        Aplica o feed de alterações a cada incremental_interval e faz a
+        reindexação completa (que também remove registros apagados na
+        origem e compacta o índice) a cada refresh_interval.
+        """
+        last_full_refresh = datetime.now()
+        while True:
+            try:
+                interval = self.refresh_interval
+                if 0 < self.incremental_interval < interval:
+                    interval = self.incremental_interval
+                await asyncio.sleep(interval)
+                
+                if (datetime.now() - last_full_refresh).total_seconds() >= self.refresh_interval:
+                    last_full_refresh = datetime.now()
+                    await self.load_or_build_index()
+                else:
+                    await self.refresh_changes()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Erro na atualização do índice RAG: {str(e)}")
+    
+    async def refresh_changes(self) -> int:
+        """
+        Aplica ao índice apenas os registros alterados desde a última indexação.
+        
+        Usa o updated_at de cada tabela como marca d'água, então o custo é
+        proporcional às linhas alteradas e não ao tamanho das tabelas.
+        Registros apagados na origem saem na reindexação completa periódica
+        (ou imediatamente via _delete_chunks).
+        
+        Returns:
+            Número de chunks inseridos ou atualizados
+        """
+        if not self.is_indexed:
+            await self.ensure_indexed()
+            return 0
+        
+        async with self._index_lock:
+            chunks: List[DocumentChunk] = []
+            async with self._open_session() as session:
+                async for batch in self._fetch_equipment_chunks(session, self._watermarks.get("equipments")):
+                    chunks.extend(batch)
+                async for batch in self._fetch_maintenance_chunks(session, self._watermarks.get("maintenances")):
+                    chunks.extend(batch)
+                try:
+                    async for batch in self._fetch_failure_chunks(session, self._watermarks.get("failures")):
+                        chunks.extend(batch)
+                except Exception as e:
+                    logger.warning(f"Erro ao buscar falhas alteradas (tabela pode não existir): {str(e)}")
+            
+            # Registros na fronteira da marca d'água voltam a cada passada
+            changed = [
+                chunk for chunk in chunks
+                if chunk.id not in self.document_cache or self.document_cache[chunk.id] != chunk
+            ]
+            if changed:
+                self._upsert_chunks(changed)
+                logger.info(f"Índice RAG atualizado incrementalmente: {len(changed)} chunks")
+            return len(changed)
+    
+    def _upsert_chunks(self, chunks: List[DocumentChunk]) -> None:
+        """
+        Insere ou substitui chunks sem reconstruir o índice inteiro.
+        
+        Os chunks entram no segmento delta; versões anteriores são marcadas
+        como removidas. Quando o delta cresce além do limite o índice é
+        compactado (reconstruído a partir de document_cache).
+        
+        O chamador deve manter _index_lock: sem ele, uma reconstrução
+        concorrente (_index_all_sources) substitui o corpus e o delta,
+        descartando a alteração.
+        
+        Args:
+            chunks: Chunks novos ou alterados (ids equipment_*, maintenance_*, failure_*)
+        """
+        if not chunks:
+            return
+        
+        self._ensure_search_index()
+        first_row = len(self._chunk_ids)
+        self._reserve_delta_rows(first_row + len(chunks))
+        
+        for row, chunk in enumerate(chunks, start=first_row):
+            self._tombstone(chunk.id)
+            self._chunk_ids.append(chunk.id)
+            self._chunk_rows[chunk.id] = row
+            self.document_cache[chunk.id] = chunk
+            self._live_rows[row] = True
+            self._live_count += 1
+            
+            counts = Counter(self._extract_query_terms(chunk.content.lower()))
+            self._delta_term_counts[row] = counts
+            self._delta_doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                if term not in self._delta_postings:
+                    self._delta_postings[term] = (array("i"), array("i"))
+                    bisect.insort(self._delta_terms, term)
+                term_rows, term_tfs = self._delta_postings[term]
+                term_rows.append(row)
+                term_tfs.append(tf)
+                self._delta_document_frequency[term] += 1
+            
+            self._delta_embeddings[row - self._base_row_count] = self._normalize_rows(
+                self._embed_text(chunk.content)[np.newaxis, :]
+            )[0]
+        
+        self._after_index_mutation()
+    
+    def _reserve_delta_rows(self, row_count: int) -> None:
+        """Garante espaço para `row_count` linhas, dobrando a capacidade (custo amortizado constante)."""
+        if row_count > len(self._live_rows):
+            live_rows = np.zeros(max(row_count, 2 * len(self._live_rows)), dtype=bool)
+            live_rows[:len(self._live_rows)] = self._live_rows
+            self._live_rows = live_rows
+        
+        delta_count = row_count - self._base_row_count
+        if delta_count > len(self._delta_embeddings):
+            embeddings = np.zeros(
+                (max(delta_count, 2 * len(self._delta_embeddings)), len(self.EMBEDDING_VOCABULARY)),
+                dtype=np.float32
+            )
+            embeddings[:len(self._delta_embeddings)] = self._delta_embeddings
+            self._delta_embeddings = embeddings
+    
+    def _delete_chunks(self, chunk_ids: List[str]) -> int:
+        """
+        Remove chunks do índice sem reconstruí-lo.
+        
+        O chamador deve manter _index_lock (ver _upsert_chunks).
+        
+        Args:
+            chunk_ids: Ids dos chunks a remover
+            
+        Returns:
+            Número de chunks removidos
+        """
+        self._ensure_search_index()
+        removed = 0
+        for chunk_id in chunk_ids:
+            if self.document_cache.pop(chunk_id, None) is not None:
+                self._tombstone(chunk_id)
+                removed += 1
+        
+        if removed:
+            self._after_index_mutation()
+        return removed
+    
+    def _tombstone(self, chunk_id: str) -> None:
+        """Marca a linha atual do chunk como removida."""
+        row = self._chunk_rows.pop(chunk_id, None)
+        if row is None:
+            return
+        
+        self._live_rows[row] = False
+        self._live_count -= 1
+        # Postings do delta ficam até a compactação (filtradas por _live_rows)
+        counts = self._delta_term_counts.pop(row, None)
+        if counts:
+            self._delta_document_frequency.subtract(counts.keys())
+    
+    def _after_index_mutation(self) -> None:
+        """Compacta o índice se o segmento delta cresceu demais."""
+        delta_rows = len(self._chunk_ids) - self._base_row_count
+        if delta_rows > max(self.min_delta_compaction, self.delta_compaction_ratio * self._base_row_count):
+            self._build_search_index()
+        else:
+            self._indexed_chunk_count = len(self.document_cache)
+            self.index_generation += 1
+    
+    async def load_or_build_index(self, max_age: Optional[int] = None) -> None:
+        """
+        Carrega o snapshot em disco se estiver recente; senão reindexa e salva um novo.
+        
+        Com vários workers apontando para o mesmo diretório, um lock de
+        arquivo garante que apenas um reconstrói o índice a partir do banco;
+        os demais aguardam e carregam (via mmap) o snapshot produzido por ele.
+        
+        Args:
+            max_age: Idade máxima em segundos do snapshot aceito (padrão: refresh_interval)
+        """
+        if self.snapshot_dir is None:
+            await self.index_data_sources()
+            return
+        
+        max_age = self.refresh_interval if max_age is None else max_age
+        requested_at = datetime.now().timestamp()
+        
+        async with self._index_lock:
+            lock_file = await asyncio.to_thread(self._acquire_snapshot_lock)
+            try:
+                manifest = self._read_snapshot_manifest()
+                # Snapshot recente ou gerado por outro worker enquanto aguardávamos o lock
+                if manifest and (
+                    manifest["created_at"] > requested_at
+                    or requested_at - manifest["created_at"] < max_age
+                ):
+                    if manifest["snapshot_id"] != self.snapshot_id:
+                        state = await asyncio.to_thread(self._read_snapshot, manifest)
+                        self._apply_index_state(state)
+                        logger.info(f"Índice RAG carregado do snapshot {manifest['snapshot_id']}", extra={
+                            "chunks": manifest["chunk_count"]
+                        })
+                    return
+                
+                await self._index_all_sources()
+                try:
+                    await asyncio.to_thread(self._write_snapshot, self._collect_index_state())
+                except Exception as e:
+                    # O índice em memória continua válido
+                    logger.warning(f"Falha ao salvar snapshot do índice RAG: {str(e)}")
+            finally:
+                lock_file.close()
+    
+    def save_snapshot(self) -> Optional[str]:
+        """
+        Salva o índice atual em disco.
+        
+        Returns:
+            Id do snapshot gerado (None se snapshots estiverem desativados)
+        """
+        if self.snapshot_dir is None:
+            return None
+        self._ensure_search_index()
+        return self._write_snapshot(self._collect_index_state())
+    
+    def load_snapshot(self) -> bool:
+        """
+        Carrega o snapshot atual do disco, se existir e for compatível.
+        
+        Returns:
+            True se o índice foi carregado
+        """
+        manifest = self._read_snapshot_manifest()
+        if manifest is None:
+            return False
+        self._apply_index_state(self._read_snapshot(manifest))
+        return True
+    
+    def _acquire_snapshot_lock(self):
+        """Abre e trava (bloqueante) o arquivo de lock do diretório de snapshots."""
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.snapshot_dir / ".lock", "a")
+        if fcntl is not None:
+            # Liberado ao fechar o arquivo
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        return lock_file
+    
+    def _read_snapshot_manifest(self) -> Optional[Dict[str, Any]]:
+        """Lê o manifesto do snapshot apontado por CURRENT, se compatível."""
+        try:
+            snapshot_id = (self.snapshot_dir / "CURRENT").read_text(encoding="utf-8").strip()
+            with open(self.snapshot_dir / snapshot_id / "manifest.json", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        # Pesos BM25 e embeddings são gravados já calculados
+        compatible = (
+            manifest.get("format_version") == SNAPSHOT_FORMAT_VERSION
+            and manifest.get("bm25_k1") == self.bm25_k1
+            and manifest.get("bm25_b") == self.bm25_b
+            and manifest.get("embedding_vocabulary") == list(self.EMBEDDING_VOCABULARY)
+        )
+        if not compatible:
+            logger.warning(f"Snapshot RAG {snapshot_id} incompatível, será reconstruído")
+            return None
+        return manifest
+    
+    def _collect_index_state(self) -> Dict[str, Any]:
+        """Captura referências do índice atual para gravação fora do event loop."""
+        # Snapshots contêm apenas o segmento base: compactar alterações pendentes
+        if len(self._chunk_ids) != self._base_row_count or self._live_count != self._base_row_count:
+            self._build_search_index()
+        
+        chunks = [self.document_cache[chunk_id] for chunk_id in self._chunk_ids]
+        return {
+            "chunk_ids": list(self._chunk_ids),
+            "sources": [chunk.source for chunk in chunks],
+            "metadata": [chunk.metadata for chunk in chunks],
+            "contents": [chunk.content for chunk in chunks],
+            "vocabulary": self._sorted_terms,
+            "doc_lengths": self._doc_lengths,
+            "idf": self._idf,
+            "posting_offsets": self._posting_offsets,
+            "posting_rows": self._posting_rows,
+            "posting_weights": self._posting_weights,
+            "embedding_matrix": self._embedding_matrix,
+            "watermarks": {table: value.isoformat() for table, value in self._watermarks.items()},
+            "indexed_at": self.last_indexed_at or datetime.now()
+        }
+    
+    def _write_snapshot(self, state: Dict[str, Any]) -> str:
+        """
+        Grava o snapshot em um diretório versionado e o publica atomicamente.
+        
+        Arrays vão em .npy (carregáveis por mmap), os textos em um único
+        blob UTF-8 com offsets e os metadados em JSON. O arquivo CURRENT só
+        passa a apontar para o novo diretório depois que ele está completo.
+        """
+        created_at = datetime.now()
+        snapshot_id = f"{created_at:%Y%m%dT%H%M%S%f}-{os.getpid()}"
+        staging_dir = self.snapshot_dir / f".{snapshot_id}.tmp"
+        staging_dir.mkdir(parents=True)
+        
+        try:
+            for name in ("doc_lengths", "idf", "posting_offsets", "posting_rows",
+                         "posting_weights", "embedding_matrix"):
+                np.save(staging_dir / f"{name}.npy", np.ascontiguousarray(state[name]))
+            
+            encoded = [content.encode("utf-8") for content in state["contents"]]
+            text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(data) for data in encoded], out=text_offsets[1:])
+            np.save(staging_dir / "text_offsets.npy", text_offsets)
+            with open(staging_dir / "text.bin", "wb") as f:
+                f.write(b"".join(encoded))
+            
+            with open(staging_dir / "chunks.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "ids": state["chunk_ids"],
+                    "sources": state["sources"],
+                    "metadata": state["metadata"]
+                }, f, ensure_ascii=False, default=str)
+            with open(staging_dir / "vocabulary.json", "w", encoding="utf-8") as f:
+                json.dump(state["vocabulary"], f, ensure_ascii=False)
+            
+            with open(staging_dir / "manifest.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "format_version": SNAPSHOT_FORMAT_VERSION,
+                    "snapshot_id": snapshot_id,
+                    "created_at": created_at.timestamp(),
+                    "indexed_at": state["indexed_at"].isoformat(),
+                    "chunk_count": len(state["chunk_ids"]),
+                    "vocabulary_size": len(state["vocabulary"]),
+                    "bm25_k1": self.bm25_k1,
+                    "bm25_b": self.bm25_b,
+                    "embedding_vocabulary": list(self.EMBEDDING_VOCABULARY),
+                    "watermarks": state["watermarks"]
+                }, f)
+            
+            os.replace(staging_dir, self.snapshot_dir / snapshot_id)
+        except Exception:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+        
+        current_tmp = self.snapshot_dir / f".CURRENT.{os.getpid()}"
+        current_tmp.write_text(snapshot_id, encoding="utf-8")
+        os.replace(current_tmp, self.snapshot_dir / "CURRENT")
+        
+        self.snapshot_id = snapshot_id
+        self._prune_snapshots()
+        logger.info(f"Snapshot do índice RAG salvo: {snapshot_id}")
+        return snapshot_id
+    
+    def _prune_snapshots(self) -> None:
+        """Remove snapshots antigos (workers que ainda os mapeiam não são afetados)."""
+        snapshots = sorted(
+            path for path in self.snapshot_dir.iterdir()
+            if path.is_dir() and not path.name.startswith(".")
+        )
+        for path in snapshots[:-self.snapshots_to_keep]:
+            shutil.rmtree(path, ignore_errors=True)
+    
+    def _read_snapshot(self, manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Lê um snapshot do disco.
+        
+        Os arrays são abertos com mmap somente leitura, então workers que
+        carregam o mesmo snapshot compartilham as páginas físicas.
+        """
+        snapshot_path = self.snapshot_dir / manifest["snapshot_id"]
+        state = {
+            name: np.load(snapshot_path / f"{name}.npy", mmap_mode="r")
+            for name in ("doc_lengths", "idf", "posting_offsets", "posting_rows",
+                         "posting_weights", "embedding_matrix", "text_offsets")
+        }
+        
+        with open(snapshot_path / "chunks.json", encoding="utf-8") as f:
+            chunks = json.load(f)
+        with open(snapshot_path / "vocabulary.json", encoding="utf-8") as f:
+            state["vocabulary"] = json.load(f)
+        
+        text_offsets = state.pop("text_offsets")
+        text = (
+            np.memmap(snapshot_path / "text.bin", dtype=np.uint8, mode="r")
+            if text_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+        )
+        state["document_cache"] = {
+            chunk_id: DocumentChunk(
+                id=chunk_id,
+                content=text[text_offsets[row]:text_offsets[row + 1]].tobytes().decode("utf-8"),
+                source=source,
+                metadata=metadata
+            )
+            for row, (chunk_id, source, metadata) in enumerate(
+                zip(chunks["ids"], chunks["sources"], chunks["metadata"])
+            )
+        }
+        state["chunk_ids"] = chunks["ids"]
+        state["snapshot_id"] = manifest["snapshot_id"]
+        state["indexed_at"] = datetime.fromisoformat(manifest["indexed_at"])
+        state["watermarks"] = {
+            table: datetime.fromisoformat(value)
+            for table, value in manifest.get("watermarks", {}).items()
+        }
+        return state
+    
+    def _apply_index_state(self, state: Dict[str, Any]) -> None:
+        """Substitui o índice em memória pelo estado lido de um snapshot."""
+        self.document_cache = state["document_cache"]
+        self._chunk_ids = state["chunk_ids"]
+        self._sorted_terms = state["vocabulary"]
+        self._doc_lengths = state["doc_lengths"]
+        self._idf = state["idf"]
+        self._posting_offsets = state["posting_offsets"]
+        self._posting_rows = state["posting_rows"]
+        self._posting_weights = state["posting_weights"]
+        self._embedding_matrix = state["embedding_matrix"]
+        self._chunk_rows = {chunk_id: row for row, chunk_id in enumerate(self._chunk_ids)}
+        self.term_index = TermIndexView(
+            self._sorted_terms, self._posting_offsets, self._posting_rows, self._chunk_ids
+        )
+        self._build_metadata_index()
+        self._reset_delta_segment()
+        self._indexed_chunk_count = len(self.document_cache)
+        self._watermarks = state["watermarks"]
+        self.index_generation += 1
+        self.snapshot_id = state["snapshot_id"]
+        self.last_indexed_at = state["indexed_at"]
+    
+    async def _index_equipment_data(
+        self, 
+        session: AsyncSession, 
+        corpus: Optional[Dict[str, DocumentChunk]] = None
+    ) -> None:
         """Indexa dados de equipamentos."""
+        corpus = self.document_cache if corpus is None else corpus
+        try:
+            total = 0
+            async for chunks in self._fetch_equipment_chunks(session):
+                for chunk in chunks:
+                    corpus[chunk.id] = chunk
+                total += len(chunks)
+                self._record_indexing_progress("equipments", len(chunks))
+            
+            logger.info(f"Equipamentos indexados: {total} equipamentos")
+                
+        except Exception as e:
+            logger.error(f"Erro ao indexar equipamentos: {str(e)}")
+            raise
+    
+    async def _index_maintenance_data(
+        self, 
+        session: AsyncSession, 
+        corpus: Optional[Dict[str, DocumentChunk]] = None
+    ) -> None:
+        """Indexa dados de manutenções."""
+        corpus = self.document_cache if corpus is None else corpus
         try:
-            # Query para buscar equipamentos - usando apenas colunas que existem
-            query = text("""
-                SELECT id, code, name, equipment_type, category, description
-                FROM equipments
-                ORDER BY id
+            total = 0
+            async for chunks in self._fetch_maintenance_chunks(session):
+                for chunk in chunks:
+                    corpus[chunk.id] = chunk
+                total += len(chunks)
+                self._record_indexing_progress("maintenances", len(chunks))
+            
+            logger.info(f"Manutenções indexadas: {total} manutenções")
+                
+        except Exception as e:
+            logger.error(f"Erro ao indexar manutenções: {str(e)}")
+            raise
+    
+    async def _index_historical_data(
+        self, 
+        session: AsyncSession, 
+        corpus: Optional[Dict[str, DocumentChunk]] = None
+    ) -> None:
+        """Indexa dados históricos."""
+        corpus = self.document_cache if corpus is None else corpus
+        try:
+            total = 0
+            async for chunks in self._fetch_failure_chunks(session):
+                for chunk in chunks:
+                    corpus[chunk.id] = chunk
+                total += len(chunks)
+                self._record_indexing_progress("failures", len(chunks))
+            
+            logger.info(f"Dados históricos indexados: {total} falhas")
+                
+        except Exception as e:
+            logger.warning(f"Erro ao indexar dados históricos (tabela pode não existir): {str(e)}")
+            # Não propagar erro - tabela de falhas pode não existir ainda
+    
+    async def _iter_batches(
+        self, 
+        session: AsyncSession, 
+        table: str, 
+        select_sql: str, 
+        alias: str, 
+        since: Optional[datetime] = None
+    ) -> AsyncIterator[List[Any]]:
+        """
+        Percorre uma tabela inteira em lotes de tamanho fixo (paginação por chave).
+        
+        Cada lote é uma query `id > último id ORDER BY id LIMIT n`, então o
+        custo por página não cresce com o offset e nunca há mais de um lote
+        de linhas em memória.
+        
+        Args:
+            session: Sessão do banco
+            table: Nome da tabela (chave da marca d'água)
+            select_sql: SELECT ... FROM ... (sem WHERE/ORDER BY)
+            alias: Alias da tabela principal na query
+            since: Retornar apenas linhas com updated_at >= since
+        """
+        last_id = None
+        while True:
+            conditions = []
+            params: Dict[str, Any] = {"batch_size": self.index_batch_size}
+            if since:
+                conditions.append(f"{alias}.updated_at >= :since")
+                params["since"] = since
+            if last_id is not None:
+                conditions.append(f"{alias}.id > :last_id")
+                params["last_id"] = last_id
+            where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            
+            query = text(f"""
+                {select_sql}
+                {where_clause}
+                ORDER BY {alias}.id
+                LIMIT :batch_size
             """)
             
-            result = await session.execute(query)
-            equipments = result.fetchall()
+            result = await session.execute(query, params)
+            rows = result.fetchall()
+            if rows:
+                self._advance_watermark(table, rows)
+                yield rows
+                last_id = rows[-1].id
             
+            if len(rows) < self.index_batch_size:
+                break
+    
+    async def _fetch_equipment_chunks(
+        self, 
+        session: AsyncSession, 
+        since: Optional[datetime] = None
+    ) -> AsyncIterator[List[DocumentChunk]]:
+        """Busca equipamentos (alterados desde `since`, se informado) em lotes de chunks."""
+        # Query para buscar equipamentos - usando apenas colunas que existem
+        select_sql = """
+            SELECT e.id, e.code, e.name, e.equipment_type, e.category, e.description,
+                   e.status, e.updated_at
+            FROM equipments e
+        """
+        
+        async for equipments in self._iter_batches(session, "equipments", select_sql, "e", since):
+            chunks = []
             for equipment in equipments:
                 # Criar documento chunk
                 content = f"""
@@ -207,7 +1170,7 @@ class RAGService:
                 Descrição: {equipment.description or 'Sem descrição'}
                 """.strip()
                 
-                chunk = DocumentChunk(
+                chunks.append(DocumentChunk(
                     id=f"equipment_{str(equipment.id)}",
                     content=content,
                     source="equipment",
@@ -216,38 +1179,31 @@ class RAGService:
                         "code": equipment.code,
                         "name": equipment.name,
                         "type": equipment.equipment_type,
-                        "category": equipment.category
+                        "equipment_type": equipment.equipment_type,
+                        "category": equipment.category,
+                        "status": equipment.status
                     }
-                )
-                
-                # Gerar embedding simples
-                chunk.embedding = self._generate_simple_embedding(content)
-                
-                self.document_cache[chunk.id] = chunk
-            
-            logger.info(f"Equipamentos indexados: {len(equipments)} equipamentos")
-                
-        except Exception as e:
-            logger.error(f"Erro ao indexar equipamentos: {str(e)}")
-            raise
+                ))
+            yield chunks
     
-    async def _index_maintenance_data(self, session: AsyncSession) -> None:
-        """Indexa dados de manutenções."""
-        try:
-            # Query para buscar manutenções - CORRIGINDO nome da tabela
-            query = text("""
-                SELECT m.id, m.equipment_id, m.maintenance_type as type, m.status, 
-                       m.scheduled_date, m.completion_date, m.actual_cost as cost,
-                       m.description, m.team as technician, e.name as equipment_name
-                FROM maintenances m
-                LEFT JOIN equipments e ON m.equipment_id = e.id
-                ORDER BY m.scheduled_date DESC
-                LIMIT 1000
-            """)
-            
-            result = await session.execute(query)
-            maintenances = result.fetchall()
-            
+    async def _fetch_maintenance_chunks(
+        self, 
+        session: AsyncSession, 
+        since: Optional[datetime] = None
+    ) -> AsyncIterator[List[DocumentChunk]]:
+        """Busca manutenções (alteradas desde `since`, se informado) em lotes de chunks."""
+        # Query para buscar manutenções - CORRIGINDO nome da tabela
+        select_sql = """
+            SELECT m.id, m.equipment_id, m.maintenance_type as type, m.status, 
+                   m.scheduled_date, m.completion_date, m.actual_cost as cost,
+                   m.description, m.team as technician, e.name as equipment_name,
+                   e.equipment_type, m.updated_at
+            FROM maintenances m
+            LEFT JOIN equipments e ON m.equipment_id = e.id
+        """
+        
+        async for maintenances in self._iter_batches(session, "maintenances", select_sql, "m", since):
+            chunks = []
             for maintenance in maintenances:
                 # Criar documento chunk
                 content = f"""
@@ -261,45 +1217,39 @@ class RAGService:
                 Equipe: {maintenance.technician or 'Não informado'}
                 """.strip()
                 
-                chunk = DocumentChunk(
+                chunks.append(DocumentChunk(
                     id=f"maintenance_{str(maintenance.id)}",
                     content=content,
                     source="maintenance",
                     metadata={
                         "maintenance_id": str(maintenance.id),
                         "equipment_id": str(maintenance.equipment_id),
+                        "equipment_type": maintenance.equipment_type,
                         "type": maintenance.type,
                         "status": maintenance.status,
                         "cost": maintenance.cost,
                         "scheduled_date": str(maintenance.scheduled_date) if maintenance.scheduled_date else None
                     }
-                )
-                
-                # Gerar embedding simples
-                chunk.embedding = self._generate_simple_embedding(content)
-                
-                self.document_cache[chunk.id] = chunk
-                
-        except Exception as e:
-            logger.error(f"Erro ao indexar manutenções: {str(e)}")
-            raise
+                ))
+            yield chunks
     
-    async def _index_historical_data(self, session: AsyncSession) -> None:
-        """Indexa dados históricos."""
-        try:
-            # Query para buscar falhas - tabela pode não existir ainda
-            query = text("""
-                SELECT f.id, f.equipment_id, f.failure_date, f.description,
-                       f.severity, f.resolution_time, f.cost, e.name as equipment_name
-                FROM failures f
-                LEFT JOIN equipments e ON f.equipment_id = e.id
-                ORDER BY f.failure_date DESC
-                LIMIT 1000
-            """)
-            
-            result = await session.execute(query)
-            failures = result.fetchall()
-            
+    async def _fetch_failure_chunks(
+        self, 
+        session: AsyncSession, 
+        since: Optional[datetime] = None
+    ) -> AsyncIterator[List[DocumentChunk]]:
+        """Busca falhas (alteradas desde `since`, se informado) em lotes de chunks."""
+        # Query para buscar falhas - tabela pode não existir ainda
+        select_sql = """
+            SELECT f.id, f.equipment_id, f.failure_date, f.description,
+                   f.severity, f.resolution_time, f.cost, e.name as equipment_name,
+                   e.equipment_type, f.updated_at
+            FROM failures f
+            LEFT JOIN equipments e ON f.equipment_id = e.id
+        """
+        
+        async for failures in self._iter_batches(session, "failures", select_sql, "f", since):
+            chunks = []
             for failure in failures:
                 # Criar documento chunk
                 content = f"""
@@ -311,29 +1261,38 @@ class RAGService:
                 Custo de Reparo: R$ {failure.cost if failure.cost else 'N/A'}
                 """.strip()
                 
-                chunk = DocumentChunk(
+                chunks.append(DocumentChunk(
                     id=f"failure_{failure.id}",
                     content=content,
                     source="failure",
                     metadata={
                         "failure_id": failure.id,
                         "equipment_id": failure.equipment_id,
+                        "equipment_type": failure.equipment_type,
                         "severity": failure.severity,
                         "failure_date": str(failure.failure_date),
                         "cost": failure.cost
                     }
-                )
-                
-                # Gerar embedding simples
-                chunk.embedding = self._generate_simple_embedding(content)
-                
-                self.document_cache[chunk.id] = chunk
-            
-            logger.info(f"Dados históricos indexados: {len(failures)} falhas")
-                
-        except Exception as e:
-            logger.warning(f"Erro ao indexar dados históricos (tabela pode não existir): {str(e)}")
-            # Não propagar erro - tabela de falhas pode não existir ainda
+                ))
+            yield chunks
+    
+    def _record_indexing_progress(self, table: str, rows: int) -> None:
+        """Atualiza o progresso da indexação em andamento."""
+        progress = self.indexing_progress
+        progress["tables"][table] = progress["tables"].get(table, 0) + rows
+        progress["batches"] += 1
+        progress["rows_indexed"] += rows
+    
+    def _advance_watermark(self, table: str, rows: List[Any]) -> None:
+        """Avança a marca d'água (maior updated_at visto) da tabela."""
+        timestamps = [
+            row.updated_at for row in rows
+            if isinstance(getattr(row, "updated_at", None), datetime)
+        ]
+        if timestamps:
+            current = self._watermarks.get(table)
+            latest = max(timestamps)
+            self._watermarks[table] = latest if current is None else max(current, latest)
     
     def _preprocess_query(self, query: str) -> str:
         """Pré-processa a query para busca."""
@@ -361,31 +1320,259 @@ class RAGService:
         self, 
         query: str, 
         query_type: Optional[str], 
-        max_chunks: int
+        max_chunks: int,
+        mode: RetrievalMode = RetrievalMode.LEXICAL,
+        filters: Optional[RetrievalFilters] = None
     ) -> List[DocumentChunk]:
-        """Busca chunks relevantes baseado na query."""
+        """
+        Busca chunks relevantes baseado na query.
         
-        relevant_chunks = []
+        No modo lexical (BM25) apenas as posting lists dos termos da query
+        são lidas; no modo denso a query é comparada com a matriz de
+        embeddings em uma única multiplicação matriz-vetor; no modo híbrido
+        os dois canais rodam em paralelo e são fundidos por RRF. Filtros de
+        metadados (e query_type) restringem as linhas candidatas antes
+        da pontuação.
+        """
+        self._ensure_search_index()
+        limit = max_chunks * 2  # Buscar mais para depois filtrar
+        
+        # Filtrar por tipo se especificado
+        if query_type and not (filters and filters.sources):
+            filters = replace(filters or RetrievalFilters(), sources=frozenset({query_type}))
+        candidates = self._candidate_rows(filters) if filters and not filters.is_empty else None
+        
+        if mode == RetrievalMode.HYBRID:
+            rows, scores = await self._hybrid_scores(query, candidates, limit)
+        elif mode == RetrievalMode.DENSE:
+            rows, scores = self._dense_scores(query, candidates)
+        else:
+            rows, scores = self._bm25_scores(self._extract_query_terms(query), candidates)
         
-        # Buscar por termos da query
+        # Top-k por argpartition; cópias evitam que queries concorrentes sobrescrevam scores
+        top = self._top_k(scores, limit)
+        return [
+            replace(self.document_cache[self._chunk_ids[rows[i]]], relevance_score=float(scores[i]))
+            for i in top
+        ]
+    
+    async def _hybrid_scores(
+        self, 
+        query: str, 
+        candidates: Optional[np.ndarray], 
+        limit: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Executa os canais lexical e denso em paralelo e funde os rankings.
+        
+        Os canais rodam em threads (o NumPy libera o GIL nas operações
+        pesadas). Se o índice mudar durante a busca, os canais são
+        recalculados no event loop para não misturar versões do índice.
+        
+        Args:
+            query: Query pré-processada
+            candidates: Linhas permitidas pelos filtros (None = todas)
+            limit: Número de resultados desejado
+            
+        Returns:
+            Tuple com linhas e scores RRF normalizados em [0, 1]
+        """
         query_terms = self._extract_query_terms(query)
+        generation = self.index_generation
         
-        for chunk in self.document_cache.values():
-            # Filtrar por tipo se especificado
-            if query_type and chunk.source != query_type:
-                continue
+        try:
+            lexical, dense = await asyncio.gather(
+                asyncio.to_thread(self._bm25_scores, query_terms, candidates),
+                asyncio.to_thread(self._dense_scores, query, candidates)
+            )
+        except Exception:
+            if self.index_generation == generation:
+                raise
+            generation = None
+        
+        if self.index_generation != generation:
+            lexical = self._bm25_scores(query_terms, candidates)
+            dense = self._dense_scores(query, candidates)
+        
+        return self._reciprocal_rank_fusion([
+            (*lexical, max(self.hybrid_lexical_depth, limit)),
+            (*dense, max(self.hybrid_dense_depth, limit)),
+        ])
+    
+    def _reciprocal_rank_fusion(
+        self, 
+        rankings: List[Tuple[np.ndarray, np.ndarray, int]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Funde rankings por reciprocal rank fusion: score = soma de 1 / (k + posição).
+        
+        Args:
+            rankings: Por canal, linhas, scores e profundidade (candidatos considerados)
+            
+        Returns:
+            Tuple com linhas e scores normalizados pelo máximo possível (1º em todos os canais)
+        """
+        row_parts = []
+        score_parts = []
+        for rows, scores, depth in rankings:
+            top = self._top_k(scores, depth)
+            row_parts.append(rows[top])
+            score_parts.append(1.0 / (self.rrf_k + np.arange(1, len(top) + 1)))
+        
+        if not any(len(part) for part in row_parts):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+        fused = np.bincount(inverse, weights=np.concatenate(score_parts), minlength=len(rows))
+        max_score = len(rankings) / (self.rrf_k + 1)
+        return rows, (fused / max_score).astype(np.float32)
+    
+    def _dense_scores(
+        self, 
+        query: str, 
+        candidates: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calcula similaridade de cosseno entre a query e os chunks.
+        
+        Args:
+            query: Query pré-processada
+            candidates: Linhas permitidas pelos filtros (None = todas)
+            
+        Returns:
+            Tuple com linhas de similaridade positiva e seus scores
+        """
+        query_vector = self._normalize_rows(self._embed_text(query)[np.newaxis, :])[0]
+        if not query_vector.any() or len(self._chunk_ids) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        
+        if candidates is None:
+            base_rows = np.arange(self._base_row_count)
+            base_similarities = self._embedding_matrix @ query_vector
+            delta_rows = np.arange(self._base_row_count, len(self._chunk_ids))
+        else:
+            # Multiplica apenas as linhas candidatas
+            base_rows = candidates[candidates < self._base_row_count]
+            base_similarities = self._embedding_matrix[base_rows] @ query_vector
+            delta_rows = candidates[candidates >= self._base_row_count]
+        
+        similarities = np.concatenate([
+            base_similarities,
+            self._delta_embeddings[delta_rows - self._base_row_count] @ query_vector
+        ])
+        rows = np.concatenate([base_rows, delta_rows])
+        keep = (similarities > 0) & self._live_rows[rows]
+        return rows[keep], similarities[keep]
+    
+    def _bm25_scores(
+        self, 
+        query_terms: List[str], 
+        candidates: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Calcula scores BM25 dos chunks que contêm ao menos um termo da query.
+        
+        Os pesos BM25 de cada posting (idf, tf e normalização por tamanho do
+        documento) são pré-computados na indexação, então a consulta se
+        resume a concatenar postings e somar pesos por linha.
+        
+        Args:
+            query_terms: Termos extraídos da query
+            candidates: Linhas permitidas pelos filtros (None = todas)
             
-            # Calcular similaridade baseada em termos
-            similarity = self._calculate_term_similarity(query_terms, chunk.content)
+        Returns:
+            Tuple com linhas candidatas e scores normalizados em [0, 1]
+        """
+        # Linhas válidas: versões atuais que passam nos filtros
+        row_mask = self._live_rows
+        if candidates is not None:
+            row_mask = np.zeros(len(self._live_rows), dtype=bool)
+            row_mask[candidates] = True
+            row_mask &= self._live_rows
+        row_parts = []
+        weight_parts = []
+        max_score = 0.0
+        
+        for term in dict.fromkeys(query_terms):
+            term_max_idf = 0.0
             
-            if similarity > 0:
-                chunk.relevance_score = similarity
-                relevant_chunks.append(chunk)
+            start, end = self._term_id_range(term)
+            for term_id in range(start, end):
+                lo, hi = self._posting_offsets[term_id], self._posting_offsets[term_id + 1]
+                term_rows = self._posting_rows[lo:hi]
+                keep = row_mask[term_rows]
+                weights = self._posting_weights[lo:hi][keep]
+                if self._sorted_terms[term_id] != term:
+                    weights = weights * self.prefix_match_weight
+                row_parts.append(term_rows[keep])
+                weight_parts.append(weights)
+            if start < end:
+                term_max_idf = float(self._idf[start:end].max())
+            
+            start, end = self._term_id_range(term, self._delta_terms)
+            for delta_term in self._delta_terms[start:end]:
+                term_rows, weights, idf = self._delta_term_weights(delta_term)
+                keep = row_mask[term_rows]
+                weights = weights[keep]
+                if delta_term != term:
+                    weights = weights * self.prefix_match_weight
+                row_parts.append(term_rows[keep])
+                weight_parts.append(weights)
+                term_max_idf = max(term_max_idf, idf)
+            
+            # Limite superior do termo (tf -> infinito)
+            max_score += term_max_idf * (self.bm25_k1 + 1)
+        
+        if not row_parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        
+        rows, inverse = np.unique(np.concatenate(row_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weight_parts), minlength=len(rows))
+        
+        # Normalizar pelo score máximo alcançável para manter a escala do threshold
+        scores = np.minimum(1.0, scores / max_score).astype(np.float32)
+        return rows, scores
+    
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """Retorna índices dos k maiores scores, em ordem decrescente."""
+        if k <= 0 or len(scores) == 0:
+            return np.zeros(0, dtype=np.int64)
         
-        # Ordenar por relevância
-        relevant_chunks.sort(key=lambda x: x.relevance_score, reverse=True)
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
         
-        return relevant_chunks[:max_chunks * 2]  # Buscar mais para depois filtrar
+        return top[np.argsort(-scores[top], kind="stable")]
+    
+    def _term_id_range(self, term: str, vocabulary: Optional[List[str]] = None) -> Tuple[int, int]:
+        """
+        Retorna o intervalo de ids de termos que começam com o termo (ex.: plurais).
+        
+        Como os ids seguem a ordem alfabética do vocabulário, termos com o
+        mesmo prefixo ocupam um intervalo contíguo.
+        
+        Args:
+            term: Termo da query
+            vocabulary: Vocabulário ordenado do segmento (padrão: segmento base)
+        """
+        vocabulary = self._sorted_terms if vocabulary is None else vocabulary
+        start = bisect.bisect_left(vocabulary, term)
+        end = start
+        limit = min(len(vocabulary), start + self.max_prefix_expansions)
+        while end < limit and vocabulary[end].startswith(term):
+            end += 1
+        return start, end
+    
+    def _expand_term(self, term: str) -> List[str]:
+        """Retorna termos do vocabulário que começam com o termo."""
+        start, end = self._term_id_range(term)
+        return self._sorted_terms[start:end]
+    
+    def _ensure_search_index(self) -> None:
+        """Reconstrói os índices de busca se o cache de documentos mudou."""
+        if self._indexed_chunk_count != len(self.document_cache):
+            self._build_search_index()
     
     def _extract_query_terms(self, query: str) -> List[str]:
         """Extrai termos relevantes da query."""
@@ -402,59 +1589,12 @@ class RAGService:
         # Dividir em palavras e filtrar
         terms = []
         for word in query.split():
-            word = word.strip(".,!?;:")
+            word = word.strip(".,!?;:()[]\"'")
             if len(word) > 2 and word not in stop_words:
                 terms.append(word)
         
         return terms
     
-    def _calculate_term_similarity(self, query_terms: List[str], content: str) -> float:
-        """Calcula similaridade baseada em termos."""
-        content_lower = content.lower()
-        
-        matches = 0
-        total_terms = len(query_terms)
-        
-        # Termos específicos do domínio para dar bonus
-        domain_terms = {
-            "equipamento": 0.3,
-            "equipamentos": 0.3,
-            "manutenção": 0.3,
-            "manutenções": 0.3,
-            "transformador": 0.4,
-            "disjuntor": 0.4,
-            "seccionadora": 0.4,
-            "falha": 0.3,
-            "falhas": 0.3
-        }
-        
-        for term in query_terms:
-            # Busca direta
-            if term in content_lower:
-                matches += 1
-            
-            # Busca por termos relacionados
-            if term in ["equipamento", "equipamentos"]:
-                if any(word in content_lower for word in ["equipamento:", "tipo:", "código:"]):
-                    matches += 0.8  # Bonus para documentos de equipamento
-            elif term in ["manutenção", "manutenções"]:
-                if any(word in content_lower for word in ["manutenção:", "status:", "programada:"]):
-                    matches += 0.8  # Bonus para documentos de manutenção
-        
-        # Bonus para correspondências de domínio
-        domain_bonus = 0
-        for domain_term, bonus in domain_terms.items():
-            if domain_term in content_lower:
-                domain_bonus += bonus
-        
-        # Correspondências exatas também ganham bonus
-        exact_matches = sum(1 for term in query_terms if f" {term} " in f" {content_lower} ")
-        
-        base_score = matches / total_terms if total_terms > 0 else 0
-        bonus = exact_matches * 0.2 + domain_bonus
-        
-        return min(1.0, base_score + bonus)
-    
     def _calculate_relevance_scores(
         self, 
         query: str, 
@@ -491,40 +1631,290 @@ class RAGService:
     
     def _generate_simple_embedding(self, text: str) -> List[float]:
         """Gera embedding simples baseado em TF-IDF simulado."""
-        # Vocabulário básico para o domínio
-        vocab = [
-            "transformador", "gerador", "disjuntor", "cabo", "subestacao", "linha",
-            "manutenção", "preventiva", "corretiva", "falha", "defeito", "problema",
-            "operacional", "ativo", "inativo", "parado", "funcionando",
-            "custo", "valor", "preço", "gasto", "orçamento",
-            "hoje", "ontem", "semana", "mes", "ano", "ultimo",
-            "urgente", "critico", "normal", "baixo", "alto",
-            "instalação", "reparar", "trocar", "verificar", "inspecionar"
-        ]
-        
+        return self._embed_text(text).tolist()
+    
+    def _embed_text(self, text: str) -> np.ndarray:
+        """Gera o embedding simples como vetor float32."""
         text_lower = text.lower()
-        embedding = []
         
-        for word in vocab:
-            # TF simples - contagem de termo
-            count = text_lower.count(word)
-            # Normalizar por comprimento do texto
-            tf = count / max(1, len(text_lower.split()))
-            embedding.append(tf)
+        # TF simples - contagem de termo normalizada por comprimento do texto
+        counts = np.fromiter(
+            (text_lower.count(word) for word in self.EMBEDDING_VOCABULARY),
+            dtype=np.float32,
+            count=len(self.EMBEDDING_VOCABULARY)
+        )
+        return counts / max(1, len(text_lower.split()))
+    
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        """Normaliza linhas para norma L2 unitária (linhas zeradas permanecem zero)."""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+    
+    def _build_search_index(self) -> None:
+        """Constrói índice lexical (BM25) e matriz de embeddings, compactando o delta."""
+        self._build_term_index()
+        self._build_embedding_matrix()
+    
+    def _build_embedding_matrix(self) -> None:
+        """Monta a matriz contígua de embeddings na ordem de self._chunk_ids."""
+        matrix = np.zeros((len(self._chunk_ids), len(self.EMBEDDING_VOCABULARY)), dtype=np.float32)
+        for row, chunk_id in enumerate(self._chunk_ids):
+            matrix[row] = self._embed_text(self.document_cache[chunk_id].content)
         
-        return embedding
+        self._embedding_matrix = self._normalize_rows(matrix)
+        self._chunk_rows = {chunk_id: row for row, chunk_id in enumerate(self._chunk_ids)}
     
     def _build_term_index(self) -> None:
-        """Constrói índice de termos para busca rápida."""
-        self.term_index.clear()
+        """
+        Constrói o índice invertido e as estatísticas BM25 do segmento base.
         
-        for chunk_id, chunk in self.document_cache.items():
-            terms = self._extract_query_terms(chunk.content)
+        Gera as postings em formato CSR (offsets, linhas e pesos BM25 em
+        arrays contíguos) para que a pontuação de uma query seja feita com
+        operações vetorizadas; term_index é uma visão sobre esses arrays.
+        """
+        chunk_ids = list(self.document_cache)
+        documents = (
+            (row, Counter(self._extract_query_terms(self.document_cache[chunk_id].content.lower())))
+            for row, chunk_id in enumerate(chunk_ids)
+        )
+        vocabulary, offsets, rows, weights, idf, doc_lengths = self._build_postings(documents)
+        
+        self._sorted_terms = vocabulary
+        self._chunk_ids = chunk_ids
+        self._doc_lengths = doc_lengths
+        self._idf = idf
+        self._posting_offsets = offsets
+        self._posting_rows = rows
+        self._posting_weights = weights
+        self.term_index = TermIndexView(vocabulary, offsets, rows, chunk_ids)
+        self._build_metadata_index()
+        self._reset_delta_segment()
+        self._indexed_chunk_count = len(self.document_cache)
+        self.index_generation += 1
+    
+    def _build_postings(
+        self, 
+        documents: Iterable[Tuple[int, Counter]]
+    ) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Monta postings CSR com pesos BM25 pré-computados.
+        
+        Os documentos são consumidos um a um e as postings acumuladas em
+        arrays compactos de inteiros, sem manter as contagens de todos os
+        documentos em memória.
+        
+        Args:
+            documents: Pares (linha, frequência dos termos) de cada documento
+            
+        Returns:
+            Tuple com vocabulário ordenado, offsets, linhas, pesos, IDF por termo
+            e tamanho de cada documento
+        """
+        # Postings guardam a posição do documento na entrada; a linha vem de row_ids
+        term_positions: Dict[str, array] = {}
+        term_tfs: Dict[str, array] = {}
+        row_ids = array("q")
+        lengths = array("i")
+        
+        for row, counts in documents:
+            position = len(row_ids)
+            row_ids.append(row)
+            lengths.append(sum(counts.values()))
+            
+            # Cada documento aparece uma única vez na posting list do termo
+            for term, tf in counts.items():
+                if term not in term_positions:
+                    term_positions[term] = array("i")
+                    term_tfs[term] = array("i")
+                term_positions[term].append(position)
+                term_tfs[term].append(tf)
+        
+        doc_lengths = np.asarray(lengths, dtype=np.float32)
+        total_docs = len(row_ids)
+        avg_doc_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        
+        vocabulary = sorted(term_positions)
+        document_frequency = np.fromiter(
+            (len(term_positions[term]) for term in vocabulary), dtype=np.int64, count=len(vocabulary)
+        )
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(document_frequency, out=offsets[1:])
+        total_postings = int(offsets[-1])
+        
+        posting_positions = np.fromiter(
+            chain.from_iterable(term_positions[term] for term in vocabulary),
+            dtype=np.int64, count=total_postings
+        )
+        posting_rows = np.asarray(row_ids, dtype=np.int64)[posting_positions].astype(np.int32)
+        tfs = np.fromiter(
+            chain.from_iterable(term_tfs[term] for term in vocabulary),
+            dtype=np.float32, count=total_postings
+        )
+        
+        # IDF do BM25 (variante sempre positiva)
+        df = document_frequency.astype(np.float32)
+        idf = np.log1p((total_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        
+        # Peso de cada posting: idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        length_norm = self.bm25_k1 * (
+            1 - self.bm25_b + self.bm25_b * doc_lengths / max(avg_doc_length, 1e-9)
+        )
+        posting_idf = np.repeat(idf, document_frequency)
+        weights = posting_idf * tfs * (self.bm25_k1 + 1) / (tfs + length_norm[posting_positions])
+        
+        return vocabulary, offsets, posting_rows, weights.astype(np.float32), idf, doc_lengths
+    
+    def _build_metadata_index(self) -> None:
+        """Constrói os sub-índices de metadados sobre as linhas do segmento base."""
+        attribute_rows: Dict[str, Dict[str, List[int]]] = {
+            attribute: {} for _, attribute in RetrievalFilters.ATTRIBUTE_FIELDS
+        }
+        dated_rows = []
+        dates = []
+        
+        for row, chunk_id in enumerate(self._chunk_ids):
+            chunk = self.document_cache[chunk_id]
+            for attribute, value in self._chunk_attributes(chunk).items():
+                if value is not None:
+                    attribute_rows[attribute].setdefault(value, []).append(row)
             
-            for term in terms:
-                if term not in self.term_index:
-                    self.term_index[term] = []
-                self.term_index[term].append(chunk_id)
+            timestamp = self._chunk_timestamp(chunk)
+            if timestamp is not None:
+                dated_rows.append(row)
+                dates.append(timestamp)
+        
+        # Linhas já saem em ordem crescente
+        self._attribute_rows = {
+            attribute: {value: np.asarray(rows, dtype=np.int64) for value, rows in values.items()}
+            for attribute, values in attribute_rows.items()
+        }
+        dates_array = np.asarray(dates, dtype=np.float64)
+        order = np.argsort(dates_array, kind="stable")
+        self._sorted_dates = dates_array[order]
+        self._date_rows = np.asarray(dated_rows, dtype=np.int64)[order]
+    
+    def _candidate_rows(self, filters: RetrievalFilters) -> np.ndarray:
+        """
+        Calcula as linhas (ordenadas) que satisfazem os filtros.
+        
+        Segmento base: união das linhas de cada valor aceito, interseção
+        entre atributos e busca binária no intervalo de datas. Linhas do
+        segmento delta (poucas) são avaliadas individualmente.
+        """
+        candidates: Optional[np.ndarray] = None
+        
+        for attribute, values in filters.attribute_filters().items():
+            index = self._attribute_rows.get(attribute, {})
+            parts = [index[value] for value in values if value in index]
+            scope = filters.SOURCE_SCOPED_ATTRIBUTES.get(attribute)
+            if scope is not None:
+                # Linhas de outras fontes não são restringidas pelo atributo
+                parts += [
+                    rows for source, rows in self._attribute_rows.get("source", {}).items() if source != scope
+                ]
+            if len(parts) == 1:
+                rows = parts[0]
+            else:
+                rows = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+        
+        if filters.date_from is not None or filters.date_to is not None:
+            lo = 0 if filters.date_from is None else int(np.searchsorted(
+                self._sorted_dates, filters.date_from.timestamp(), side="left"
+            ))
+            hi = len(self._sorted_dates) if filters.date_to is None else int(np.searchsorted(
+                self._sorted_dates, filters.date_to.timestamp(), side="right"
+            ))
+            rows = np.sort(self._date_rows[lo:hi])
+            candidates = rows if candidates is None else np.intersect1d(candidates, rows, assume_unique=True)
+        
+        if candidates is None:
+            candidates = np.arange(self._base_row_count, dtype=np.int64)
+        
+        delta_rows = [
+            row for row in sorted(self._delta_term_counts)
+            if filters.matches(
+                self._chunk_attributes(self.document_cache[self._chunk_ids[row]]),
+                self._chunk_timestamp(self.document_cache[self._chunk_ids[row]])
+            )
+        ]
+        if delta_rows:
+            candidates = np.concatenate([candidates, np.asarray(delta_rows, dtype=np.int64)])
+        return candidates
+    
+    @staticmethod
+    def _chunk_attributes(chunk: DocumentChunk) -> Dict[str, Optional[str]]:
+        """Extrai os atributos filtráveis de um chunk."""
+        metadata = chunk.metadata or {}
+        source = normalize_attribute("source", chunk.source)
+        attributes = {
+            "source": source,
+            "equipment_type": normalize_attribute("equipment_type", metadata.get("equipment_type")),
+            "status": normalize_attribute("status", metadata.get("status")),
+            "severity": normalize_attribute("severity", metadata.get("severity")),
+        }
+        # Status de outras fontes (ex.: manutenção "completed") não entra no índice
+        for attribute, scope in RetrievalFilters.SOURCE_SCOPED_ATTRIBUTES.items():
+            if source != scope:
+                attributes[attribute] = None
+        return attributes
+    
+    @staticmethod
+    def _chunk_timestamp(chunk: DocumentChunk) -> Optional[float]:
+        """Data de referência do chunk (falha ou manutenção programada) como timestamp."""
+        metadata = chunk.metadata or {}
+        value = metadata.get("failure_date") or metadata.get("scheduled_date")
+        if isinstance(value, datetime):
+            return value.timestamp()
+        try:
+            return datetime.fromisoformat(str(value)).timestamp()
+        except ValueError:
+            return None
+    
+    def _base_document_frequency(self, term: str) -> int:
+        """Número de documentos do segmento base que contêm o termo."""
+        term_id = bisect.bisect_left(self._sorted_terms, term)
+        if term_id < len(self._sorted_terms) and self._sorted_terms[term_id] == term:
+            return int(self._posting_offsets[term_id + 1] - self._posting_offsets[term_id])
+        return 0
+    
+    def _delta_term_weights(self, term: str) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Calcula os pesos BM25 das postings de um termo do segmento delta.
+        
+        O IDF combina a frequência do termo no segmento base com a das
+        linhas vivas do delta, sobre o total de documentos vivos; por isso
+        é calculado na consulta, e não a cada mutação.
+        
+        Returns:
+            Tuple com linhas, pesos e IDF do termo
+        """
+        term_rows, term_tfs = self._delta_postings[term]
+        rows = np.frombuffer(term_rows, dtype=np.intc)
+        tfs = np.frombuffer(term_tfs, dtype=np.intc).astype(np.float32)
+        doc_lengths = np.frombuffer(self._delta_doc_lengths, dtype=np.intc)[rows - self._base_row_count]
+        
+        df = self._base_document_frequency(term) + self._delta_document_frequency[term]
+        idf = float(np.log1p((self._live_count - df + 0.5) / (df + 0.5)))
+        length_norm = self.bm25_k1 * (
+            1 - self.bm25_b + self.bm25_b * doc_lengths / max(self._avg_doc_length, 1e-9)
+        )
+        weights = (idf * tfs * (self.bm25_k1 + 1) / (tfs + length_norm)).astype(np.float32)
+        return rows, weights, idf
+    
+    def _reset_delta_segment(self) -> None:
+        """Descarta o segmento delta (após reconstruir ou carregar o segmento base)."""
+        self._base_row_count = len(self._chunk_ids)
+        self._live_rows = np.ones(self._base_row_count, dtype=bool)
+        self._live_count = self._base_row_count
+        self._avg_doc_length = float(self._doc_lengths.mean()) if len(self._doc_lengths) else 0.0
+        self._delta_term_counts.clear()
+        self._delta_postings.clear()
+        self._delta_document_frequency.clear()
+        self._delta_terms: List[str] = []
+        self._delta_doc_lengths = array("i")  # Por posição no delta (linha - _base_row_count)
+        self._delta_embeddings = np.zeros((0, len(self.EMBEDDING_VOCABULARY)), dtype=np.float32)
     
     def _generate_context_summary(self, chunks: List[DocumentChunk]) -> str:
         """Gera resumo do contexto recuperado."""
@@ -605,9 +1995,19 @@ class RAGService:
             "queries_processed": self.queries_processed,
             "cache_hits": self.cache_hits,
             "cache_hit_rate": round(cache_hit_rate, 3),
+            "result_cache_entries": len(self._result_cache),
             "avg_retrieval_time": round(avg_retrieval_time, 3),
             "total_documents": len(self.document_cache),
             "indexed_terms": len(self.term_index),
+            "embedding_dimensions": self._embedding_matrix.shape[1],
+            "embedding_matrix_mb": round(self._embedding_matrix.nbytes / 1024 / 1024, 3),
+            "last_indexed_at": self.last_indexed_at.isoformat() if self.last_indexed_at else None,
+            "snapshot_id": self.snapshot_id,
+            "index_generation": self.index_generation,
+            "default_retrieval_mode": self.default_retrieval_mode.value,
+            "pending_delta_chunks": len(self._delta_term_counts),
+            "indexing": self.indexing_progress,
+            "filter_values": {attribute: len(values) for attribute, values in self._attribute_rows.items()},
             "relevance_threshold": self.relevance_threshold,
             "max_chunks_per_query": self.max_chunks_per_query
         }
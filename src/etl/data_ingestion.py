@@ -18,6 +18,7 @@ import json
 
 from .data_processor import DataProcessor
 from .exceptions import DataProcessingError
+from .ingestion_events import IngestionEvent, ingestion_event_bus
 from ..database.repositories import RepositoryManager
 
 logger = logging.getLogger(__name__)
@@ -272,6 +273,10 @@ class DataIngestionOrchestrator:
                             'success': False
                         })
             
+            # Avisa cache e índice RAG sobre os dados gravados
+            for result in results:
+                ingestion_event_bus.publish(IngestionEvent.from_result(result, source=f"job:{job.name}"))
+            
             # Processa resultados
             successful_files = sum(1 for r in results if r.get('success'))
             total_records = sum(r.get('valid_records', 0) for r in results)
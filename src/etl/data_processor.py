@@ -333,7 +333,8 @@ class DataProcessor:
             # Salva no banco se há registros válidos
             saved_count = 0
             if valid_records and self.repository_manager:
-                saved_count = await self.save_to_database(valid_records, data_type or self.detect_data_type(file_path, file_format or self.detect_file_format(file_path)))
+                data_type = data_type or self.detect_data_type(file_path, file_format or self.detect_file_format(file_path))
+                saved_count = await self.save_to_database(valid_records, data_type)
             
             processing_time = (datetime.now() - start_time).total_seconds()
             
@@ -345,6 +346,8 @@ class DataProcessor:
                 'invalid_records': len(validation_errors),
                 'saved_records': saved_count,
                 'validation_errors': validation_errors,
+                'data_type': data_type.value if data_type else None,
+                'equipment_ids': self._affected_equipment_ids(valid_records) if saved_count else [],
                 'success': True
             }
             
@@ -368,6 +371,24 @@ class DataProcessor:
             logger.error(f"Erro no processamento: {result}")
             return result
     
+    @staticmethod
+    def _affected_equipment_ids(records: List[Dict[str, Any]]) -> List[str]:
+        """Códigos de equipamento referenciados pelos registros (para invalidação de cache).
+        
+        Args:
+            records: Registros válidos gravados
+            
+        Returns:
+            Lista ordenada de códigos em maiúsculas
+        """
+        equipment_ids = set()
+        for record in records:
+            for field in ('code', 'equipment_id'):
+                value = record.get(field)
+                if value:
+                    equipment_ids.add(str(value).strip().upper())
+        return sorted(equipment_ids)
+    
     def process_directory(self, directory_path: Path, recursive: bool = True) -> List[Dict[str, Any]]:
         """Processa todos os arquivos suportados em um diretório.
         
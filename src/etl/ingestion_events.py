@@ -0,0 +1,139 @@
+"""
+Barramento de eventos de ingestão de dados.
+
+O pipeline ETL publica um evento sempre que grava registros no banco; os
+serviços da API assinam o barramento para invalidar seletivamente o cache de
+respostas e atualizar o índice RAG sem esperar pelo TTL.
+
+O ETL roda em threads próprias (UploadMonitor, DataIngestionOrchestrator),
+então a publicação é thread-safe e handlers assíncronos são executados no
+event loop informado na assinatura.
+"""
+
+import asyncio
+import logging
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IngestionEvent:
+    """Registros gravados por uma execução do pipeline ETL."""
+    data_type: str
+    equipment_ids: FrozenSet[str] = frozenset()
+    records_saved: int = 0
+    source: str = ""
+    occurred_at: datetime = field(default_factory=datetime.now)
+    
+    @classmethod
+    def from_result(cls, result: Dict[str, Any], source: str = "") -> Optional["IngestionEvent"]:
+        """Cria evento a partir do resultado de DataProcessor.process_and_save.
+        
+        Args:
+            result: Dicionário retornado por process_and_save
+            source: Origem da ingestão (upload, job, ...)
+        
+        Returns:
+            IngestionEvent ou None se nada foi gravado
+        """
+        if not result.get('success') or not result.get('saved_records') or not result.get('data_type'):
+            return None
+        
+        return cls(
+            data_type=result['data_type'],
+            equipment_ids=frozenset(result.get('equipment_ids', ())),
+            records_saved=result['saved_records'],
+            source=source
+        )
+
+
+class IngestionEventBus:
+    """Barramento publish/subscribe thread-safe para eventos de ingestão."""
+    
+    def __init__(self):
+        """Inicializa o barramento sem assinantes."""
+        self._subscribers: List[Tuple[Callable, Optional[asyncio.AbstractEventLoop]]] = []
+        self._lock = threading.Lock()
+        self.published_count = 0
+    
+    def subscribe(self, handler: Callable,
+                  loop: Optional[asyncio.AbstractEventLoop] = None) -> Callable[[], None]:
+        """Registra um handler de eventos.
+        
+        Args:
+            handler: Função (ou coroutine function) que recebe o IngestionEvent
+            loop: Event loop onde handlers assíncronos devem rodar
+        
+        Returns:
+            Função que cancela a assinatura
+        """
+        subscriber = (handler, loop)
+        with self._lock:
+            self._subscribers.append(subscriber)
+        
+        def unsubscribe() -> None:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+        
+        return unsubscribe
+    
+    def publish(self, event: Optional[IngestionEvent]) -> None:
+        """Entrega o evento a todos os assinantes sem bloquear o ETL.
+        
+        Args:
+            event: Evento a publicar (None é ignorado)
+        """
+        if event is None:
+            return
+        
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self.published_count += 1
+        
+        logger.info(f"Evento de ingestão: {event.records_saved} registros de {event.data_type} "
+                    f"({len(event.equipment_ids)} equipamentos)")
+        
+        for handler, loop in subscribers:
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    self._dispatch_async(handler, loop, event)
+                else:
+                    handler(event)
+            except Exception as e:
+                logger.error(f"Erro no handler de ingestão {getattr(handler, '__name__', handler)}: {e}")
+    
+    def _dispatch_async(self, handler: Callable, loop: Optional[asyncio.AbstractEventLoop],
+                        event: IngestionEvent) -> None:
+        """Agenda handler assíncrono no loop do assinante."""
+        if loop is not None and loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(handler(event), loop)
+            future.add_done_callback(self._log_failure)
+            return
+        
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Thread sem event loop (ETL): executar até o fim
+            asyncio.run(handler(event))
+        else:
+            running_loop.create_task(handler(event)).add_done_callback(self._log_failure)
+    
+    @staticmethod
+    def _log_failure(future) -> None:
+        """Registra exceções de handlers assíncronos."""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Erro no handler de ingestão: {future.exception()}")
+    
+    def clear(self) -> None:
+        """Remove todos os assinantes."""
+        with self._lock:
+            self._subscribers.clear()
+
+
+# Barramento compartilhado entre o ETL e a API
+ingestion_event_bus = IngestionEventBus()
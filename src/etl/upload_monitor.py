@@ -20,6 +20,7 @@ import shutil
 
 from .data_processor import DataProcessor, FileFormat, DataType
 from .exceptions import DataProcessingError
+from .ingestion_events import IngestionEvent, ingestion_event_bus
 
 try:
     from ..database.repositories import RepositoryManager
@@ -272,6 +273,11 @@ class UploadMonitor:
                 upload_status.records_processed = result.get('records_processed', 0)
                 upload_status.records_valid = result.get('records_saved', 0)
                 upload_status.records_invalid = result.get('validation_errors', 0)
+                
+                # Avisa cache e índice RAG sobre os dados gravados
+                ingestion_event_bus.publish(
+                    IngestionEvent.from_result(result, source=f"upload:{upload_status.upload_id}")
+                )
             else:
                 # Apenas processa sem salvar
                 valid_records, validation_errors = self.data_processor.process_file(
@@ -17,11 +17,17 @@ from typing import Dict, Any
 from unittest.mock import Mock, patch, AsyncMock
 
 from src.api.services.cache_service import (
+    CacheBackend,
     CacheService, 
     QueryNormalizer, 
     CacheEntry, 
     CacheStrategy,
-    CacheStatus
+    CacheStatus,
+    DiskCacheTier,
+    EvictionPolicy,
+    LFUEviction,
+    LRUEviction,
+    TinyLFUEviction
 )
 
 
@@ -110,6 +116,32 @@ class TestQueryNormalizer:
         
         # Normalizações devem ser iguais (palavras ordenadas)
         assert norm1 == norm2
+    
+    def test_normalize_memo_is_bounded(self):
+        """Testa que o memo devolve o mesmo resultado e respeita o limite."""
+        normalizer = QueryNormalizer(memo_size=2)
+        first = normalizer.normalize("defeitos no trafo T1 em 2024-01-15")
+        
+        with patch.object(normalizer, '_normalize', wraps=normalizer._normalize) as spy:
+            assert normalizer.normalize("defeitos no trafo T1 em 2024-01-15") == first
+            spy.assert_not_called()
+            
+            normalizer.normalize("custo do gerador")
+            normalizer.normalize("status do disjuntor")
+            assert len(normalizer._normalized_memo) == 2
+            
+            normalizer.normalize("defeitos no trafo T1 em 2024-01-15")
+            assert spy.call_count == 3
+    
+    def test_compile_refreshes_synonyms(self, normalizer):
+        """Testa que compile() reflete sinônimos alterados e limpa o memo."""
+        assert normalizer.normalize("avaria") == "avaria"
+        
+        normalizer.synonyms["falha"].append("avaria")
+        normalizer.compile()
+        
+        assert normalizer.normalize("avaria") == "falha"
+        assert normalizer.tokens("falha transformador") == {"falha", "transformador"}
 
 
 class TestCacheEntry:
@@ -552,6 +584,556 @@ class TestCacheService:
         assert len(cache_service.cache) == 30
 
 
+class TestEvictionPolicies:
+    """Testes das políticas de remoção O(1)."""
+    
+    @pytest.fixture
+    def cache_factory(self):
+        """Cria CacheService pequeno com a política informada."""
+        with patch('src.api.services.cache_service.get_settings') as mock_settings:
+            mock_settings.return_value = Mock(
+                gemini_model="gemini-2.5-flash",
+                gemini_temperature=0.2
+            )
+            
+            def factory(policy: EvictionPolicy, max_size: int = 3) -> CacheService:
+                service = CacheService(policy)
+                service.max_cache_size = max_size
+                service._start_cleanup_task = Mock()
+                return service
+            
+            yield factory
+    
+    def test_lru_victim_is_least_recently_used(self):
+        """LRU remove a chave acessada há mais tempo."""
+        policy = LRUEviction()
+        for key in ["a", "b", "c"]:
+            policy.record_insert(key)
+        policy.record_access("a")
+        
+        assert policy.victim() == "b"
+        policy.remove("b")
+        assert policy.victim() == "c"
+    
+    def test_lfu_victim_is_least_frequent(self):
+        """LFU remove a chave menos acessada, desempatando pela mais antiga."""
+        policy = LFUEviction()
+        for key in ["a", "b", "c"]:
+            policy.record_insert(key)
+        policy.record_access("a")
+        policy.record_access("b")
+        
+        assert policy.victim() == "c"
+        policy.remove("c")
+        assert policy.victim() == "a"
+        
+        policy.remove("a")
+        policy.remove("b")
+        assert policy.victim() is None
+    
+    def test_tiny_lfu_rejects_cold_candidate(self):
+        """TinyLFU só admite chaves ao menos tão frequentes quanto a vítima."""
+        policy = TinyLFUEviction(capacity=16)
+        policy.record_insert("hot")
+        for _ in range(3):
+            policy.record_access("hot")
+        
+        assert policy.admit("cold") is False
+        
+        for _ in range(3):
+            policy.record_access("cold")
+        assert policy.admit("cold") is True
+    
+    @pytest.mark.asyncio
+    async def test_lfu_cache_keeps_hot_entries(self, cache_factory):
+        """Entradas frequentes sobrevivem ao enchimento do cache."""
+        cache_service = cache_factory(EvictionPolicy.LFU)
+        await cache_service.set("Status transformador", {"answer": "OK"})
+        for _ in range(3):
+            await cache_service.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        for query in ["Custo gerador", "Falha disjuntor", "Histórico manutenção"]:
+            await cache_service.set(query, {"answer": query})
+        
+        assert len(cache_service.cache) == 3
+        assert cache_service.evictions == 1
+        assert await cache_service.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+    
+    @pytest.mark.asyncio
+    async def test_overwrite_does_not_evict(self, cache_factory):
+        """Sobrescrever chave existente não remove outras entradas."""
+        cache_service = cache_factory(EvictionPolicy.LRU, max_size=2)
+        await cache_service.set("Custo gerador", {"answer": "1"})
+        await cache_service.set("Falha disjuntor", {"answer": "2"})
+        await cache_service.set("Custo gerador", {"answer": "3"})
+        
+        assert len(cache_service.cache) == 2
+        assert cache_service.evictions == 0
+    
+    @pytest.mark.asyncio
+    async def test_tiny_lfu_cache_rejects_scan(self, cache_factory):
+        """Consultas únicas não expulsam entradas populares."""
+        cache_service = cache_factory(EvictionPolicy.TINY_LFU, max_size=1)
+        await cache_service.set("Status transformador", {"answer": "OK"})
+        for _ in range(3):
+            await cache_service.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        await cache_service.set("Custo gerador", {"answer": "novo"})
+        
+        assert cache_service.rejected_admissions == 1
+        assert len(cache_service.cache) == 1
+        metrics = await cache_service.get_metrics()
+        assert metrics.eviction_policy == "tiny_lfu"
+    
+    @pytest.mark.asyncio
+    async def test_set_eviction_policy_keeps_entries(self, cache_factory):
+        """Troca de política reconstrói a estrutura com as entradas atuais."""
+        cache_service = cache_factory(EvictionPolicy.LRU)
+        await cache_service.set("Custo gerador", {"answer": "1"})
+        await cache_service.set("Falha disjuntor", {"answer": "2"})
+        await cache_service.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        cache_service.set_eviction_policy(EvictionPolicy.LFU)
+        
+        assert len(cache_service._eviction) == 2
+        assert cache_service._eviction.victim() == cache_service._generate_cache_key("Falha disjuntor")
+
+
+class TestSimilarQueryIndex:
+    """Testes do índice invertido para busca de consultas similares."""
+    
+    @pytest.fixture
+    def cache_service(self):
+        """CacheService sem task de limpeza."""
+        with patch('src.api.services.cache_service.get_settings') as mock_settings:
+            mock_settings.return_value = Mock(
+                gemini_model="gemini-2.5-flash",
+                gemini_temperature=0.2
+            )
+            service = CacheService()
+            service._start_cleanup_task = Mock()
+            yield service
+    
+    @pytest.mark.asyncio
+    async def test_similar_lookup_only_compares_overlapping_queries(self, cache_service):
+        """Somente consultas com palavras em comum são comparadas."""
+        await cache_service.set("Status do transformador principal", {"answer": "OK"})
+        for i in range(20):
+            await cache_service.set(f"Custo gerador lote {chr(97 + i)}", {"answer": str(i)})
+        
+        with patch.object(
+            cache_service.normalizer, "normalized_similarity",
+            wraps=cache_service.normalizer.normalized_similarity
+        ) as similarity:
+            entry = await cache_service._find_similar_entry("Situação do trafo principal")
+        
+        assert entry.original_query == "Status do transformador principal"
+        assert similarity.call_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_token_index_follows_removals(self, cache_service):
+        """Remoção da última entrada de uma consulta limpa o índice invertido."""
+        key = await cache_service.set("Status transformador", {"answer": "OK"})
+        assert "transformador" in cache_service.token_index
+        
+        await cache_service._remove_entry(key)
+        
+        assert not cache_service.token_index
+        assert await cache_service._find_similar_entry("Status transformador") is None
+    
+    def test_normalized_similarity_matches_calculate_similarity(self, cache_service):
+        """Similaridade sobre consultas normalizadas equivale à original."""
+        normalizer = cache_service.normalizer
+        query1, query2 = "Status dos trafos principais", "Situação transformadores"
+        
+        assert normalizer.normalized_similarity(
+            normalizer.normalize(query1), normalizer.normalize(query2)
+        ) == pytest.approx(normalizer.calculate_similarity(query1, query2))
+
+
+class TestCacheMemoryBudget:
+    """Testes da contabilização em bytes e compressão de respostas."""
+    
+    @pytest.fixture
+    def cache_service(self):
+        """CacheService sem task de limpeza."""
+        with patch('src.api.services.cache_service.get_settings') as mock_settings:
+            mock_settings.return_value = Mock(
+                gemini_model="gemini-2.5-flash",
+                gemini_temperature=0.2
+            )
+            service = CacheService()
+            service._start_cleanup_task = Mock()
+            yield service
+    
+    @pytest.mark.asyncio
+    async def test_large_response_is_compressed_transparently(self, cache_service):
+        """Respostas acima do threshold são comprimidas e devolvidas intactas."""
+        response = {"answer": "Transformador operando normalmente. " * 200, "confidence_score": 0.9}
+        cache_service.compression_threshold = 1024
+        
+        await cache_service.set("Status transformador", response)
+        entry = next(iter(cache_service.cache.values()))
+        cached = await cache_service.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        assert entry.is_compressed
+        assert entry.size_bytes < len(response["answer"])
+        assert cached["answer"] == response["answer"]
+        assert cached["cache_used"] is True
+    
+    @pytest.mark.asyncio
+    async def test_memory_accounting_follows_removals(self, cache_service):
+        """Bytes contabilizados acompanham inserções, sobrescritas e remoções."""
+        key = await cache_service.set("Custo gerador", {"answer": "R$ 1000"})
+        size = cache_service.cache[key].size_bytes
+        assert cache_service.memory_usage_bytes == size > 0
+        
+        await cache_service.set("Custo gerador", {"answer": "R$ 2000"})
+        assert cache_service.memory_usage_bytes == cache_service.cache[key].size_bytes
+        
+        await cache_service.invalidate(pattern="gerador")
+        assert cache_service.memory_usage_bytes == 0
+    
+    @pytest.mark.asyncio
+    async def test_memory_budget_drives_eviction(self, cache_service):
+        """Entradas são removidas quando o orçamento de bytes é excedido."""
+        cache_service.compression_threshold = 0
+        key = await cache_service.set("Falha disjuntor", {"answer": "x" * 500})
+        cache_service.max_memory_bytes = cache_service.cache[key].size_bytes + 100
+        
+        await cache_service.set("Custo gerador", {"answer": "y" * 500})
+        
+        assert len(cache_service.cache) == 1
+        assert cache_service.evictions == 1
+        assert cache_service.memory_usage_bytes <= cache_service.max_memory_bytes
+    
+    @pytest.mark.asyncio
+    async def test_response_larger_than_budget_is_not_cached(self, cache_service):
+        """Resposta maior que o orçamento inteiro não é armazenada."""
+        cache_service.compression_threshold = 0
+        cache_service.max_memory_bytes = 100
+        
+        await cache_service.set("Histórico manutenção", {"answer": "z" * 500})
+        
+        assert len(cache_service.cache) == 0
+        assert cache_service.memory_usage_bytes == 0
+
+
+class TestDiskCacheTier:
+    """Testes da camada persistente do cache."""
+    
+    @pytest.fixture
+    def cache_factory(self, tmp_path):
+        """Cria instâncias do CacheService que compartilham o mesmo arquivo em disco."""
+        services = []
+        with patch('src.api.services.cache_service.get_settings') as mock_settings:
+            mock_settings.return_value = Mock(
+                gemini_model="gemini-2.5-flash",
+                gemini_temperature=0.2
+            )
+            
+            def factory(backend: CacheBackend = CacheBackend.LOCAL) -> CacheService:
+                service = CacheService()
+                service._start_cleanup_task = Mock()
+                service.enable_disk_tier(tmp_path / "cache.db", backend)
+                services.append(service)
+                return service
+            
+            yield factory
+        
+        for service in services:
+            if service.disk_tier is not None:
+                service.disk_tier.close()
+    
+    @pytest.mark.asyncio
+    async def test_entries_survive_restart(self, cache_factory):
+        """Entrada gravada por uma instância é promovida em outra."""
+        first = cache_factory()
+        await first.set("Status transformador", {"answer": "OK"}, tags={"equipment"})
+        await first.close()
+        
+        second = cache_factory()
+        cached = await second.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        assert cached["answer"] == "OK"
+        assert second.disk_hits == 1
+        assert len(second.cache) == 1
+        assert next(iter(second.cache.values())).tags == {"equipment"}
+    
+    @pytest.mark.asyncio
+    async def test_set_does_not_wait_for_disk(self, cache_factory):
+        """Gravação é adiada (write-behind) e visível antes do flush."""
+        service = cache_factory()
+        service.disk_flush_delay = 60
+        
+        with patch.object(DiskCacheTier, "write_batch") as write_batch:
+            key = await service.set("Custo gerador", {"answer": "R$ 1000"})
+            write_batch.assert_not_called()
+        
+        assert key in service._pending_writes
+        service.cache.clear()
+        assert (await service._load_from_disk(key)).original_query == "Custo gerador"
+        await service.close()
+    
+    @pytest.mark.asyncio
+    async def test_ttl_honored_across_restarts(self, cache_factory):
+        """Entradas expiradas em disco não são promovidas."""
+        first = cache_factory()
+        await first.set("Falha disjuntor", {"answer": "Trocar"}, ttl=1)
+        key = next(iter(first.cache))
+        row = list(first._pending_writes[key])
+        row[5] -= 10  # created_at
+        row[6] -= 10  # expires_at
+        first._pending_writes[key] = tuple(row)
+        await first.close()
+        
+        second = cache_factory()
+        
+        assert await second.get("Falha disjuntor", strategy=CacheStrategy.EXACT_MATCH) is None
+    
+    @pytest.mark.asyncio
+    async def test_disk_payload_is_compressed_json(self, cache_factory, tmp_path):
+        """Respostas vão ao disco como JSON + zlib; arquivos no formato antigo são descartados."""
+        import json
+        import sqlite3
+        import zlib
+        
+        legacy = sqlite3.connect(str(tmp_path / "cache.db"))
+        legacy.execute("CREATE TABLE cache_entries (key TEXT PRIMARY KEY, payload BLOB)")
+        legacy.execute("INSERT INTO cache_entries VALUES ('antiga', x'80049500')")
+        legacy.commit()
+        legacy.close()
+        
+        service = cache_factory()
+        await service.set("Status transformador", {"answer": "OK", "sources": ["gemini_llm"]})
+        await service.flush()
+        
+        rows = service.disk_tier._connect().execute("SELECT key, payload FROM cache_entries").fetchall()
+        assert len(rows) == 1
+        assert json.loads(zlib.decompress(rows[0][1])) == {"answer": "OK", "sources": ["gemini_llm"]}
+        
+        service.cache.clear()
+        cached = await service.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        assert cached["sources"] == ["gemini_llm"]
+    
+    @pytest.mark.asyncio
+    async def test_invalidate_and_clear_reach_disk(self, cache_factory):
+        """Invalidação e limpeza também removem entradas persistidas."""
+        service = cache_factory()
+        await service.set("Status transformador", {"answer": "OK"}, tags={"equipment"})
+        await service.set("Custo gerador", {"answer": "R$ 1000"}, tags={"cost"})
+        await service.flush()
+        service.cache.clear()
+        
+        removed = await service.invalidate(tags={"equipment"})
+        
+        assert removed == 1
+        assert await service._load_from_disk(service._generate_cache_key("Status transformador")) is None
+        
+        await service.clear()
+        assert await service._load_from_disk(service._generate_cache_key("Custo gerador")) is None
+    
+    @pytest.mark.asyncio
+    async def test_disk_invalidation_uses_tag_and_trigram_indexes(self, cache_factory):
+        """Tags e padrões são resolvidos pelos índices persistidos, sem varrer cache_entries."""
+        service = cache_factory()
+        await service.set("Status do transformador TR-001", {"answer": "OK"}, tags={"equipment:TR-001"})
+        await service.set("Histórico de falhas do disjuntor DJ-002", {"answer": "OK"}, tags={"equipment:DJ-002"})
+        await service.set("Custo do gerador GR-01", {"answer": "R$ 1000"}, tags={"cost"})
+        await service.flush()
+        service.cache.clear()
+        connection = service.disk_tier._connect()
+        
+        plan = " ".join(row[-1] for row in connection.execute(
+            "EXPLAIN QUERY PLAN SELECT DISTINCT key FROM cache_entry_tags WHERE tag IN (?)", ("cost",)
+        ))
+        assert "SCAN" not in plan
+        
+        assert await service.invalidate(tags={"equipment:TR-001"}) == 1
+        assert await service.invalidate(pattern=r"gerador\s+GR-0\d") == 1
+        
+        remaining = connection.execute("SELECT original_query FROM cache_entries").fetchall()
+        assert remaining == [("Histórico de falhas do disjuntor DJ-002",)]
+        assert connection.execute("SELECT DISTINCT key FROM cache_entry_tags").fetchall() == \
+            connection.execute("SELECT key FROM cache_entries").fetchall()
+        assert connection.execute(
+            "SELECT COUNT(*) FROM cache_entry_trigrams WHERE trigram = 'ger'"
+        ).fetchone()[0] == 0
+    
+    @pytest.mark.asyncio
+    async def test_shared_backend_serves_hits_across_workers(self, cache_factory):
+        """Resposta gerada em um worker é servida pelo outro sem reinício."""
+        worker_a = cache_factory(CacheBackend.SHARED)
+        worker_b = cache_factory(CacheBackend.SHARED)
+        await worker_b.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        await worker_a.set("Status transformador", {"answer": "OK"})
+        await worker_a._flush_task  # Gravação imediata no modo compartilhado
+        
+        cached = await worker_b.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        assert cached["answer"] == "OK"
+        assert worker_b.disk_hits == 1
+        assert (await worker_b.get_metrics()).backend == "shared"
+    
+    @pytest.mark.asyncio
+    async def test_shared_backend_propagates_invalidations(self, cache_factory):
+        """Sobrescrita, invalidação e limpeza em um worker descartam cópias dos outros."""
+        worker_a = cache_factory(CacheBackend.SHARED)
+        worker_b = cache_factory(CacheBackend.SHARED)
+        worker_b.shared_sync_interval = 0  # Ler o log a cada consulta
+        await worker_b.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        await worker_a.set("Status transformador", {"answer": "OK"}, tags={"equipment"})
+        await worker_a.set("Custo gerador", {"answer": "R$ 1000"}, tags={"cost"})
+        await worker_a.flush()
+        await worker_b.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        await worker_b.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH)
+        assert len(worker_b.cache) == 2
+        
+        await worker_a.set("Status transformador", {"answer": "Em manutenção"}, tags={"equipment"})
+        await worker_a.flush()
+        cached = await worker_b.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH)
+        assert cached["answer"] == "Em manutenção"
+        
+        await worker_a.invalidate(tags={"cost"})
+        assert await worker_b.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH) is None
+        
+        await worker_a.clear()
+        assert await worker_b.get("Status transformador", strategy=CacheStrategy.EXACT_MATCH) is None
+        assert worker_b.shared_invalidations == 3
+        assert worker_a.shared_invalidations == 0
+
+    
+    @pytest.mark.asyncio
+    async def test_shared_sync_is_throttled_on_the_hot_path(self, cache_factory):
+        """Consultas seguidas não leem o log de invalidações a cada get."""
+        import time
+        
+        worker_a = cache_factory(CacheBackend.SHARED)
+        worker_b = cache_factory(CacheBackend.SHARED)
+        await worker_b.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH)
+        worker_b.shared_sync_interval = 60
+        
+        with patch.object(worker_b.disk_tier, "invalidations_since",
+                          wraps=worker_b.disk_tier.invalidations_since) as invalidations_since:
+            started = time.perf_counter()
+            for _ in range(500):
+                await worker_b._sync_shared_invalidations()
+            added_latency = (time.perf_counter() - started) / 500
+        
+        invalidations_since.assert_not_called()
+        assert added_latency < 0.0005  # Sem ida à thread nem leitura do SQLite
+        
+        # Vencido o intervalo, sem gravação de outro worker o log não é consultado
+        worker_b.shared_sync_interval = 0
+        cursor = worker_b._invalidation_cursor
+        await worker_b._sync_shared_invalidations()
+        await worker_b._sync_shared_invalidations()
+        assert worker_b._invalidation_cursor == cursor
+        
+        await worker_a.set("Status transformador", {"answer": "OK"})
+        await worker_a.flush()
+        await worker_b._sync_shared_invalidations()
+        assert worker_b._invalidation_cursor > cursor
+    
+    @pytest.mark.asyncio
+    async def test_shared_sync_clears_memory_only_when_log_was_truncated(self, cache_factory):
+        """Lacunas de ids (transações desfeitas) não limpam a memória; truncamento do log sim."""
+        worker_a = cache_factory(CacheBackend.SHARED)
+        worker_b = cache_factory(CacheBackend.SHARED)
+        worker_b.shared_sync_interval = 0
+        await worker_b.get("Custo gerador", strategy=CacheStrategy.EXACT_MATCH)
+        
+        await worker_b.set("Status transformador", {"answer": "OK"})
+        await worker_b.set("Histórico do disjuntor", {"answer": "Sem falhas"})
+        await worker_b.flush()
+        
+        # Id consumido sem registro (como em uma escrita desfeita) antes da invalidação
+        connection = worker_a.disk_tier._connect()
+        with connection:
+            connection.execute("UPDATE sqlite_sequence SET seq = seq + 5 WHERE name = 'cache_invalidations'")
+        await worker_a.invalidate(pattern="transformador")
+        
+        await worker_b.get("Histórico do disjuntor", strategy=CacheStrategy.EXACT_MATCH)
+        assert [entry.original_query for entry in worker_b.cache.values()] == ["Histórico do disjuntor"]
+        
+        # Registros ainda não lidos descartados pela retenção: nada é confiável
+        await worker_a.set("Custo gerador", {"answer": "R$ 1000"})
+        await worker_a.flush()
+        with connection:
+            connection.execute("DELETE FROM cache_invalidations")
+        
+        await worker_b._sync_shared_invalidations()
+        assert not worker_b.cache
+
+class TestInvalidationIndexes:
+    """Testes dos índices de tags e trigramas usados na invalidação."""
+    
+    @pytest.fixture
+    def cache_service(self):
+        """CacheService sem task de limpeza."""
+        with patch('src.api.services.cache_service.get_settings') as mock_settings:
+            mock_settings.return_value = Mock(
+                gemini_model="gemini-2.5-flash",
+                gemini_temperature=0.2
+            )
+            service = CacheService()
+            service._start_cleanup_task = Mock()
+            yield service
+    
+    @pytest.mark.asyncio
+    async def test_invalidate_by_tag_uses_index(self, cache_service):
+        """Invalidação por tag não percorre o cache inteiro."""
+        await cache_service.set("Histórico de manutenção", {"answer": "1"}, tags={"maintenance"})
+        for equipment in ["gerador", "disjuntor", "transformador", "motor"]:
+            await cache_service.set(f"Custo {equipment}", {"answer": equipment}, tags={"cost"})
+        
+        with patch.object(cache_service, "_pattern_candidates") as pattern_candidates:
+            removed = await cache_service.invalidate(tags={"maintenance"})
+        
+        pattern_candidates.assert_not_called()
+        assert removed == 1
+        assert "maintenance" not in cache_service.tag_index
+        assert len(cache_service.tag_index["cost"]) == 4
+    
+    @pytest.mark.asyncio
+    async def test_invalidate_by_pattern_checks_only_candidates(self, cache_service):
+        """Somente entradas com os trigramas do padrão são testadas com a regex."""
+        await cache_service.set("Status transformador TR1", {"answer": "OK"})
+        await cache_service.set("Status transformador TR2", {"answer": "OK"})
+        await cache_service.set("Custo manutenção", {"answer": "R$ 1000"})
+        
+        candidates = cache_service._pattern_candidates(r"TRANSFORMADOR TR\d")
+        removed = await cache_service.invalidate(pattern=r"TRANSFORMADOR TR\d")
+        
+        assert len(candidates) == 2
+        assert removed == 2
+        assert len(cache_service.cache) == 1
+        assert all(cache_service._generate_cache_key("Custo manutenção") in keys
+                   for keys in cache_service.trigram_index.values())
+    
+    @pytest.mark.parametrize("pattern, expected", [
+        ("transformador", ["transformador"]),
+        (r"falha.*disjuntor", ["falha", "disjuntor"]),
+        (r"(preventiva)?manutenção", ["manutenção"]),
+        (r"trafos?", ["trafo"]),
+        ("transformador|gerador", []),
+    ])
+    def test_required_literals(self, pattern, expected):
+        """Extração conservadora de trechos literais obrigatórios."""
+        assert CacheService._required_literals(pattern) == expected
+    
+    @pytest.mark.asyncio
+    async def test_pattern_without_literals_falls_back_to_scan(self, cache_service):
+        """Padrões sem trechos literais continuam funcionando."""
+        await cache_service.set("Status transformador", {"answer": "OK"})
+        await cache_service.set("Custo gerador", {"answer": "R$ 1000"})
+        
+        assert cache_service._pattern_candidates(r"gerador|transformador") is None
+        assert await cache_service.invalidate(pattern=r"gerador|transformador") == 2
+        assert not cache_service.trigram_index
+
+
 @pytest.mark.integration
 class TestCacheServiceIntegration:
     """Testes de integração para CacheService."""
@@ -654,4 +1236,3 @@ class TestCacheServiceIntegration:
         assert metrics.memory_usage_mb > 0
         assert metrics.average_response_size > 0
         assert metrics.cache_size == 2
-``` 
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+Testes unitários do pipeline de dados do endpoint de chat.
+
+Cobre a execução concorrente das etapas RAG e SQL, os timeouts por etapa
+e o cancelamento da requisição.
+"""
+
+import asyncio
+import time
+import pytest
+from unittest.mock import Mock, patch, AsyncMock
+
+from src.api.endpoints.chat import _retrieve_query_data
+from src.utils.error_handlers import LLMServiceError
+
+
+def _settings(analysis=1.0, rag=1.0, sql=1.0):
+    """Configurações com os timeouts das etapas do chat."""
+    return Mock(chat_analysis_timeout=analysis, chat_rag_timeout=rag, chat_sql_timeout=sql)
+
+
+def _query_processor():
+    """Query Processor que devolve uma análise com SQL gerado."""
+    analysis = Mock(
+        intent=Mock(value="equipment_status"),
+        entities=[],
+        confidence_score=0.9,
+        sql_query="SELECT code FROM equipments",
+        parameters={}
+    )
+    return Mock(process_query=AsyncMock(return_value=analysis))
+
+
+def _database(delay: float, started: asyncio.Event = None, cancelled: asyncio.Event = None):
+    """Sessão cujo execute demora `delay` segundos."""
+    async def execute(statement, parameters):
+        if started:
+            started.set()
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            if cancelled:
+                cancelled.set()
+            raise
+        result = Mock()
+        result.fetchall.return_value = [("TR-001",)]
+        result.keys.return_value = ["code"]
+        return result
+    
+    return Mock(execute=execute, rollback=AsyncMock())
+
+
+class TestChatPipeline:
+    """Testes de _retrieve_query_data."""
+    
+    @pytest.mark.asyncio
+    async def test_rag_and_sql_run_concurrently(self):
+        """A latência é a do ramo mais lento, não a soma dos dois."""
+        async def slow_rag(message, query_analysis, rag_service):
+            await asyncio.sleep(0.2)
+            return [{"content": "TR-001 operando"}]
+        
+        with patch("src.api.endpoints.chat._retrieve_rag_context", side_effect=slow_rag):
+            started = time.perf_counter()
+            _, query_results, structured_data = await _retrieve_query_data(
+                "status do TR-001", _database(0.2), _query_processor(), Mock(), _settings()
+            )
+            elapsed = time.perf_counter() - started
+        
+        assert query_results == [{"content": "TR-001 operando"}]
+        assert structured_data == [{"code": "TR-001"}]
+        assert elapsed < 0.35
+    
+    @pytest.mark.asyncio
+    async def test_sql_timeout_keeps_rag_results_and_rolls_back(self):
+        """SQL que estoura o tempo vira None, o RAG é mantido e a sessão é desfeita."""
+        db = _database(5.0)
+        
+        with patch("src.api.endpoints.chat._retrieve_rag_context",
+                   AsyncMock(return_value=[{"content": "TR-001 operando"}])):
+            _, query_results, structured_data = await _retrieve_query_data(
+                "status do TR-001", db, _query_processor(), Mock(), _settings(sql=0.05)
+            )
+        
+        assert structured_data is None
+        assert query_results == [{"content": "TR-001 operando"}]
+        db.rollback.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_cancelling_request_cancels_both_branches(self):
+        """Cancelar a requisição interrompe os ramos RAG e SQL."""
+        sql_started, sql_cancelled = asyncio.Event(), asyncio.Event()
+        rag_started, rag_cancelled = asyncio.Event(), asyncio.Event()
+        
+        async def slow_rag(message, query_analysis, rag_service):
+            rag_started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                rag_cancelled.set()
+                raise
+        
+        with patch("src.api.endpoints.chat._retrieve_rag_context", side_effect=slow_rag):
+            request = asyncio.create_task(_retrieve_query_data(
+                "status do TR-001", _database(5.0, sql_started, sql_cancelled),
+                _query_processor(), Mock(), _settings(rag=10, sql=10)
+            ))
+            await asyncio.wait_for(asyncio.gather(rag_started.wait(), sql_started.wait()), timeout=1)
+            request.cancel()
+            
+            with pytest.raises(asyncio.CancelledError):
+                await request
+        
+        assert rag_cancelled.is_set()
+        assert sql_cancelled.is_set()
+    
+    @pytest.mark.asyncio
+    async def test_analysis_timeout_raises_descriptive_error(self):
+        """Timeout da análise vira LLMServiceError com mensagem, não TimeoutError vazio."""
+        async def slow_analysis(message):
+            await asyncio.sleep(5)
+        
+        query_processor = Mock(process_query=slow_analysis)
+        
+        with pytest.raises(LLMServiceError, match="Análise da consulta excedeu o tempo limite"):
+            await _retrieve_query_data(
+                "status do TR-001", _database(0), query_processor, Mock(), _settings(analysis=0.05)
+            )
@@ -92,6 +92,110 @@ class TestLLMService:
         assert isinstance(tags, set)
         assert len(tags) > 0
     
+    def test_generate_cache_tags_data_dependencies(self, llm_service):
+        """Testa tags de dependência de dados usadas na invalidação por ingestão."""
+        context = {"query_analysis": {"intent": "maintenance_history",
+                                      "entities": [{"type": "equipment_id", "value": "tr-001"}]}}
+        
+        tags = llm_service._generate_cache_tags("manutenção do TR-001", context, [])
+        assert {"data:maintenance", "equipment:TR-001"} <= tags
+        assert "data:maintenance:all" not in tags
+        
+        # Consulta agregada que cita um equipamento depende de todos os registros
+        context = {"query_analysis": {"intent": "failure_analysis",
+                                      "entities": [{"type": "equipment_id", "value": "TR-001"}]}}
+        tags = llm_service._generate_cache_tags(
+            "falhas do TR-001 comparadas aos outros transformadores", context,
+            [{"content": "...", "metadata": {"equipment_id": "TR-002"}}]
+        )
+        assert {"data:failure:all", "equipment:TR-001"} <= tags
+        assert "equipment:TR-002" not in tags
+        
+        tags = llm_service._generate_cache_tags("quantas falhas ocorreram", {}, [{"total": 3}])
+        assert {"data:failure", "data:failure:all"} <= tags
+        assert not any(tag.startswith("equipment:") for tag in tags)
+    
+    @pytest.mark.asyncio
+    async def test_ingestion_event_invalidates_affected_responses(self, llm_service):
+        """Testa invalidação seletiva do cache a partir do barramento de ingestão."""
+        from src.api.services.cache_service import CacheService
+        from src.etl.ingestion_events import IngestionEvent, IngestionEventBus
+        
+        llm_service.cache_service = CacheService()
+        
+        async def cache(query, context, results):
+            tags = llm_service._generate_cache_tags(query, context, results)
+            await llm_service.cache_service.set(query, {"response": query}, tags=tags)
+        
+        tr1 = {"query_analysis": {"intent": "maintenance_history",
+                                  "entities": [{"type": "equipment_id", "value": "TR-001"}]}}
+        tr2 = {"query_analysis": {"intent": "maintenance_history",
+                                  "entities": [{"type": "equipment_id", "value": "TR-002"}]}}
+        await cache("manutenção do TR-001", tr1, [{"equipment_id": "TR-001"}])
+        await cache("manutenção do TR-002", tr2, [{"equipment_id": "TR-002"}])
+        await cache("custo médio de manutenção", {}, [{"total": 10}])
+        await cache("falhas do TR-001", tr1, [{"equipment_id": "TR-001"}])
+        await cache("manutenções do TR-002 comparadas às demais",
+                    {"query_analysis": {"intent": "general_query",
+                                        "entities": [{"type": "equipment_id", "value": "TR-002"}]}},
+                    [{"equipment_id": "TR-002"}])
+        
+        bus = IngestionEventBus()
+        bus.subscribe(lambda event: None)
+        received = asyncio.Event()
+        
+        async def handler(event):
+            await llm_service.invalidate_for_ingestion(event.data_type, event.equipment_ids)
+            received.set()
+        
+        bus.subscribe(handler, loop=asyncio.get_running_loop())
+        result = {"success": True, "saved_records": 2, "data_type": "maintenance",
+                  "equipment_ids": ["TR-001"]}
+        await asyncio.to_thread(bus.publish, IngestionEvent.from_result(result, source="test"))
+        await asyncio.wait_for(received.wait(), timeout=1)
+        
+        remaining = {entry.original_query for entry in llm_service.cache_service.cache.values()}
+        assert remaining == {"manutenção do TR-002"}
+        assert bus.published_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_ingestion_event_invalidates_disk_tier_before_llm_service_exists(self, llm_service, tmp_path):
+        """Sem LLMService no worker, a ingestão ainda remove as respostas persistidas em disco."""
+        from src.api import dependencies
+        from src.api.main import _on_ingestion_event
+        from src.api.services.cache_service import CacheService, DiskCacheTier
+        from src.etl.ingestion_events import IngestionEvent
+        
+        cache_service = CacheService()
+        cache_service.enable_disk_tier(tmp_path / "responses.db")
+        context = {"query_analysis": {"intent": "maintenance_history",
+                                      "entities": [{"type": "equipment_id", "value": "TR-001"}]}}
+        for query in ("manutenção do TR-001", "custo médio de manutenção"):
+            tags = llm_service._generate_cache_tags(query, context if "TR" in query else {}, [{"id": 1}])
+            await cache_service.set(query, {"response": query}, tags=tags)
+        await cache_service.close()
+        
+        settings = Mock(cache_disk_path=str(tmp_path / "responses.db"), cache_backend="local")
+        rag_service = Mock(refresh_changes=AsyncMock(return_value=0))
+        dependencies.get_llm_service.cache_clear()
+        with patch.object(dependencies, "get_settings", return_value=settings), \
+             patch.object(dependencies, "get_rag_service", return_value=rag_service):
+            await _on_ingestion_event(IngestionEvent("maintenance", frozenset({"TR-002"}), 1))
+        
+        assert dependencies.get_llm_service.cache_info().currsize == 0
+        tier = DiskCacheTier(tmp_path / "responses.db")
+        remaining = [row[0] for row in tier._connect().execute("SELECT original_query FROM cache_entries")]
+        tier.close()
+        assert remaining == ["manutenção do TR-001"]
+        rag_service.refresh_changes.assert_awaited_once()
+    
+    def test_ingestion_event_ignores_unsaved_results(self):
+        """Testa que resultados sem registros gravados não geram evento."""
+        from src.etl.ingestion_events import IngestionEvent
+        
+        assert IngestionEvent.from_result({"success": False, "saved_records": 3, "data_type": "failure"}) is None
+        assert IngestionEvent.from_result({"success": True, "saved_records": 0, "data_type": "failure"}) is None
+    
     def test_calculate_cache_ttl(self, llm_service):
         """Testa cálculo do TTL do cache."""
         ttl_high = llm_service._calculate_cache_ttl(0.9, 10)
@@ -303,6 +407,323 @@ class TestLLMService:
                 assert not result["cache_used"]
                 mock_cache.get.assert_called_once()
     
+    @pytest.mark.asyncio
+    async def test_call_gemini_uses_native_async_client(self, llm_service):
+        """Testa que o cliente assíncrono nativo é usado sem ocupar threads."""
+        llm_service._model.generate_content_async = AsyncMock(return_value=Mock(text=" Resposta nativa "))
+        
+        with patch('asyncio.to_thread') as to_thread:
+            result = await llm_service._call_gemini_with_retry("test prompt")
+            to_thread.assert_not_called()
+        
+        assert result == "Resposta nativa"
+        assert llm_service._model.generate_content_async.call_args.kwargs["request_options"] == {"timeout": 30}
+        
+        llm_service.use_async_client = False
+        assert not llm_service.native_async_enabled
+    
+    @pytest.mark.asyncio
+    async def test_native_async_timeout_cancels_call(self, llm_service):
+        """Testa que o timeout cancela a chamada em andamento em vez de abandoná-la."""
+        llm_service.settings.gemini_timeout = 0.05
+        cancelled = asyncio.Event()
+        
+        async def hanging_call(*args, **kwargs):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        
+        llm_service._model.generate_content_async = AsyncMock(side_effect=hanging_call)
+        
+        with pytest.raises(LLMError):
+            await llm_service._call_gemini_with_retry("test prompt", max_retries=1)
+        
+        assert cancelled.is_set()
+    
+    @pytest.mark.asyncio
+    async def test_generate_response_stream_yields_tokens_and_caches(self, llm_service):
+        """Testa streaming de trechos e armazenamento da resposta completa no cache."""
+        from src.api.services.cache_service import CacheService
+        
+        llm_service.cache_service = CacheService()
+        llm_service.fallback_service = None
+        llm_service.settings.gemini_timeout = 5
+        parts = ["O transformador TR-001 ", "está operando ", "normalmente conforme os dados."]
+        llm_service._model.generate_content = Mock(return_value=[Mock(text=part) for part in parts])
+        
+        events = [event async for event in llm_service.generate_response_stream(
+            "status do TR-001", query_results=[{"equipment_id": "TR-001"}]
+        )]
+        
+        assert [event["text"] for event in events[:-1]] == parts
+        assert events[-1]["type"] == "done"
+        assert events[-1]["response"]["response"] == "".join(parts)
+        llm_service._model.generate_content.assert_called_once()
+        assert llm_service._model.generate_content.call_args.kwargs == {"stream": True}
+        
+        cached = [event async for event in llm_service.generate_response_stream("status do TR-001")]
+        assert [event["type"] for event in cached] == ["token", "done"]
+        assert cached[-1]["response"]["cache_used"]
+        llm_service._model.generate_content.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_generate_response_stream_falls_back_on_error(self, llm_service):
+        """Testa que falha no streaming termina com resposta de fallback."""
+        llm_service.cache_service = None
+        llm_service.fallback_service = None
+        llm_service.settings.gemini_timeout = 5
+        llm_service.settings.gemini_max_retries = 1
+        llm_service._model.generate_content = Mock(side_effect=RuntimeError("conexão perdida"))
+        
+        events = [event async for event in llm_service.generate_response_stream("custo do gerador")]
+        
+        assert events[-1]["type"] == "done"
+        assert events[-1]["response"]["fallback_used"]
+        assert events[0]["text"] == events[-1]["response"]["response"]
+    
+    @pytest.mark.asyncio
+    async def test_admission_sheds_call_that_would_miss_deadline(self, llm_service):
+        """Chamada sem vaga dentro do orçamento vai ao fallback sem tocar no Gemini."""
+        from src.api.services.admission_control import LLMAdmissionController
+        from src.api.services.fallback_service import FallbackService
+        
+        llm_service.cache_service = None
+        llm_service.fallback_service = FallbackService()
+        llm_service.admission = LLMAdmissionController(initial_concurrency=1, max_queue_size=1)
+        llm_service.admission_budget = 0.05
+        llm_service._model.generate_content = Mock(return_value=Mock(text="Resposta"))
+        
+        held = await llm_service.admission.acquire(10)
+        result = await llm_service.generate_response("custo de manutenção do TR-001")
+        held.release()
+        
+        assert result["fallback_used"]
+        llm_service._model.generate_content.assert_not_called()
+        assert llm_service.admission.rejected["deadline"] == 1
+        assert llm_service.admission.concurrency.in_flight == 0
+    
+    @pytest.mark.asyncio
+    async def test_admission_backs_off_concurrency_on_quota_error(self, llm_service):
+        """429 do Gemini reduz o limite de concorrência pela metade (AIMD)."""
+        from google.api_core import exceptions as google_exceptions
+        from src.api.services.admission_control import LLMAdmissionController
+        
+        llm_service.admission = LLMAdmissionController(initial_concurrency=8)
+        llm_service.settings.gemini_timeout = 5
+        llm_service._model.generate_content = Mock(side_effect=google_exceptions.ResourceExhausted("429"))
+        
+        with pytest.raises(LLMError, match="Quota"):
+            await llm_service._call_gemini_with_retry("test prompt", max_retries=1)
+        
+        assert llm_service.admission.get_metrics()["concurrency_limit"] == 4
+        assert llm_service.admission.overloads == 1
+        
+        llm_service._model.generate_content = Mock(return_value=Mock(text="ok"))
+        await llm_service._call_gemini_with_retry("test prompt", max_retries=1)
+        
+        assert llm_service.admission.concurrency.limit == pytest.approx(4.25)
+        assert llm_service.admission.concurrency.in_flight == 0
+    
+    @pytest.mark.asyncio
+    async def test_open_circuit_goes_straight_to_fallback(self, llm_service):
+        """Com o circuito aberto, a resposta vem do fallback sem chamar o Gemini."""
+        from src.api.services.circuit_breaker import CircuitBreaker, CircuitBreakerOpen
+        from src.api.services.fallback_service import FallbackService
+        
+        llm_service.cache_service = None
+        llm_service.fallback_service = FallbackService()
+        llm_service.circuit_breaker = CircuitBreaker(minimum_calls=2)
+        llm_service.settings.gemini_timeout = 5
+        llm_service._model.generate_content = Mock(side_effect=RuntimeError("503 indisponível"))
+        
+        for _ in range(2):
+            with pytest.raises(LLMError):
+                await llm_service._call_gemini_with_retry("test prompt", max_retries=1)
+        
+        assert llm_service.circuit_breaker.is_open
+        with pytest.raises(CircuitBreakerOpen):
+            await llm_service._call_gemini_with_retry("test prompt")
+        
+        result = await llm_service.generate_response("status do transformador TR-001")
+        
+        assert result["fallback_used"]
+        assert llm_service._model.generate_content.call_count == 2
+        assert (await llm_service.get_metrics())["circuit_breaker"]["short_circuited"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_health_check_respects_circuit_breaker(self, llm_service):
+        """Health check não sonda o Gemini com o circuito aberto nem cria o serviço."""
+        from src.api import dependencies
+        from src.api.endpoints.health import _llm_circuit_status
+        from src.api.services.circuit_breaker import CircuitBreaker
+        
+        llm_service.circuit_breaker = CircuitBreaker(minimum_calls=1)
+        llm_service.circuit_breaker.record_failure(latency=0.1)
+        llm_service._model.generate_content = Mock(return_value=Mock(text="OK"))
+        
+        health = await llm_service.health_check()
+        
+        assert health["llm_service"]["gemini_connection"] == "circuit_open"
+        assert health["llm_service"]["circuit_breaker"]["state"] == "open"
+        llm_service._model.generate_content.assert_not_called()
+        
+        dependencies.get_llm_service.cache_clear()
+        assert _llm_circuit_status() == ("not_initialized", None)
+        assert dependencies.get_llm_service.cache_info().currsize == 0
+    
+    @pytest.mark.asyncio
+    async def test_circuit_half_open_probes_close_or_reopen(self):
+        """Após o tempo aberto, chamadas de teste fecham o circuito ou o reabrem."""
+        from src.api.services.circuit_breaker import CircuitBreaker, CircuitState
+        
+        breaker = CircuitBreaker(slow_call_threshold=1.0, minimum_calls=4,
+                                 open_duration=0.01, half_open_max_calls=2)
+        for _ in range(4):
+            assert breaker.allow_request()
+            breaker.record_success(latency=2.0)  # Lentas abrem o circuito
+        assert breaker.state is CircuitState.OPEN
+        
+        await asyncio.sleep(0.02)
+        assert breaker.get_status()["state"] == "half_open"  # Sem nenhuma chamada
+        assert breaker.allow_request() and breaker.allow_request()
+        assert breaker.state is CircuitState.HALF_OPEN
+        assert not breaker.allow_request()
+        breaker.record_failure(latency=0.1)
+        assert breaker.state is CircuitState.OPEN
+        
+        await asyncio.sleep(0.02)
+        for _ in range(2):
+            assert breaker.allow_request()
+            breaker.record_success(latency=0.1)
+        assert breaker.state is CircuitState.CLOSED
+        assert breaker.get_status()["times_opened"] == 2
+        
+        breaker.window_seconds = 0.05
+        breaker.record_failure(latency=0.1)
+        breaker.record_success(latency=2.0)
+        assert breaker.get_status()["failure_rate"] == 0.5
+        await asyncio.sleep(0.06)
+        breaker.record_success(latency=0.1)
+        status = breaker.get_status()
+        assert (status["calls_in_window"], status["failure_rate"], status["slow_call_rate"]) == (1, 0.0, 0.0)
+    
+    @pytest.mark.asyncio
+    async def test_admission_waits_for_request_quota(self):
+        """Sem quota disponível, a chamada espera a reposição do bucket em ordem FIFO."""
+        from src.api.services.admission_control import AdmissionRejected, LLMAdmissionController, TokenBucket
+        
+        controller = LLMAdmissionController(max_queue_size=1)
+        controller.requests = TokenBucket(600, capacity=1)  # 1 chamada a cada 0,1 s
+        
+        first = await controller.acquire(10)
+        started = asyncio.get_running_loop().time()
+        waiting = asyncio.create_task(controller.acquire(10))
+        await asyncio.sleep(0)
+        
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(10)
+        
+        second = await waiting
+        assert asyncio.get_running_loop().time() - started >= 0.08
+        assert controller.rejected["queue_full"] == 1
+        
+        first.release()
+        second.release()
+        assert controller.get_metrics()["admitted"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests_share_generation(self, llm_service):
+        """Requisições idênticas simultâneas fazem uma única chamada ao Gemini."""
+        async def slow_gemini(prompt, max_retries=3):
+            await asyncio.sleep(0.05)
+            return "Transformador TR-001 operando normalmente."
+        
+        llm_service.cache_service = None
+        llm_service._call_gemini_with_retry = AsyncMock(side_effect=slow_gemini)
+        
+        results = await asyncio.gather(*[
+            llm_service.generate_response("Status do transformador", query_results=[{"id": "T001"}])
+            for _ in range(5)
+        ])
+        
+        llm_service._call_gemini_with_retry.assert_awaited_once()
+        assert len({result["response"] for result in results}) == 1
+        assert sum(1 for result in results if result.get("request_coalesced")) == 4
+        assert llm_service.coalesced_requests == 4
+        assert llm_service.request_count == 1
+        assert not llm_service._inflight
+    
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_generation(self, llm_service):
+        """Cancelar o primeiro chamador não interrompe quem aguarda a mesma geração."""
+        async def slow_gemini(prompt, max_retries=3):
+            await asyncio.sleep(0.05)
+            return "Disjuntor DJ-002 requer manutenção."
+        
+        llm_service.cache_service = None
+        llm_service._call_gemini_with_retry = AsyncMock(side_effect=slow_gemini)
+        
+        first = asyncio.create_task(llm_service.generate_response("Status do disjuntor"))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(llm_service.generate_response("Status do disjuntor"))
+        await asyncio.sleep(0)
+        first.cancel()
+        
+        result = await second
+        
+        assert first.cancelled()
+        assert result["request_coalesced"] is True
+        assert "response" in result
+        llm_service._call_gemini_with_retry.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_stale_cache_hit_revalidates_in_background(self, llm_service):
+        """Entrada obsoleta é servida na hora e regenerada em segundo plano."""
+        llm_service.fallback_service = None
+        llm_service.cache_service = Mock()
+        llm_service.cache_service._generate_cache_key.return_value = "stale_key"
+        llm_service.cache_service.get = AsyncMock(return_value={
+            "response": "Resposta antiga", "cache_used": True, "cache_status": "stale"
+        })
+        llm_service.cache_service.set = AsyncMock()
+        llm_service._call_gemini_with_retry = AsyncMock(return_value="Transformador T001 operando normalmente.")
+        
+        result = await llm_service.generate_response("Status do transformador", query_results=[{"id": "T001"}])
+        
+        assert result["response"] == "Resposta antiga"
+        assert result["cache_revalidating"] is True
+        
+        await asyncio.gather(*llm_service._revalidations.values())
+        
+        llm_service._call_gemini_with_retry.assert_awaited_once()
+        llm_service.cache_service.set.assert_awaited_once()
+        assert llm_service.revalidation_count == 1
+        assert not llm_service._revalidations
+    
+    @pytest.mark.asyncio
+    async def test_revalidation_concurrency_is_bounded(self, llm_service):
+        """Atualizações acima do limite são descartadas e repetidas no próximo acesso."""
+        release = asyncio.Event()
+        
+        async def blocked_gemini(prompt, max_retries=3):
+            await release.wait()
+            return "Resposta nova"
+        
+        llm_service.fallback_service = None
+        llm_service.max_concurrent_revalidations = 1
+        llm_service._call_gemini_with_retry = AsyncMock(side_effect=blocked_gemini)
+        
+        assert llm_service._schedule_revalidation("Status do transformador", None, [], {}, "normalized_match")
+        assert llm_service._schedule_revalidation("Status do transformador", None, [], {}, "normalized_match")
+        assert not llm_service._schedule_revalidation("Custo do gerador", None, [], {}, "normalized_match")
+        assert llm_service.revalidations_skipped == 1
+        
+        release.set()
+        await asyncio.gather(*llm_service._revalidations.values())
+        llm_service._call_gemini_with_retry.assert_awaited_once()
+    
     @pytest.mark.asyncio
     async def test_generate_response_empty_query(self, llm_service):
         """Testa erro com query vazia."""
@@ -6,6 +6,7 @@ Testa indexação, recuperação de contexto, embeddings e ranking.
 
 import pytest
 import asyncio
+import numpy as np
 from unittest.mock import Mock, patch, AsyncMock
 from datetime import datetime
 
@@ -14,11 +15,37 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
 
 from src.api.services.rag_service import (
-    RAGService, DocumentChunk, RAGContext
+    RAGService, DocumentChunk, RAGContext, RetrievalMode, RetrievalFilters
 )
+from src.api.services.query_processor import ExtractedEntity, QueryEntity
 from src.utils.error_handlers import ValidationError, DataProcessingError
 
 
+@pytest.fixture
+def standalone_rag_service():
+    """RAGService isolado do banco de dados."""
+    with patch('src.api.services.rag_service.get_settings') as mock_settings:
+        mock_settings.return_value = Mock()
+        service = RAGService()
+    
+    # Sessão fake para as rotinas de indexação
+    session_cm = AsyncMock()
+    session_cm.__aenter__.return_value = AsyncMock()
+    service._open_session = Mock(return_value=session_cm)
+    return service
+
+
+def _make_chunk(chunk_id: str, content: str, source: str = "equipment", **metadata) -> DocumentChunk:
+    """Cria chunk de teste."""
+    return DocumentChunk(id=chunk_id, content=content, source=source, metadata=metadata)
+
+
+async def _async_batches(*batches):
+    """Gera lotes como os métodos _fetch_*_chunks."""
+    for batch in batches:
+        yield batch
+
+
 class TestRAGService:
     """Testes para o serviço RAG."""
     
@@ -96,25 +123,6 @@ class TestRAGService:
         terms = rag_service._extract_query_terms("o a de")
         assert len(terms) == 0
     
-    def test_calculate_term_similarity(self, rag_service):
-        """Testa cálculo de similaridade por termos."""
-        query_terms = ["transformador", "operacional"]
-        content = "Transformador T001 está operacional e funcionando normalmente"
-        
-        similarity = rag_service._calculate_term_similarity(query_terms, content)
-        
-        assert similarity > 0.5  # Deve ter alta similaridade
-        assert similarity <= 1.0  # Não deve exceder 1
-    
-    def test_calculate_term_similarity_no_match(self, rag_service):
-        """Testa similaridade sem correspondências."""
-        query_terms = ["gerador", "falha"]
-        content = "Transformador operacional sem problemas"
-        
-        similarity = rag_service._calculate_term_similarity(query_terms, content)
-        
-        assert similarity == 0.0  # Sem correspondências
-    
     def test_generate_simple_embedding(self, rag_service):
         """Testa geração de embeddings simples."""
         text = "Transformador em manutenção preventiva"
@@ -470,5 +478,870 @@ class TestRAGService:
         assert scored_chunks[0].relevance_score > 0.5
 
 
+class TestRAGServiceSharedIndex:
+    """Testes do ciclo de vida do índice compartilhado."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """Fixture para RAGService sem acesso ao banco."""
+        return standalone_rag_service
+    
+    @staticmethod
+    def _fake_indexer(service, chunk_ids):
+        """Cria indexador fake que grava os chunks informados."""
+        async def index(session, corpus):
+            for chunk_id in chunk_ids:
+                corpus[chunk_id] = _make_chunk(
+                    chunk_id, f"Equipamento transformador {chunk_id}"
+                )
+        return index
+    
+    @pytest.mark.asyncio
+    async def test_ensure_indexed_runs_once_under_concurrency(self, rag_service):
+        """Requisições concorrentes disparam uma única indexação."""
+        calls = []
+        
+        async def slow_index(session, corpus):
+            calls.append(1)
+            await asyncio.sleep(0.01)
+        
+        rag_service._index_equipment_data = slow_index
+        rag_service._index_maintenance_data = AsyncMock()
+        rag_service._index_historical_data = AsyncMock()
+        
+        await asyncio.gather(*(rag_service.ensure_indexed() for _ in range(5)))
+        
+        assert len(calls) == 1
+        assert rag_service.is_indexed
+        
+        # Chamadas posteriores não reindexam
+        await rag_service.ensure_indexed()
+        assert len(calls) == 1
+    
+    @pytest.mark.asyncio
+    async def test_reindex_drops_removed_records(self, rag_service):
+        """Reindexação remove chunks que não existem mais na origem."""
+        rag_service._index_maintenance_data = AsyncMock()
+        rag_service._index_historical_data = AsyncMock()
+        
+        rag_service._index_equipment_data = self._fake_indexer(
+            rag_service, ["equipment_1", "equipment_2"]
+        )
+        await rag_service.index_data_sources()
+        assert set(rag_service.document_cache) == {"equipment_1", "equipment_2"}
+        
+        rag_service._index_equipment_data = self._fake_indexer(rag_service, ["equipment_2"])
+        await rag_service.index_data_sources()
+        
+        assert set(rag_service.document_cache) == {"equipment_2"}
+        assert rag_service.term_index["transformador"] == ["equipment_2"]
+    
+    @pytest.mark.asyncio
+    async def test_background_refresh_start_stop(self, rag_service):
+        """Task de atualização periódica pode ser iniciada e parada."""
+        rag_service.index_data_sources = AsyncMock()
+        
+        rag_service.start_background_refresh(interval=0.01)
+        await asyncio.sleep(0.05)
+        await rag_service.stop_background_refresh()
+        
+        assert rag_service.index_data_sources.await_count >= 1
+        assert rag_service._refresh_task is None
+    
+    def test_background_refresh_disabled(self, rag_service):
+        """Intervalo zero desativa a atualização periódica."""
+        rag_service.start_background_refresh(interval=0)
+        assert rag_service._refresh_task is None
+
+
+class TestRAGServiceLexicalRetrieval:
+    """Testes da recuperação lexical (índice invertido + BM25)."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService com corpus pequeno indexado."""
+        service = standalone_rag_service
+        chunks = [
+            _make_chunk("equipment_1", "Equipamento: Transformador TR-01 (ID: 1) operacional"),
+            _make_chunk("equipment_2", "Equipamento: Disjuntor DJ-02 (ID: 2) em operação"),
+            _make_chunk("maintenance_1", "Manutenção: preventiva do transformador TR-01", "maintenance"),
+            _make_chunk("failure_1", "Falha: vazamento de óleo nos transformadores", "failure"),
+        ]
+        for chunk in chunks:
+            service.document_cache[chunk.id] = chunk
+        service._build_term_index()
+        return service
+    
+    def test_term_index_has_unique_lowercase_postings(self, rag_service):
+        """Postings são únicas por chunk e em minúsculas."""
+        assert rag_service.term_index["transformador"].count("equipment_1") == 1
+        assert "Equipamento:" not in rag_service.term_index
+        assert "equipamento" in rag_service.term_index
+    
+    def test_bm25_postings_are_csr_aligned(self, rag_service):
+        """Postings CSR seguem a ordem do vocabulário."""
+        term_id = rag_service._sorted_terms.index("transformador")
+        lo, hi = rag_service._posting_offsets[term_id], rag_service._posting_offsets[term_id + 1]
+        rows = rag_service._posting_rows[lo:hi]
+        
+        assert {rag_service._chunk_ids[row] for row in rows} == {"equipment_1", "maintenance_1"}
+        assert rag_service._posting_weights.dtype == np.float32
+        assert len(rag_service._idf) == len(rag_service._sorted_terms)
+    
+    def test_bm25_rare_terms_weigh_more(self, rag_service):
+        """Termos raros têm IDF maior que termos frequentes."""
+        idf = dict(zip(rag_service._sorted_terms, rag_service._idf))
+        assert idf["disjuntor"] > idf["transformador"]
+    
+    def test_bm25_scores_only_matching_rows(self, rag_service):
+        """Apenas chunks com termos da query recebem score."""
+        rows, scores = rag_service._bm25_scores(["disjuntor"])
+        
+        assert [rag_service._chunk_ids[row] for row in rows] == ["equipment_2"]
+        assert 0 < scores[0] <= 1.0
+    
+    def test_bm25_more_matched_terms_rank_higher(self, rag_service):
+        """Chunk que casa mais termos da query fica à frente."""
+        rows, scores = rag_service._bm25_scores(["transformador", "preventiva"])
+        best = rag_service._chunk_ids[rows[np.argmax(scores)]]
+        assert best == "maintenance_1"
+    
+    def test_bm25_unknown_terms(self, rag_service):
+        """Query sem termos conhecidos não gera candidatos."""
+        rows, scores = rag_service._bm25_scores(["inexistente"])
+        assert len(rows) == 0 and len(scores) == 0
+    
+    def test_top_k(self, rag_service):
+        """Top-k retorna índices em ordem decrescente de score."""
+        scores = np.array([0.1, 0.9, 0.5, 0.7], dtype=np.float32)
+        assert list(rag_service._top_k(scores, 2)) == [1, 3]
+        assert list(rag_service._top_k(scores, 10)) == [1, 3, 2, 0]
+    
+    def test_expand_term_by_prefix(self, rag_service):
+        """Termo da query casa com plurais do vocabulário."""
+        assert set(rag_service._expand_term("transformador")) == {
+            "transformador", "transformadores"
+        }
+    
+    @pytest.mark.asyncio
+    async def test_search_filters_by_type(self, rag_service):
+        """Filtro por tipo de fonte é aplicado aos candidatos."""
+        chunks = await rag_service._search_relevant_chunks("transformador", "maintenance", 5)
+        assert [chunk.id for chunk in chunks] == ["maintenance_1"]
+    
+    @pytest.mark.asyncio
+    async def test_search_returns_scored_copies(self, rag_service):
+        """Scores são atribuídos a cópias, não aos chunks indexados."""
+        chunks = await rag_service._search_relevant_chunks("transformador", None, 1)
+        
+        assert len(chunks) == 2
+        assert chunks[0].relevance_score >= chunks[1].relevance_score
+        assert rag_service.document_cache[chunks[0].id].relevance_score == 0.0
+    
+    @pytest.mark.asyncio
+    async def test_search_rebuilds_stale_index(self, rag_service):
+        """Chunks adicionados diretamente ao cache são indexados na busca."""
+        rag_service.document_cache["equipment_3"] = _make_chunk(
+            "equipment_3", "Equipamento: Seccionadora SC-03"
+        )
+        chunks = await rag_service._search_relevant_chunks("seccionadora", None, 5)
+        assert [chunk.id for chunk in chunks] == ["equipment_3"]
+
+
+class TestRAGServiceDenseRetrieval:
+    """Testes da recuperação densa sobre a matriz de embeddings."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService com corpus pequeno indexado."""
+        service = standalone_rag_service
+        chunks = [
+            _make_chunk("equipment_1", "Transformador operacional na subestacao norte"),
+            _make_chunk("maintenance_1", "Manutenção preventiva do gerador", "maintenance"),
+            _make_chunk("failure_1", "Falha com defeito no disjuntor, custo alto", "failure"),
+            _make_chunk("equipment_2", "Registro sem termos do vocabulário"),
+        ]
+        for chunk in chunks:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        return service
+    
+    def test_embedding_matrix_layout(self, rag_service):
+        """Matriz float32 contígua com uma linha por chunk."""
+        matrix = rag_service._embedding_matrix
+        
+        assert matrix.dtype == np.float32
+        assert matrix.flags["C_CONTIGUOUS"]
+        assert matrix.shape == (4, len(RAGService.EMBEDDING_VOCABULARY))
+        assert rag_service._chunk_rows["failure_1"] == rag_service._chunk_ids.index("failure_1")
+    
+    def test_embedding_rows_are_normalized(self, rag_service):
+        """Linhas com termos têm norma unitária; linhas vazias ficam zeradas."""
+        norms = np.linalg.norm(rag_service._embedding_matrix, axis=1)
+        row = rag_service._chunk_rows
+        
+        assert norms[row["equipment_1"]] == pytest.approx(1.0)
+        assert norms[row["equipment_2"]] == 0.0
+    
+    def test_chunks_do_not_store_embedding_lists(self, rag_service):
+        """Embeddings vivem apenas na matriz."""
+        assert all(chunk.embedding is None for chunk in rag_service.document_cache.values())
+    
+    def test_dense_scores(self, rag_service):
+        """Similaridade de cosseno favorece o chunk com os mesmos termos."""
+        rows, scores = rag_service._dense_scores("falha no disjuntor")
+        best = rag_service._chunk_ids[rows[np.argmax(scores)]]
+        
+        assert best == "failure_1"
+        assert rag_service._chunk_rows["equipment_2"] not in rows
+    
+    def test_dense_scores_without_vocabulary_terms(self, rag_service):
+        """Query sem termos do vocabulário não retorna candidatos."""
+        rows, scores = rag_service._dense_scores("xyz")
+        assert len(rows) == 0
+    
+    @pytest.mark.asyncio
+    async def test_retrieve_context_dense_mode(self, rag_service):
+        """retrieve_context aceita o modo denso."""
+        context = await rag_service.retrieve_context(
+            "gerador em manutenção preventiva", mode=RetrievalMode.DENSE
+        )
+        
+        assert context.chunks[0].id == "maintenance_1"
+
+
+class TestRAGServiceSnapshots:
+    """Testes dos snapshots do índice em disco."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service, tmp_path):
+        """RAGService indexado com diretório de snapshots temporário."""
+        service = standalone_rag_service
+        service.snapshot_dir = tmp_path
+        chunks = [
+            _make_chunk("equipment_1", "Transformador TR-01 operacional", status="Ativo"),
+            _make_chunk("maintenance_1", "Manutenção preventiva do transformador", "maintenance"),
+            _make_chunk("failure_1", "Falha no disjuntor, custo alto", "failure", cost=1500.0),
+        ]
+        for chunk in chunks:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        service.last_indexed_at = datetime.now()
+        return service
+    
+    @pytest.fixture
+    def worker(self, tmp_path):
+        """Segundo RAGService (outro worker) apontando para o mesmo diretório."""
+        with patch('src.api.services.rag_service.get_settings') as mock_settings:
+            mock_settings.return_value = Mock()
+            service = RAGService()
+        service.snapshot_dir = tmp_path
+        return service
+    
+    def test_save_and_load_snapshot(self, rag_service, worker):
+        """Índice carregado do disco é equivalente ao original."""
+        snapshot_id = rag_service.save_snapshot()
+        
+        assert worker.load_snapshot()
+        assert worker.snapshot_id == snapshot_id
+        assert worker.document_cache["failure_1"].content == "Falha no disjuntor, custo alto"
+        assert worker.document_cache["failure_1"].metadata == {"cost": 1500.0}
+        assert worker.term_index["transformador"] == rag_service.term_index["transformador"]
+        np.testing.assert_array_equal(worker._posting_weights, rag_service._posting_weights)
+        np.testing.assert_array_equal(worker._embedding_matrix, rag_service._embedding_matrix)
+    
+    def test_loaded_arrays_are_memory_mapped(self, rag_service, worker):
+        """Arrays do snapshot são mapeados do disco em modo somente leitura."""
+        rag_service.save_snapshot()
+        worker.load_snapshot()
+        
+        assert isinstance(worker._posting_weights, np.memmap)
+        assert isinstance(worker._embedding_matrix, np.memmap)
+        assert not worker._embedding_matrix.flags["WRITEABLE"]
+    
+    @pytest.mark.asyncio
+    async def test_search_on_loaded_snapshot(self, rag_service, worker):
+        """Buscas lexical e densa funcionam sobre o índice mapeado."""
+        rag_service.save_snapshot()
+        worker.load_snapshot()
+        
+        lexical = await worker._search_relevant_chunks("disjuntor", None, 5)
+        dense = await worker._search_relevant_chunks("falha no disjuntor", None, 5, RetrievalMode.DENSE)
+        
+        assert [chunk.id for chunk in lexical] == ["failure_1"]
+        assert dense[0].id == "failure_1"
+    
+    def test_incompatible_snapshot_is_ignored(self, rag_service, worker):
+        """Snapshot gerado com outros parâmetros BM25 não é carregado."""
+        rag_service.save_snapshot()
+        worker.bm25_k1 = 2.0
+        
+        assert not worker.load_snapshot()
+        assert worker.document_cache == {}
+    
+    def test_load_without_snapshot(self, worker):
+        """Sem snapshot em disco, nada é carregado."""
+        assert not worker.load_snapshot()
+    
+    def test_old_snapshots_are_pruned(self, rag_service, tmp_path):
+        """Apenas os snapshots mais recentes são mantidos."""
+        ids = [rag_service.save_snapshot() for _ in range(3)]
+        
+        remaining = sorted(p.name for p in tmp_path.iterdir() if p.is_dir())
+        assert remaining == ids[-rag_service.snapshots_to_keep:]
+        assert (tmp_path / "CURRENT").read_text() == ids[-1]
+    
+    @pytest.mark.asyncio
+    async def test_load_or_build_prefers_fresh_snapshot(self, rag_service, worker):
+        """Worker carrega snapshot recente em vez de reindexar o banco."""
+        rag_service.save_snapshot()
+        worker._index_all_sources = AsyncMock()
+        
+        await worker.load_or_build_index(max_age=300)
+        
+        worker._index_all_sources.assert_not_awaited()
+        assert set(worker.document_cache) == set(rag_service.document_cache)
+    
+    @pytest.mark.asyncio
+    async def test_load_or_build_rebuilds_stale_snapshot(self, rag_service, worker):
+        """Snapshot expirado dispara reindexação e um novo snapshot."""
+        old_id = rag_service.save_snapshot()
+        worker._index_equipment_data = AsyncMock()
+        worker._index_maintenance_data = AsyncMock()
+        worker._index_historical_data = AsyncMock()
+        worker._open_session = rag_service._open_session
+        
+        await worker.load_or_build_index(max_age=0)
+        
+        worker._index_equipment_data.assert_awaited_once()
+        assert worker.snapshot_id != old_id
+        assert worker._read_snapshot_manifest()["snapshot_id"] == worker.snapshot_id
+
+
+class TestRAGServiceIncrementalIndex:
+    """Testes da manutenção incremental do índice (upsert/delete e feed de alterações)."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService indexado com corpus pequeno."""
+        service = standalone_rag_service
+        chunks = [
+            _make_chunk("equipment_1", "Transformador TR-01 operacional"),
+            _make_chunk("equipment_2", "Disjuntor DJ-02 em operação"),
+            _make_chunk("maintenance_1", "Manutenção preventiva do transformador", "maintenance"),
+        ]
+        for chunk in chunks:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        service.last_indexed_at = datetime.now()
+        return service
+    
+    async def _search_ids(self, service, query, mode=RetrievalMode.LEXICAL):
+        chunks = await service._search_relevant_chunks(query, None, 5, mode)
+        return [chunk.id for chunk in chunks]
+    
+    @pytest.mark.asyncio
+    async def test_upsert_new_chunk_without_rebuild(self, rag_service):
+        """Chunk novo fica pesquisável sem reconstruir o segmento base."""
+        rag_service._upsert_chunks([_make_chunk("failure_1", "Falha no gerador GR-05", "failure")])
+        
+        assert rag_service._base_row_count == 3
+        assert await self._search_ids(rag_service, "gerador") == ["failure_1"]
+        assert await self._search_ids(rag_service, "falha gerador", RetrievalMode.DENSE) == ["failure_1"]
+    
+    @pytest.mark.asyncio
+    async def test_upsert_replaces_previous_version(self, rag_service):
+        """Versão anterior do chunk deixa de ser retornada."""
+        rag_service._upsert_chunks([_make_chunk("equipment_2", "Seccionadora SC-02 em operação")])
+        
+        assert await self._search_ids(rag_service, "disjuntor") == []
+        assert await self._search_ids(rag_service, "seccionadora") == ["equipment_2"]
+        assert rag_service.document_cache["equipment_2"].content.startswith("Seccionadora")
+    
+    @pytest.mark.asyncio
+    async def test_delete_chunks(self, rag_service):
+        """Chunks removidos saem do cache e das buscas."""
+        removed = rag_service._delete_chunks(["equipment_1", "equipment_99"])
+        
+        assert removed == 1
+        assert "equipment_1" not in rag_service.document_cache
+        assert await self._search_ids(rag_service, "transformador") == ["maintenance_1"]
+    
+    @pytest.mark.asyncio
+    async def test_delta_mutations_do_not_rebuild_postings(self, rag_service):
+        """Upsert/delete atualizam o delta e o total de documentos vivos sem remontar postings."""
+        with patch.object(rag_service, "_build_postings", wraps=rag_service._build_postings) as build:
+            rag_service._upsert_chunks([_make_chunk("failure_1", "Falha no gerador GR-05", "failure")])
+            rag_service._upsert_chunks([_make_chunk("failure_1", "Falha no gerador GR-06", "failure")])
+            rag_service._delete_chunks(["equipment_1"])
+            build.assert_not_called()
+        
+        assert rag_service._live_count == int(rag_service._live_rows.sum()) == 3
+        assert rag_service._delta_document_frequency["gerador"] == 1
+        assert await self._search_ids(rag_service, "gerador") == ["failure_1"]
+        assert await self._search_ids(rag_service, "gr-06") == ["failure_1"]
+        assert await self._search_ids(rag_service, "gr-05") == []
+    
+    @pytest.mark.asyncio
+    async def test_delta_is_compacted(self, rag_service):
+        """Delta acima do limite é incorporado ao segmento base."""
+        rag_service.min_delta_compaction = 1
+        rag_service.delta_compaction_ratio = 0.0
+        
+        rag_service._upsert_chunks([
+            _make_chunk("failure_1", "Falha no gerador GR-05", "failure"),
+            _make_chunk("failure_2", "Falha no cabo CB-07", "failure"),
+        ])
+        
+        assert rag_service._base_row_count == 5
+        assert rag_service._delta_term_counts == {}
+        assert await self._search_ids(rag_service, "gerador") == ["failure_1"]
+    
+    @pytest.mark.asyncio
+    async def test_refresh_changes_uses_watermarks(self, rag_service):
+        """Feed de alterações consulta a partir da marca d'água e ignora chunks inalterados."""
+        watermark = datetime(2025, 1, 1, 12, 0)
+        rag_service._watermarks = {"maintenances": watermark}
+        unchanged = rag_service.document_cache["equipment_1"]
+        
+        async def failing_fetch(session, since):
+            raise Exception("tabela inexistente")
+            yield
+        
+        rag_service._fetch_equipment_chunks = Mock(return_value=_async_batches([
+            _make_chunk("equipment_1", unchanged.content),
+            _make_chunk("equipment_3", "Gerador GR-03 inativo"),
+        ]))
+        rag_service._fetch_maintenance_chunks = Mock(return_value=_async_batches())
+        rag_service._fetch_failure_chunks = failing_fetch
+        
+        updated = await rag_service.refresh_changes()
+        
+        assert updated == 1
+        assert rag_service._fetch_maintenance_chunks.call_args.args[1] == watermark
+        assert rag_service._fetch_equipment_chunks.call_args.args[1] is None
+        assert await self._search_ids(rag_service, "gerador") == ["equipment_3"]
+    
+    def test_advance_watermark(self, rag_service):
+        """Marca d'água guarda o maior updated_at visto."""
+        rows = [Mock(updated_at=datetime(2025, 1, 2)), Mock(updated_at=datetime(2025, 1, 5))]
+        rag_service._advance_watermark("failures", rows)
+        rag_service._advance_watermark("failures", [Mock(updated_at=datetime(2025, 1, 3))])
+        
+        assert rag_service._watermarks["failures"] == datetime(2025, 1, 5)
+    
+    def test_snapshot_compacts_pending_changes(self, rag_service, tmp_path):
+        """Snapshot inclui alterações incrementais e as marcas d'água."""
+        rag_service.snapshot_dir = tmp_path
+        rag_service._watermarks = {"equipments": datetime(2025, 1, 5)}
+        rag_service._upsert_chunks([_make_chunk("equipment_3", "Gerador GR-03 inativo")])
+        rag_service._delete_chunks(["equipment_2"])
+        
+        rag_service.save_snapshot()
+        loaded = rag_service.load_snapshot()
+        
+        assert loaded
+        assert sorted(rag_service._chunk_ids) == ["equipment_1", "equipment_3", "maintenance_1"]
+        assert rag_service._watermarks == {"equipments": datetime(2025, 1, 5)}
+
+
+class TestRAGServiceStreamingIndex:
+    """Testes da indexação completa em lotes (paginação por chave)."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService sem acesso ao banco com lotes pequenos."""
+        standalone_rag_service.index_batch_size = 2
+        return standalone_rag_service
+    
+    @staticmethod
+    def _equipment_rows(*ids):
+        """Linhas fake da tabela de equipamentos."""
+        return [
+            Mock(id=equipment_id, code=f"C-{equipment_id}", name=f"Transformador {equipment_id}",
+                 equipment_type="transformer", category="potência", description=None,
+                 updated_at=datetime(2025, 1, int(equipment_id)))
+            for equipment_id in ids
+        ]
+    
+    @staticmethod
+    def _session_with_pages(*pages):
+        """Sessão cujo execute devolve uma página por chamada."""
+        session = AsyncMock()
+        session.execute.side_effect = [Mock(fetchall=Mock(return_value=page)) for page in pages]
+        return session
+    
+    @pytest.mark.asyncio
+    async def test_keyset_pagination(self, rag_service):
+        """Páginas seguem o último id visto e param na página incompleta."""
+        session = self._session_with_pages(self._equipment_rows("1", "2"), self._equipment_rows("3"))
+        
+        batches = [batch async for batch in rag_service._fetch_equipment_chunks(session)]
+        
+        assert [[chunk.id for chunk in batch] for batch in batches] == [
+            ["equipment_1", "equipment_2"], ["equipment_3"]
+        ]
+        first_query, first_params = session.execute.await_args_list[0].args
+        second_query, second_params = session.execute.await_args_list[1].args
+        assert "LIMIT :batch_size" in str(first_query)
+        assert "LIMIT 1000" not in str(first_query)
+        assert "last_id" not in first_params
+        assert second_params == {"batch_size": 2, "last_id": "2"}
+    
+    @pytest.mark.asyncio
+    async def test_short_first_page_ends_loop(self, rag_service):
+        """Página menor que o lote encerra a leitura sem nova query."""
+        session = self._session_with_pages(self._equipment_rows("1"))
+        
+        batches = [batch async for batch in rag_service._fetch_equipment_chunks(session)]
+        
+        assert len(batches) == 1
+        assert session.execute.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_empty_page_ends_loop(self, rag_service):
+        """Tabela com múltiplo exato do lote termina na página vazia."""
+        session = self._session_with_pages(self._equipment_rows("1", "2"), [])
+        
+        batches = [batch async for batch in rag_service._fetch_equipment_chunks(session)]
+        
+        assert len(batches) == 1
+        assert session.execute.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_incremental_fetch_filters_by_watermark(self, rag_service):
+        """Feed de alterações aplica o filtro updated_at."""
+        since = datetime(2025, 1, 1)
+        session = self._session_with_pages([])
+        
+        batches = [batch async for batch in rag_service._fetch_maintenance_chunks(session, since)]
+        
+        query, params = session.execute.await_args.args
+        assert batches == []
+        assert "m.updated_at >= :since" in str(query)
+        assert params["since"] == since
+    
+    @pytest.mark.asyncio
+    async def test_full_index_reports_progress(self, rag_service):
+        """Indexação completa expõe progresso por tabela e por lote."""
+        session = self._session_with_pages(
+            self._equipment_rows("1", "2"), self._equipment_rows("3", "4"), []
+        )
+        rag_service._open_session.return_value.__aenter__.return_value = session
+        rag_service._fetch_maintenance_chunks = Mock(return_value=_async_batches())
+        rag_service._fetch_failure_chunks = Mock(return_value=_async_batches())
+        
+        await rag_service.index_data_sources()
+        
+        progress = rag_service.get_metrics()["indexing"]
+        assert progress["status"] == "completed"
+        assert progress["tables"] == {"equipments": 4}
+        assert progress["batches"] == 2
+        assert len(rag_service.document_cache) == 4
+        assert rag_service._watermarks["equipments"] == datetime(2025, 1, 4)
+
+
+class TestRAGServiceMetadataFilters:
+    """Testes dos filtros de metadados e sub-índices."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService com chunks de tipos, status e datas variados."""
+        service = standalone_rag_service
+        chunks = [
+            _make_chunk("equipment_1", "Transformador TR-01 operacional",
+                        equipment_type="Transformador", status="Ativo"),
+            _make_chunk("equipment_2", "Disjuntor DJ-02 operacional",
+                        equipment_type="Disjuntor", status="Manutenção"),
+            _make_chunk("maintenance_1", "Manutenção preventiva do transformador TR-01", "maintenance",
+                        equipment_type="Transformador", status="concluída", scheduled_date="2024-01-15"),
+            _make_chunk("maintenance_2", "Manutenção corretiva do disjuntor DJ-02", "maintenance",
+                        equipment_type="Disjuntor", status="planejada", scheduled_date="2024-06-10"),
+            _make_chunk("failure_1", "Falha de isolação no transformador TR-02", "failure",
+                        equipment_type="Transformador", severity="Alta", failure_date="2024-02-03 14:25:00"),
+        ]
+        for chunk in chunks:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        return service
+    
+    def _ids(self, service, rows):
+        return sorted(service._chunk_ids[row] for row in rows)
+    
+    def test_filters_are_normalized(self):
+        """Valores dos filtros são normalizados na criação."""
+        filters = RetrievalFilters(equipment_types={"Transformadores"}, statuses=["ATIVO", ""])
+        
+        assert filters.equipment_types == frozenset({"transformer"})
+        assert filters.statuses == frozenset({"ativo"})
+        assert RetrievalFilters().is_empty
+        assert not filters.is_empty
+    
+    def test_from_query_processor_entities(self):
+        """Entidades do QueryProcessor viram filtros."""
+        start, end = datetime(2024, 1, 1), datetime(2024, 1, 31)
+        entities = [
+            ExtractedEntity(QueryEntity.EQUIPMENT_TYPE, "transformadores", "transformer", 0.8, 0, 15),
+            ExtractedEntity(QueryEntity.EQUIPMENT_ID, "TR-01", "TR-01", 0.9, 16, 21),
+            ExtractedEntity(QueryEntity.TIME_PERIOD, "mês", {"start": start, "end": end}, 0.8, 22, 25),
+        ]
+        
+        filters = RetrievalFilters.from_entities(entities)
+        
+        assert filters.equipment_types == frozenset({"transformer"})
+        assert filters.statuses is None
+        assert (filters.date_from, filters.date_to) == (start, end)
+    
+    def test_specific_date_entity_covers_whole_day(self):
+        """Data específica filtra o dia inteiro."""
+        entities = [ExtractedEntity(QueryEntity.DATE_RANGE, "03/02/2024", datetime(2024, 2, 3), 0.9, 0, 10)]
+        
+        filters = RetrievalFilters.from_entities(entities)
+        
+        assert filters.date_from == datetime(2024, 2, 3)
+        assert filters.date_to.date() == datetime(2024, 2, 3).date()
+    
+    def test_candidate_rows_intersect_attributes(self, rag_service):
+        """Sub-índices combinam fonte e tipo de equipamento."""
+        filters = RetrievalFilters(sources={"maintenance"}, equipment_types={"transformer"})
+        
+        assert self._ids(rag_service, rag_service._candidate_rows(filters)) == ["maintenance_1"]
+    
+    def test_candidate_rows_date_range(self, rag_service):
+        """Intervalo de datas usa as linhas ordenadas por data."""
+        filters = RetrievalFilters(date_from=datetime(2024, 1, 1), date_to=datetime(2024, 3, 1))
+        
+        assert self._ids(rag_service, rag_service._candidate_rows(filters)) == ["failure_1", "maintenance_1"]
+    
+    def test_candidate_rows_unknown_value(self, rag_service):
+        """Valor inexistente não retorna candidatos."""
+        filters = RetrievalFilters(severities={"crítica"})
+        
+        assert len(rag_service._candidate_rows(filters)) == 0
+    
+    @pytest.mark.asyncio
+    async def test_lexical_search_with_filters(self, rag_service):
+        """Busca lexical considera apenas as linhas filtradas."""
+        filters = RetrievalFilters(equipment_types={"disjuntor"})
+        
+        chunks = await rag_service._search_relevant_chunks("operacional manutenção", None, 5, filters=filters)
+        
+        assert sorted(chunk.id for chunk in chunks) == ["equipment_2", "maintenance_2"]
+    
+    @pytest.mark.asyncio
+    async def test_dense_search_with_filters(self, rag_service):
+        """Busca densa multiplica apenas as linhas filtradas."""
+        filters = RetrievalFilters(severities={"alta"})
+        
+        chunks = await rag_service._search_relevant_chunks(
+            "transformador", None, 5, RetrievalMode.DENSE, filters
+        )
+        
+        assert [chunk.id for chunk in chunks] == ["failure_1"]
+    
+    @pytest.mark.asyncio
+    async def test_query_type_combined_with_filters(self, rag_service):
+        """query_type restringe a fonte junto com os demais filtros."""
+        filters = RetrievalFilters(equipment_types={"transformer"})
+        
+        chunks = await rag_service._search_relevant_chunks("transformador", "failure", 5, filters=filters)
+        
+        assert [chunk.id for chunk in chunks] == ["failure_1"]
+    
+    @pytest.mark.asyncio
+    async def test_query_filters_match_database_values(self, standalone_rag_service):
+        """Filtros do QueryProcessor encontram chunks com os valores gravados no banco."""
+        service = standalone_rag_service
+        for chunk in [
+            _make_chunk("equipment_1", "Disjuntor DJ-01 da SE Norte",
+                        equipment_type="Circuit Breaker", status="Maintenance"),
+            _make_chunk("equipment_2", "Disjuntor DJ-02 da SE Sul",
+                        equipment_type="Circuit Breaker", status="Active"),
+            _make_chunk("equipment_3", "Seccionadora SC-03 da SE Norte",
+                        equipment_type="Disconnect Switch", status="Maintenance"),
+            _make_chunk("maintenance_1", "Manutenção corretiva do disjuntor DJ-01", "maintenance",
+                        equipment_type="Circuit Breaker", status="Completed"),
+        ]:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        service._upsert_chunks([
+            _make_chunk("equipment_4", "Disjuntor DJ-04 da SE Leste",
+                        equipment_type="Circuit Breaker", status="Maintenance"),
+        ])
+        filters = RetrievalFilters.from_entities([
+            ExtractedEntity(QueryEntity.EQUIPMENT_TYPE, "disjuntores", "circuit_breaker", 0.8, 0, 11),
+            ExtractedEntity(QueryEntity.STATUS, "em manutenção", "under_maintenance", 0.8, 12, 25),
+        ])
+        
+        chunks = await service._search_relevant_chunks("disjuntor", None, 5, filters=filters)
+        
+        # Status filtra só equipamentos; o histórico de manutenção do tipo continua elegível
+        assert sorted(chunk.id for chunk in chunks) == ["equipment_1", "equipment_4", "maintenance_1"]
+        assert self._ids(service, service._candidate_rows(RetrievalFilters(statuses={"operational"}))) == [
+            "equipment_2", "maintenance_1"
+        ]
+    
+    def test_filters_apply_to_incremental_rows(self, rag_service):
+        """Chunks do segmento delta também passam pelos filtros."""
+        rag_service._upsert_chunks([
+            _make_chunk("failure_2", "Falha no gerador GR-01", "failure",
+                        equipment_type="Gerador", severity="Alta", failure_date="2024-02-10"),
+        ])
+        filters = RetrievalFilters(severities={"alta"}, date_from=datetime(2024, 2, 5))
+        
+        assert self._ids(rag_service, rag_service._candidate_rows(filters)) == ["failure_2"]
+
+
+class TestRAGServiceHybridRetrieval:
+    """Testes da recuperação híbrida com reciprocal rank fusion."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService com corpus onde os canais divergem."""
+        service = standalone_rag_service
+        chunks = [
+            # Só o canal lexical encontra (código não está no vocabulário denso)
+            _make_chunk("equipment_1", "Seccionadora SC-07 instalada na SE Norte"),
+            # Só o canal denso encontra (termos do vocabulário, sem "seccionadora")
+            _make_chunk("failure_1", "Falha crítica com defeito urgente", "failure"),
+            _make_chunk("equipment_2", "Disjuntor DJ-02 em operação"),
+        ]
+        for chunk in chunks:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        return service
+    
+    def test_reciprocal_rank_fusion(self, rag_service):
+        """Documento bem posicionado nos dois canais fica em primeiro."""
+        lexical = (np.array([0, 1]), np.array([0.9, 0.5], dtype=np.float32), 10)
+        dense = (np.array([1, 2]), np.array([0.8, 0.7], dtype=np.float32), 10)
+        
+        rows, scores = rag_service._reciprocal_rank_fusion([lexical, dense])
+        order = rows[np.argsort(-scores)]
+        
+        assert order[0] == 1
+        assert scores.max() < 1.0
+        assert set(rows) == {0, 1, 2}
+    
+    def test_fusion_respects_channel_depth(self, rag_service):
+        """Apenas os primeiros `depth` candidatos de cada canal entram na fusão."""
+        lexical = (np.array([0, 1, 2]), np.array([0.9, 0.5, 0.1], dtype=np.float32), 1)
+        dense = (np.array([], dtype=np.int64), np.array([], dtype=np.float32), 1)
+        
+        rows, scores = rag_service._reciprocal_rank_fusion([lexical, dense])
+        
+        assert list(rows) == [0]
+        assert scores[0] == pytest.approx(0.5)
+    
+    @pytest.mark.asyncio
+    async def test_hybrid_combines_both_channels(self, rag_service):
+        """Modo híbrido recupera resultados exclusivos de cada canal."""
+        chunks = await rag_service._search_relevant_chunks(
+            "seccionadora falha crítica", None, 5, RetrievalMode.HYBRID
+        )
+        
+        assert {"equipment_1", "failure_1"} <= {chunk.id for chunk in chunks}
+    
+    @pytest.mark.asyncio
+    async def test_hybrid_recomputes_when_index_changes(self, rag_service):
+        """Mutação do índice durante a busca força recálculo consistente."""
+        original_bm25 = rag_service._bm25_scores
+        
+        def mutate_then_score(terms, candidates):
+            rag_service.index_generation += 1
+            return original_bm25(terms, candidates)
+        
+        rag_service._bm25_scores = Mock(side_effect=mutate_then_score)
+        
+        chunks = await rag_service._search_relevant_chunks("seccionadora", None, 5, RetrievalMode.HYBRID)
+        
+        assert rag_service._bm25_scores.call_count == 2
+        assert chunks[0].id == "equipment_1"
+    
+    @pytest.mark.asyncio
+    async def test_default_retrieval_mode(self, rag_service):
+        """retrieve_context usa o modo padrão configurado."""
+        rag_service.default_retrieval_mode = RetrievalMode.HYBRID
+        rag_service._hybrid_scores = AsyncMock(return_value=(
+            np.array([0]), np.array([1.0], dtype=np.float32)
+        ))
+        
+        context = await rag_service.retrieve_context("seccionadora")
+        
+        rag_service._hybrid_scores.assert_awaited_once()
+        assert context.chunks[0].id == "equipment_1"
+    
+    def test_index_generation_bumps_on_mutation(self, rag_service):
+        """Geração do índice muda a cada alteração."""
+        generation = rag_service.index_generation
+        
+        rag_service._upsert_chunks([_make_chunk("equipment_3", "Gerador GR-03")])
+        rag_service._delete_chunks(["equipment_3"])
+        
+        assert rag_service.index_generation == generation + 2
+
+
 if __name__ == "__main__":
-    pytest.main([__file__]) 
\ No newline at end of file
+    pytest.main([__file__]) 
+
+class TestRAGServiceResultCache:
+    """Testes do cache de resultados de recuperação."""
+    
+    @pytest.fixture
+    def rag_service(self, standalone_rag_service):
+        """RAGService com índice lexical pequeno."""
+        service = standalone_rag_service
+        for chunk in [
+            _make_chunk("equipment_1", "Transformador TR-01 em operação"),
+            _make_chunk("equipment_2", "Disjuntor DJ-02 em manutenção"),
+        ]:
+            service.document_cache[chunk.id] = chunk
+        service._build_search_index()
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_repeated_query_hits_cache(self, rag_service):
+        """Query repetida não refaz a busca."""
+        rag_service._search_relevant_chunks = AsyncMock(wraps=rag_service._search_relevant_chunks)
+        
+        first = await rag_service.retrieve_context("Transformador TR-01")
+        second = await rag_service.retrieve_context("  transformador tr-01 ")
+        
+        assert rag_service._search_relevant_chunks.await_count == 1
+        assert rag_service.cache_hits == 1
+        assert [c.id for c in second.chunks] == [c.id for c in first.chunks]
+        assert second.query == "  transformador tr-01 "
+    
+    @pytest.mark.asyncio
+    async def test_cache_hit_returns_copies(self, rag_service):
+        """Resultados em cache não são afetados por mutações do chamador."""
+        first = await rag_service.retrieve_context("transformador")
+        first.chunks[0].relevance_score = -1.0
+        
+        second = await rag_service.retrieve_context("transformador")
+        
+        assert second.chunks[0].relevance_score > 0
+    
+    @pytest.mark.asyncio
+    async def test_index_mutation_invalidates_cache(self, rag_service):
+        """Upsert no índice invalida resultados anteriores."""
+        await rag_service.retrieve_context("disjuntor")
+        rag_service._upsert_chunks([_make_chunk("equipment_3", "Disjuntor DJ-03 instalado")])
+        
+        context = await rag_service.retrieve_context("disjuntor")
+        
+        assert rag_service.cache_hits == 0
+        assert "equipment_3" in {c.id for c in context.chunks}
+    
+    @pytest.mark.asyncio
+    async def test_cache_is_bounded(self, rag_service):
+        """Entradas menos usadas são descartadas e tamanho 0 desativa o cache."""
+        rag_service.result_cache_size = 1
+        await rag_service.retrieve_context("transformador")
+        await rag_service.retrieve_context("disjuntor")
+        assert len(rag_service._result_cache) == 1
+        
+        rag_service.result_cache_size = 0
+        rag_service._result_cache.clear()
+        await rag_service.retrieve_context("transformador")
+        assert len(rag_service._result_cache) == 0